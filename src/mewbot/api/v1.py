@@ -5,15 +5,19 @@ from __future__ import annotations
 from typing import (
     Any,
     Dict,
+    Hashable,
     List,
     Optional,
     Sequence,
     Set,
     Union,
     Type,
+    TypeVar,
+    Callable,
 )
 
 import abc
+import time
 
 from mewbot.api.registry import ComponentRegistry
 from mewbot.core import (
@@ -27,6 +31,15 @@ from mewbot.core import (
     ActionInterface,
 )
 from mewbot.config import BehaviourConfigBlock, ConfigBlock
+from mewbot.breaker import CircuitBreaker, ComponentFailure
+from mewbot.commands import command_word
+from mewbot.execution import Execution, Executors, execute, parse_execution
+from mewbot.metrics import BehaviourStats
+from mewbot.patterns import ENGINE, new_key
+from mewbot.predicates import PredicatePlan
+from mewbot.tracing import inherit_trace
+
+ResultType = TypeVar("ResultType")  # pylint: disable=invalid-name
 
 
 class Component(metaclass=ComponentRegistry):
@@ -70,12 +83,143 @@ class Component(metaclass=ComponentRegistry):
         self._id = _id
 
 
+class Guarded:  # pylint: disable=too-few-public-methods
+    """
+    Mixin for components whose work can be limited by a timeout and circuit
+    breaker, configured with the `guard` property.
+    """
+
+    _guard: Dict[str, Any] = {}
+
+    breaker: Optional[CircuitBreaker] = None
+
+    @property
+    def guard(self) -> Dict[str, Any]:
+        """
+        The timeout, failure_threshold, and reset_timeout for this component's
+        calls (see mewbot.breaker.CircuitBreaker). Empty for no limits.
+        """
+        return self._guard
+
+    @guard.setter
+    def guard(self, guard: Dict[str, Any]) -> None:
+        self._guard = dict(guard or {})
+
+        name = f"{type(self).__qualname__} {getattr(self, 'uuid', '')}".strip()
+        self.breaker = CircuitBreaker.from_config(name, self._guard) if self._guard else None
+
+
+class Offloadable:
+    """
+    Mixin for components whose synchronous work can be run off the event
+    loop, configured with the `execution` property.
+    """
+
+    _execution: Execution = Execution.INLINE
+
+    executors: Optional[Executors] = None  # Set when bound to a runner
+
+    @property
+    def execution(self) -> str:
+        """
+        Where this component's work is run: inline (on the event loop), or in
+        the runner's thread or process pool (see mewbot.execution).
+        """
+        return self._execution.value
+
+    @execution.setter
+    def execution(self, execution: str) -> None:
+        self._execution = parse_execution(execution)
+
+    @property
+    def offloaded(self) -> bool:
+        return self._execution != Execution.INLINE
+
+    async def offload(self, func: Callable[..., ResultType], *args: Any) -> ResultType:
+        """Calls a function according to this component's execution setting"""
+        return await execute(self.executors, self._execution, func, *args)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Components are pickled to be run in the process pool, which can't
+        # take the pools themselves along
+        state = self.__dict__.copy()
+        state.pop("executors", None)
+        return state
+
+
 @ComponentRegistry.register_api_version(ComponentKind.IOConfig, "v1")
 class IOConfig(Component):
     """
     Define a service that mewbot can connect to.
     """
 
+    _priority: Optional[int] = None
+    _output_guard: Dict[str, Any] = {}
+    _output_rate_limit: Dict[str, Any] = {}
+    _output_coalesce: Dict[str, Any] = {}
+    _output_retry: Dict[str, Any] = {}
+
+    @property
+    def priority(self) -> Optional[int]:
+        """
+        Default priority of the events from this config's inputs, when the bot
+        uses a priority input queue. Higher numbers are processed first.
+        """
+        return self._priority
+
+    @priority.setter
+    def priority(self, priority: Optional[int]) -> None:
+        self._priority = None if priority is None else int(priority)
+
+    @property
+    def output_guard(self) -> Dict[str, Any]:
+        """
+        The timeout, failure_threshold, and reset_timeout for calls to the
+        outputs of this config (see mewbot.breaker.CircuitBreaker).
+        """
+        return self._output_guard
+
+    @output_guard.setter
+    def output_guard(self, output_guard: Dict[str, Any]) -> None:
+        self._output_guard = dict(output_guard or {})
+
+    @property
+    def output_rate_limit(self) -> Dict[str, Any]:
+        """
+        The rate, burst, global_rate, and global_burst of the events sent by
+        the outputs of this config (see mewbot.scheduling.OutputScheduler).
+        """
+        return self._output_rate_limit
+
+    @output_rate_limit.setter
+    def output_rate_limit(self, output_rate_limit: Dict[str, Any]) -> None:
+        self._output_rate_limit = dict(output_rate_limit or {})
+
+    @property
+    def output_coalesce(self) -> Dict[str, Any]:
+        """
+        The merges, window, and max_events for merging bursts of events sent
+        to the same destination by the outputs of this config
+        (see mewbot.coalescing.Coalescer).
+        """
+        return self._output_coalesce
+
+    @output_coalesce.setter
+    def output_coalesce(self, output_coalesce: Dict[str, Any]) -> None:
+        self._output_coalesce = dict(output_coalesce or {})
+
+    @property
+    def output_retry(self) -> Dict[str, Any]:
+        """
+        The max_attempts, base_delay, max_delay, and jitter for retrying the
+        events which the outputs of this config fail to send (see mewbot.retry).
+        """
+        return self._output_retry
+
+    @output_retry.setter
+    def output_retry(self, output_retry: Dict[str, Any]) -> None:
+        self._output_retry = dict(output_retry or {})
+
     @abc.abstractmethod
     def get_inputs(self) -> Sequence[Input]:
         ...
@@ -121,9 +265,22 @@ class Output:
         :return:
         """
 
+    def destination(  # pylint: disable=unused-argument
+        self, event: OutputEvent
+    ) -> Optional[Hashable]:
+        """
+        Where the event will be sent (e.g. a channel), which rate limits are
+        applied to separately. By default all events share one destination.
+        """
+        return None
+
 
 @ComponentRegistry.register_api_version(ComponentKind.Trigger, "v1")
-class Trigger(Component):
+class Trigger(Offloadable, Component):
+    # Whether matches() only depends on the event and this trigger's properties,
+    # so identical triggers in different behaviours can share their results
+    pure: bool = False
+
     @staticmethod
     @abc.abstractmethod
     def consumes_inputs() -> Set[Type[InputEvent]]:
@@ -134,8 +291,151 @@ class Trigger(Component):
         pass
 
 
+class CommandTrigger(Trigger):
+    """
+    Matches messages starting with a command, such as "!help".
+
+    Events are matched on their text attribute. The message may carry on after
+    the command (e.g. "!roll 2d6"), unless exact is set. Behaviours whose
+    triggers are all CommandTriggers are indexed by the runner, so are only
+    passed the messages starting with one of their commands (see mewbot.commands).
+    """
+
+    pure = True
+
+    _command: str = ""
+    _exact: bool = False
+
+    @staticmethod
+    @abc.abstractmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        pass
+
+    @property
+    def command(self) -> str:
+        return self._command
+
+    @command.setter
+    def command(self, command: str) -> None:
+        self._command = str(command).strip()
+
+    @property
+    def exact(self) -> bool:
+        """Whether the message must be just the command"""
+        return self._exact
+
+    @exact.setter
+    def exact(self, exact: bool) -> None:
+        self._exact = bool(exact)
+
+    def command_words(self) -> Set[str]:
+        """The first word of the command, by which the runner indexes behaviours"""
+
+        word = command_word(self._command)
+        return {word} if word else set()
+
+    def matches(self, event: InputEvent) -> bool:
+        text = getattr(event, "text", None)
+
+        if not self._command or not isinstance(text, str):
+            return False
+
+        text = text.strip()
+
+        if text == self._command or self._exact:
+            return text == self._command
+
+        return text.startswith(self._command) and text[len(self._command)].isspace()
+
+
+class RegexTrigger(Trigger):
+    """
+    Matches events with a field (by default their text) containing a match for
+    a regular expression.
+
+    The patterns of all regex triggers are compiled together by a shared engine,
+    so each event's text is scanned once however many triggers there are
+    (see mewbot.patterns).
+    """
+
+    pure = True
+
+    _pattern: str = ""
+    _field: str = "text"
+    _ignore_case: bool = False
+    _pattern_key: Optional[int] = None
+
+    @staticmethod
+    @abc.abstractmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        pass
+
+    @property
+    def pattern(self) -> str:
+        return self._pattern
+
+    @pattern.setter
+    def pattern(self, pattern: str) -> None:
+        self._pattern = str(pattern)
+        self._register()
+
+    @property
+    def field(self) -> str:
+        """The attribute of the events to match the pattern against"""
+        return self._field
+
+    @field.setter
+    def field(self, field: str) -> None:
+        self._field = str(field)
+        self._register()
+
+    @property
+    def ignore_case(self) -> bool:
+        return self._ignore_case
+
+    @ignore_case.setter
+    def ignore_case(self, ignore_case: bool) -> None:
+        self._ignore_case = bool(ignore_case)
+        self._register()
+
+    def matches(self, event: InputEvent) -> bool:
+        key = self._pattern_key
+
+        if key is None:
+            if not self._pattern:
+                return False
+
+            # A copy of this trigger, sent to another process to run
+            key = ENGINE.shared_key(self._pattern, self._field, self._ignore_case)
+
+        return ENGINE.matches(key, event)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The key is only registered in this process
+        state = super().__getstate__()
+        state.pop("_pattern_key", None)
+        return state
+
+    def _register(self) -> None:
+        if not self._pattern:
+            if self._pattern_key is not None:
+                ENGINE.unregister(self._pattern_key)
+            return
+
+        if self._pattern_key is None:
+            self._pattern_key = new_key()
+
+        ENGINE.register(
+            self, self._pattern_key, self._pattern, self._field, self._ignore_case
+        )
+
+
 @ComponentRegistry.register_api_version(ComponentKind.Condition, "v1")
-class Condition(Component):
+class Condition(Offloadable, Component):
+    # Whether allows() only depends on the event and this condition's properties,
+    # so identical conditions in different behaviours can share their results
+    pure: bool = False
+
     @staticmethod
     @abc.abstractmethod
     def consumes_inputs() -> Set[Type[InputEvent]]:
@@ -147,7 +447,7 @@ class Condition(Component):
 
 
 @ComponentRegistry.register_api_version(ComponentKind.Action, "v1")
-class Action(Component):
+class Action(Guarded, Offloadable, Component):
     @staticmethod
     @abc.abstractmethod
     def consumes_inputs() -> Set[Type[InputEvent]]:
@@ -170,6 +470,9 @@ class Action(Component):
         if not self._queue:
             raise RuntimeError("Can not sent events before queue initialisation")
 
+        # Continue the trace of the input event being processed, if there is one
+        inherit_trace(event)
+
         await self._queue.put(event)
 
     @abc.abstractmethod
@@ -178,7 +481,7 @@ class Action(Component):
 
 
 @ComponentRegistry.register_api_version(ComponentKind.Behaviour, "v1")
-class Behaviour(Component):
+class Behaviour(Guarded, Component):  # pylint: disable=too-many-instance-attributes
     name: str
     active: bool
 
@@ -188,9 +491,17 @@ class Behaviour(Component):
 
     interests: Set[Type[InputEvent]]
 
+    stats: BehaviourStats  # How this behaviour has handled events, for metrics
+
+    _offloaded: bool  # Whether any trigger or condition runs off the event loop
+    _plan: PredicatePlan  # The order to check the triggers and conditions in
+
     def __init__(self, name: str, active: bool = True) -> None:
         self.name = name
         self.active = active
+        self.stats = BehaviourStats()
+        self._offloaded = False
+        self._plan = PredicatePlan([], [])
 
         self.interests = set()
         self.triggers = []
@@ -222,6 +533,47 @@ class Behaviour(Component):
         if isinstance(component, Action):
             self.actions.append(component)
 
+        self._offloaded = any(
+            component.offloaded for component in [*self.triggers, *self.conditions]
+        )
+        self._plan = PredicatePlan(self.triggers, self.conditions)
+
+    def replace_components(
+        self,
+        components: Sequence[Union[TriggerInterface, ConditionInterface, ActionInterface]],
+    ) -> None:
+        """Replaces all of this behaviour's triggers, conditions, and actions at once.
+
+        If any of the components can not be added, the behaviour is left unchanged."""
+
+        previous = (
+            self.interests,
+            self.triggers,
+            self.conditions,
+            self.actions,
+            self._offloaded,
+            self._plan,
+        )
+
+        self.interests = set()
+        self.triggers = []
+        self.conditions = []
+        self.actions = []
+
+        try:
+            for component in components:
+                self.add(component)
+        except (TypeError, ValueError):
+            (
+                self.interests,
+                self.triggers,
+                self.conditions,
+                self.actions,
+                self._offloaded,
+                self._plan,
+            ) = previous
+            raise
+
     def consumes_inputs(self) -> Set[Type[InputEvent]]:
         return self.interests
 
@@ -229,26 +581,85 @@ class Behaviour(Component):
         for action in self.actions:
             action.bind(output)
 
+    def bind_executors(self, executors: Executors) -> None:
+        """Gives this behaviour's components the runner's thread and process pools"""
+
+        for component in [*self.triggers, *self.conditions, *self.actions]:
+            component.executors = executors
+
+        self._offloaded = any(
+            component.offloaded for component in [*self.triggers, *self.conditions]
+        )
+
     async def process(self, event: InputEvent) -> None:
-        if not any(True for trigger in self.triggers if trigger.matches(event)):
+        if not self.breaker:
+            await self._process(event)
             return
 
-        if not all(True for condition in self.conditions if condition.allows(event)):
+        try:
+            await self.breaker.call(self._process(event))
+        except ComponentFailure:
+            # Logged and counted by the breaker
+            pass
+
+    async def _process(self, event: InputEvent) -> None:
+        stats = self.stats
+        stats.events += 1
+
+        if self._offloaded:
+            await self._process_offloaded(event)
+            return
+
+        if not self._plan.matches(event):
+            return
+
+        stats.matched += 1
+
+        if not self._plan.allows(event):
+            stats.rejected += 1
+            return
+
+        await self._act(event)
+
+    async def _process_offloaded(self, event: InputEvent) -> None:
+        """Checks the triggers and conditions, some of which run off the event loop"""
+
+        if not await self._plan.matches_offloaded(event):
+            return
+
+        self.stats.matched += 1
+
+        if not await self._plan.allows_offloaded(event):
+            self.stats.rejected += 1
             return
 
+        await self._act(event)
+
+    async def _act(self, event: InputEvent) -> None:
         state: Dict[str, Any] = {}
+        started = time.monotonic()
 
         for action in self.actions:
-            await action.act(event, state)
+            if not action.breaker:
+                await action.act(event, state)
+                continue
+
+            try:
+                await action.breaker.call(action.act(event, state))
+            except ComponentFailure:
+                # Later actions may depend on this one, so they are not run
+                return
+
+        self.stats.action_latency.observe(time.monotonic() - started)
 
     def serialise(self) -> BehaviourConfigBlock:
         config = super().serialise()
 
         return {
-            "kind": config["implementation"],
+            "kind": config["kind"],
             "implementation": config["implementation"],
             "uuid": config["uuid"],
-            "properties": config["properties"],
+            "properties": {"name": self.name, "active": self.active, **config["properties"]},
             "triggers": [x.serialise() for x in self.triggers],
             "conditions": [x.serialise() for x in self.conditions],
             "actions": [x.serialise() for x in self.actions],
@@ -261,6 +672,8 @@ __all__ = [
     "Output",
     "Behaviour",
     "Trigger",
+    "CommandTrigger",
+    "RegexTrigger",
     "Condition",
     "Action",
     "InputEvent",
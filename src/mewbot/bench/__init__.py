@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+"""Synthetic load generation and throughput benchmarks for the bot runner.
+
+Run them with `python -m mewbot.bench`; see mewbot.bench.scenarios.
+"""
+
+from __future__ import annotations
+
+from mewbot.bench.io import (
+    LatencyRecorder,
+    LoopbackInputEvent,
+    LoopbackIO,
+    LoopbackMessageEvent,
+    LoopbackOutputEvent,
+    LoopbackReactionEvent,
+    SinkOutput,
+)
+from mewbot.bench.behaviours import ForwardAction, LoopbackTrigger
+from mewbot.bench.scenarios import (
+    SCENARIOS,
+    BenchReport,
+    run_dispatch,
+    run_fanout,
+    run_pipeline,
+    run_startup,
+)
+
+__all__ = [
+    "LatencyRecorder",
+    "LoopbackInputEvent",
+    "LoopbackIO",
+    "LoopbackMessageEvent",
+    "LoopbackOutputEvent",
+    "LoopbackReactionEvent",
+    "SinkOutput",
+    "ForwardAction",
+    "LoopbackTrigger",
+    "SCENARIOS",
+    "BenchReport",
+    "run_dispatch",
+    "run_fanout",
+    "run_pipeline",
+    "run_startup",
+]
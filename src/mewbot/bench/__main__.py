@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""Runs the benchmark scenarios from the command line
+
+    python -m mewbot.bench [scenario ...] [--events N] [--rate R] ...
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import argparse
+import logging
+
+from mewbot.bench.scenarios import SCENARIOS, BenchReport
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m mewbot.bench", description=__doc__)
+    parser.add_argument("scenarios", nargs="*", choices=[[], *SCENARIOS], default=[])
+    parser.add_argument("--sizes", type=int, nargs="+", help="Override the scenario sizes")
+    parser.add_argument("--events", type=int, default=2000, help="Events per run")
+    parser.add_argument("--rate", type=float, default=0.0, help="Events per second (0: max)")
+    parser.add_argument("--payload-size", type=int, default=64, help="Characters per event")
+    parser.add_argument("--input-workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1)
+
+    args = parser.parse_args(arguments)
+
+    # The runner's start and stop messages would get in the way of the results
+    logging.getLogger("mewbot").setLevel(logging.ERROR)
+
+    options: Dict[str, Any] = {
+        "events": args.events,
+        "rate": args.rate,
+        "payload_size": args.payload_size,
+        "input_workers": args.input_workers,
+        "batch_size": args.batch_size,
+    }
+
+    print(BenchReport.HEADER)
+
+    for name in args.scenarios or SCENARIOS:
+        scenario, sizes = SCENARIOS[name]
+
+        for size in args.sizes or sizes:
+            report = scenario(size, **options)
+            print(report.format(), flush=True)
+
+
+if __name__ == "__main__":
+    main()
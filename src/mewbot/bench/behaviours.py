@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""Triggers and Actions used to build the behaviours for the benchmarks"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Set, Type
+
+from mewbot.api.v1 import Action, Behaviour, InputEvent, OutputEvent, Trigger
+from mewbot.bench.io import LoopbackInputEvent, LoopbackOutputEvent
+
+
+class LoopbackTrigger(Trigger):
+    """
+    Matches the loopback events whose sequence number has a given remainder,
+    so that each event can be handled by one of a number of behaviours.
+    """
+
+    _modulus: int = 1
+    _remainder: int = 0
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {LoopbackInputEvent}
+
+    @property
+    def modulus(self) -> int:
+        return self._modulus
+
+    @modulus.setter
+    def modulus(self, modulus: int) -> None:
+        self._modulus = int(modulus)
+
+    @property
+    def remainder(self) -> int:
+        return self._remainder
+
+    @remainder.setter
+    def remainder(self, remainder: int) -> None:
+        self._remainder = int(remainder)
+
+    def matches(self, event: InputEvent) -> bool:
+        if not isinstance(event, LoopbackInputEvent):
+            return False
+
+        return event.sequence % self._modulus == self._remainder
+
+
+class ForwardAction(Action):
+    """
+    Sends a copy of each loopback event back out to the sinks
+    """
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {LoopbackInputEvent}
+
+    @staticmethod
+    def produces_outputs() -> Set[Type[OutputEvent]]:
+        return {LoopbackOutputEvent}
+
+    async def act(self, event: InputEvent, state: Dict[str, Any]) -> None:
+        if not isinstance(event, LoopbackInputEvent):
+            return
+
+        await self.send(LoopbackOutputEvent(event.sequence, event.created, event.text))
+
+
+def forwarding_behaviour(index: int, count: int) -> Behaviour:
+    """The index-th of count behaviours which between them forward every event once"""
+
+    trigger = LoopbackTrigger()
+    trigger.modulus = count
+    trigger.remainder = index
+
+    behaviour = Behaviour(f"Forward {index} of {count}")
+    behaviour.add(trigger)
+    behaviour.add(ForwardAction())
+
+    return behaviour
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+"""
+An in-memory IOConfig for benchmarking, which loops events back to itself.
+
+ - LoopbackInput generates a stream of input events, at a given rate and
+   with a given mix of event types and payload size.
+ - SinkOutput accepts the output events, recording the time each one took
+   to get from the input to the output in a LatencyRecorder.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Sequence, Set, Type
+
+import asyncio
+import dataclasses
+import random
+import time
+
+from mewbot.api.v1 import Input, InputEvent, IOConfig, Output, OutputEvent
+
+
+@dataclasses.dataclass
+class LoopbackInputEvent(InputEvent):
+    sequence: int
+    created: float  # When the event was generated, from time.monotonic()
+    text: str
+
+
+@dataclasses.dataclass
+class LoopbackMessageEvent(LoopbackInputEvent):
+    pass
+
+
+@dataclasses.dataclass
+class LoopbackReactionEvent(LoopbackInputEvent):
+    pass
+
+
+@dataclasses.dataclass
+class LoopbackOutputEvent(OutputEvent):
+    sequence: int
+    created: float  # When the input event this was produced from was generated
+    text: str
+
+
+# The event types which can be mixed in a generated stream, by name
+EVENT_TYPES: Dict[str, Type[LoopbackInputEvent]] = {
+    "message": LoopbackMessageEvent,
+    "reaction": LoopbackReactionEvent,
+}
+
+
+class LatencyRecorder:
+    """Collects the end-to-end latencies of the events reaching the sinks"""
+
+    expected: int  # The number of outputs after which the run is complete
+    latencies: List[float]
+    first: Optional[float]  # When the first input event was generated
+    last: Optional[float]  # When the most recent output event was received
+    on_complete: Callable[[], None]  # Called once the expected outputs have arrived
+
+    def __init__(self, expected: int = 0) -> None:
+        self.expected = expected
+        self.latencies = []
+        self.first = None
+        self.last = None
+        self.on_complete = lambda: None
+
+    def started(self, created: float) -> None:
+        if self.first is None:
+            self.first = created
+
+    def record(self, created: float) -> None:
+        self.last = time.monotonic()
+        self.latencies.append(self.last - created)
+
+        if len(self.latencies) == self.expected:
+            self.on_complete()
+
+    @property
+    def elapsed(self) -> float:
+        if self.first is None or self.last is None:
+            return 0.0
+        return self.last - self.first
+
+
+class LoopbackIO(IOConfig):  # pylint: disable=too-many-instance-attributes
+    """
+    Generates a stream of events, and provides sinks for the events
+    produced from them.
+    """
+
+    _count: int = 1000
+    _rate: float = 0.0
+    _payload_size: int = 64
+    _mix: Dict[str, float] = {"message": 1.0}
+    _seed: int = 0
+    _sinks: int = 1
+
+    recorder: LatencyRecorder
+
+    _input: Optional[LoopbackInput] = None
+    _outputs: Optional[List[SinkOutput]] = None
+
+    def __init__(self) -> None:
+        self.recorder = LatencyRecorder()
+
+    @property
+    def count(self) -> int:
+        """The number of events to generate"""
+        return self._count
+
+    @count.setter
+    def count(self, count: int) -> None:
+        self._count = int(count)
+
+    @property
+    def rate(self) -> float:
+        """Events to generate per second, or 0 to generate them as fast as possible"""
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate: float) -> None:
+        self._rate = float(rate)
+
+    @property
+    def payload_size(self) -> int:
+        """The length of the text in each event"""
+        return self._payload_size
+
+    @payload_size.setter
+    def payload_size(self, payload_size: int) -> None:
+        self._payload_size = int(payload_size)
+
+    @property
+    def mix(self) -> Dict[str, float]:
+        """The relative weights of each type of event (see EVENT_TYPES)"""
+        return self._mix
+
+    @mix.setter
+    def mix(self, mix: Dict[str, float]) -> None:
+        unknown = set(mix).difference(EVENT_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown loopback event types {unknown}")
+
+        self._mix = {name: float(weight) for name, weight in mix.items()}
+
+    @property
+    def seed(self) -> int:
+        """Seed for choosing the type of each event, so runs are repeatable"""
+        return self._seed
+
+    @seed.setter
+    def seed(self, seed: int) -> None:
+        self._seed = int(seed)
+
+    @property
+    def sinks(self) -> int:
+        """The number of SinkOutputs, each of which receives every output event"""
+        return self._sinks
+
+    @sinks.setter
+    def sinks(self, sinks: int) -> None:
+        self._sinks = int(sinks)
+
+    def get_inputs(self) -> Sequence[Input]:
+        if not self._input:
+            rng = random.Random(self._seed)
+            types = rng.choices(
+                [EVENT_TYPES[name] for name in self._mix],
+                weights=list(self._mix.values()),
+                k=self._count,
+            )
+            self._input = LoopbackInput(types, self._rate, self._payload_size, self.recorder)
+
+        return [self._input]
+
+    def get_outputs(self) -> Sequence[Output]:
+        if self._outputs is None:
+            self._outputs = [SinkOutput(self.recorder) for _ in range(self._sinks)]
+
+        return self._outputs
+
+
+class LoopbackInput(Input):
+    """
+    Puts a pre-determined sequence of events on the input queue
+    """
+
+    types: Sequence[Type[LoopbackInputEvent]]
+    rate: float
+    text: str
+    recorder: LatencyRecorder
+
+    def __init__(
+        self,
+        types: Sequence[Type[LoopbackInputEvent]],
+        rate: float,
+        payload_size: int,
+        recorder: LatencyRecorder,
+    ) -> None:
+        super().__init__()
+
+        self.types = types
+        self.rate = rate
+        self.text = "x" * payload_size
+        self.recorder = recorder
+
+    @staticmethod
+    def produces_inputs() -> Set[Type[InputEvent]]:
+        return set(EVENT_TYPES.values())
+
+    async def run(self) -> None:
+        if not self.queue:
+            return
+
+        start = time.monotonic()
+
+        for sequence, event_type in enumerate(self.types):
+            if self.rate:
+                delay = start + sequence / self.rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif sequence % 100 == 0:
+                # Give the rest of the bot a chance to run
+                await asyncio.sleep(0)
+
+            created = time.monotonic()
+            self.recorder.started(created)
+
+            await self.queue.put(event_type(sequence, created, self.text))
+
+
+class SinkOutput(Output):
+    """
+    Records how long each output event took to arrive
+    """
+
+    recorder: LatencyRecorder
+
+    def __init__(self, recorder: LatencyRecorder) -> None:
+        self.recorder = recorder
+
+    @staticmethod
+    def consumes_outputs() -> Set[Type[OutputEvent]]:
+        return {LoopbackOutputEvent}
+
+    async def output(self, event: OutputEvent) -> bool:
+        if not isinstance(event, LoopbackOutputEvent):
+            return False
+
+        self.recorder.record(event.created)
+        return True
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+"""Benchmark scenarios, which run events through a BotRunner and time them"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import asyncio
+import dataclasses
+import io
+import json
+import time
+
+import yaml
+
+from mewbot.bench.behaviours import forwarding_behaviour
+from mewbot.bench.io import LoopbackIO
+from mewbot.bot import Bot
+from mewbot.core import BehaviourInterface
+from mewbot.loader import configure_bot
+
+
+@dataclasses.dataclass
+class BenchReport:
+    scenario: str
+    count: int  # The number of events processed (or behaviours loaded, for startup)
+    elapsed: float  # Seconds from the first event being generated to the last output
+    throughput: float  # Events (or behaviours) per second
+    p50: float  # Median end-to-end latency (or load time, for startup), in seconds
+    p99: float
+    complete: bool = True  # False if the run timed out before all outputs arrived
+
+    HEADER = (
+        f"{'scenario':<24} {'count':>8} {'per sec':>12} {'p50 (ms)':>10} {'p99 (ms)':>10}"
+    )
+
+    def format(self) -> str:
+        line = (
+            f"{self.scenario:<24} {self.count:>8d} {self.throughput:>12.1f} "
+            f"{self.p50 * 1000:>10.3f} {self.p99 * 1000:>10.3f}"
+        )
+
+        return line if self.complete else line + "  (incomplete)"
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """The nearest-rank percentile of a set of samples"""
+
+    if not samples:
+        return 0.0
+
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_pipeline(
+    scenario: str,
+    loopback: LoopbackIO,
+    behaviours: Sequence[BehaviourInterface],
+    timeout: float = 60.0,
+    **runner_options: Any,
+) -> BenchReport:
+    """Runs a bot until every generated event has reached every sink"""
+
+    bot = Bot(scenario)
+    bot.add_io_config(loopback)
+    for behaviour in behaviours:
+        bot.add_behaviour(behaviour)
+
+    recorder = loopback.recorder
+    recorder.expected = loopback.count * loopback.sinks
+
+    # The lanes must be able to hold every event, or some would be dropped
+    runner_options.setdefault("output_lane_size", loopback.count)
+    runner = bot.create_runner(**runner_options)
+
+    loop = asyncio.new_event_loop()
+    deadline = loop.call_later(timeout, runner.stop, "Benchmark timed out")
+
+    def complete() -> None:
+        deadline.cancel()
+        runner.stop("Benchmark complete")
+
+    recorder.on_complete = complete
+
+    try:
+        runner.run(loop)
+    finally:
+        deadline.cancel()
+        loop.close()
+
+    return BenchReport(
+        scenario=scenario,
+        count=loopback.count,
+        elapsed=recorder.elapsed,
+        throughput=loopback.count / recorder.elapsed if recorder.elapsed else 0.0,
+        p50=percentile(recorder.latencies, 0.5),
+        p99=percentile(recorder.latencies, 0.99),
+        complete=len(recorder.latencies) == recorder.expected,
+    )
+
+
+def make_loopback(events: int, rate: float, payload_size: int, sinks: int = 1) -> LoopbackIO:
+    loopback = LoopbackIO()
+    loopback.count = events
+    loopback.rate = rate
+    loopback.payload_size = payload_size
+    loopback.mix = {"message": 0.9, "reaction": 0.1}
+    loopback.sinks = sinks
+    return loopback
+
+
+def run_dispatch(
+    behaviours: int,
+    events: int = 2000,
+    rate: float = 0.0,
+    payload_size: int = 64,
+    **options: Any,
+) -> BenchReport:
+    """Each event is offered to every behaviour, but only one of them forwards it"""
+
+    return run_pipeline(
+        f"dispatch/{behaviours}",
+        make_loopback(events, rate, payload_size),
+        [forwarding_behaviour(index, behaviours) for index in range(behaviours)],
+        **options,
+    )
+
+
+def run_fanout(
+    outputs: int,
+    events: int = 2000,
+    rate: float = 0.0,
+    payload_size: int = 64,
+    **options: Any,
+) -> BenchReport:
+    """Every event is forwarded by one behaviour to a number of outputs"""
+
+    return run_pipeline(
+        f"fanout/{outputs}",
+        make_loopback(events, rate, payload_size, sinks=outputs),
+        [forwarding_behaviour(0, 1)],
+        **options,
+    )
+
+
+def run_startup(behaviours: int, repeats: int = 5, **_options: Any) -> BenchReport:
+    """Times loading a YAML configuration with a number of behaviours"""
+
+    documents = [make_loopback(0, 0.0, 0).serialise()]
+    documents.extend(
+        forwarding_behaviour(index, behaviours).serialise() for index in range(behaviours)
+    )
+    # Round-tripping through JSON turns the ComponentKind enums into plain strings
+    config = yaml.safe_dump_all(json.loads(json.dumps(documents)))
+
+    timings: List[float] = []
+
+    for _ in range(repeats):
+        started = time.perf_counter()
+        configure_bot("startup", io.StringIO(config))
+        timings.append(time.perf_counter() - started)
+
+    total = sum(timings)
+
+    return BenchReport(
+        scenario=f"startup/{behaviours}",
+        count=behaviours,
+        elapsed=total,
+        throughput=behaviours * repeats / total if total else 0.0,
+        p50=percentile(timings, 0.5),
+        p99=percentile(timings, 0.99),
+    )
+
+
+# Each scenario, with the sizes it is run at by default
+SCENARIOS: Dict[str, Tuple[Callable[..., BenchReport], Sequence[int]]] = {
+    "startup": (run_startup, (10, 100, 1000)),
+    "dispatch": (run_dispatch, (10, 100, 1000)),
+    "fanout": (run_fanout, (1, 10, 100)),
+}
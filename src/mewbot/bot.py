@@ -1,8 +1,25 @@
 #!/usr/bin/env python3
+# pylint: disable=too-many-lines
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Set, Type, Callable
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    cast,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Awaitable,
+    Callable,
+    Collection,
+)
 
 import asyncio
 import itertools
@@ -10,7 +27,21 @@ import logging
 import signal
 
 from mewbot.data import DataSource
+from mewbot.breaker import CircuitBreaker
+from mewbot.commands import CommandIndex
+from mewbot.dedup import Deduplicator
+from mewbot.delivery import OutputLane, take_batch
+from mewbot.execution import Executors
+from mewbot.memo import SharedResults
+from mewbot.metrics import RunnerMetrics
+from mewbot.profiling import Profiler, ProfileReport, behaviour_components
+from mewbot.queues import BoundedQueue, PriorityEventQueue, create_queue
+from mewbot.recording import EventRecorder
+from mewbot.retry import DeadLetterSink
+from mewbot.tracing import SpanExporter, Tracer
+from mewbot.wal import WriteAheadLog
 from mewbot.core import (
+    BatchBehaviourInterface,
     BehaviourInterface,
     IOConfigInterface,
     InputInterface,
@@ -23,26 +54,69 @@ from mewbot.core import (
 
 logging.basicConfig(level=logging.INFO)
 
+HandlerType = TypeVar("HandlerType")  # pylint: disable=invalid-name
+ItemType = TypeVar("ItemType")  # pylint: disable=invalid-name
+
+PartitionKey = Callable[[InputEvent], Optional[Hashable]]
+
 
 class Bot:
     name: str  # The bot's name
     _io_configs: List[IOConfigInterface]  # Connections to bot makes to other services
     _behaviours: List[BehaviourInterface]  # All the things the bot does
     _datastores: Dict[str, DataSource[Any]]  # Data sources and stores for this bot
+    _runner_options: Dict[str, Any]  # Keyword options passed through to the BotRunner
 
     def __init__(self, name: str) -> None:
         self.name = name
         self._io_configs = []
         self._behaviours = []
         self._datastores = {}
+        self._runner_options = {}
+
+    def run(self, **options: Any) -> None:
+        """Starts the bot, blocking until it is stopped.
+
+        Any options given here are passed to the BotRunner, and take precedence
+        over those set with configure_runner (e.g. from the YAML configuration).
+        Setting the processes option to more than one runs the behaviours in that
+        many worker processes, using a mewbot.sharding.ShardedBotRunner."""
+
+        self.create_runner(**options).run()
+
+    def create_runner(self, **options: Any) -> BotRunner:
+        """Creates the BotRunner for this bot, without starting it (see run)"""
 
-    def run(self) -> None:
-        runner = BotRunner(
+        options = {
+            "input_priorities": self._marshal_input_priorities(),
+            "output_guards": self._marshal_output_settings("output_guard"),
+            "output_rate_limits": self._marshal_output_settings("output_rate_limit"),
+            "output_coalesces": self._marshal_output_settings("output_coalesce"),
+            "output_retries": self._marshal_output_settings("output_retry"),
+            **self._runner_options,
+            **options,
+        }
+
+        runner_class: Type[BotRunner] = BotRunner
+
+        if options.get("processes", 1) > 1:
+            # Imported here, as the sharded runner is built on top of this module
+            # pylint: disable=import-outside-toplevel,cyclic-import
+            from mewbot.sharding import ShardedBotRunner
+
+            runner_class = ShardedBotRunner
+        else:
+            options.pop("processes", None)
+
+        return runner_class(
             self._marshal_behaviours(),
             self._marshal_inputs(),
             self._marshal_outputs(),
+            **options,
         )
-        runner.run()
+
+    def configure_runner(self, **options: Any) -> None:
+        self._runner_options.update(options)
 
     def add_io_config(self, ioc: IOConfigInterface) -> None:
         self._io_configs.append(ioc)
@@ -71,6 +145,36 @@ class Bot:
 
         return inputs
 
+    def _marshal_input_priorities(self) -> Dict[InputInterface, int]:
+        priorities: Dict[InputInterface, int] = {}
+
+        for connection in self._io_configs:
+            priority = getattr(connection, "priority", None)
+
+            if priority is None:
+                continue
+
+            for con_input in connection.get_inputs():
+                priorities[con_input] = priority
+
+        return priorities
+
+    def _marshal_output_settings(self, name: str) -> Dict[OutputInterface, Mapping[str, Any]]:
+        """Gets a per-output runner option (e.g. output_guard) from each IOConfig"""
+
+        settings: Dict[OutputInterface, Mapping[str, Any]] = {}
+
+        for connection in self._io_configs:
+            setting = getattr(connection, name, None)
+
+            if not setting:
+                continue
+
+            for con_output in connection.get_outputs():
+                settings[con_output] = setting
+
+        return settings
+
     def _marshal_outputs(self) -> Dict[Type[OutputEvent], Set[OutputInterface]]:
         outputs: Dict[Type[OutputEvent], Set[OutputInterface]] = {}
 
@@ -82,32 +186,276 @@ class Bot:
         return outputs
 
 
-class BotRunner:
+class BotRunner:  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     input_event_queue: InputQueue
     output_event_queue: OutputQueue
 
     inputs: Set[InputInterface]
     outputs: Dict[Type[OutputEvent], Set[OutputInterface]] = {}
     behaviours: Dict[Type[InputEvent], Set[BehaviourInterface]] = {}
+    commands: CommandIndex  # Finds the behaviours an event's command could trigger
+    shared_results: SharedResults  # Identical pure components, which share their results
+
+    _input_dispatch: Dict[Type[InputEvent], Tuple[BehaviourInterface, ...]]
+    _output_dispatch: Dict[Type[OutputEvent], Tuple[OutputInterface, ...]]
+
+    output_lanes: Dict[OutputInterface, OutputLane]
 
+    input_workers: int
+    partition_key: Optional[PartitionKey]
+    input_priorities: Dict[InputInterface, int]
+    drain_timeout: float
+    batch_size: int
+
+    metrics: RunnerMetrics
+    metrics_host: str
+    metrics_port: Optional[int]
+    tracer: Optional[Tracer]
+    profile_window: float
+    profile_report: Optional[str]
+    recorder: Optional[EventRecorder]
+    executors: Executors
+    input_log: Optional[WriteAheadLog]
+    deduplicator: Optional[Deduplicator]
+    watch_config: Optional[str]
+    watch_interval: float
+
+    _partition_lanes: List[InputQueue]
+    _routing: Optional[InputEvent]  # An event the router is waiting to put in a full lane
+    _idle: Set[asyncio.Task[Any]]
+    _profiler: Optional[Profiler] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
     _running: bool = False
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-locals
         self,
         behaviours: Dict[Type[InputEvent], Set[BehaviourInterface]],
         inputs: Set[InputInterface],
         outputs: Dict[Type[OutputEvent], Set[OutputInterface]],
+        *,
+        input_workers: int = 1,
+        partition_key: Optional[PartitionKey] = None,
+        output_lane_size: int = 100,
+        input_queue: Optional[Mapping[str, Any]] = None,
+        output_queue: Optional[Mapping[str, Any]] = None,
+        input_log: Optional[Mapping[str, Any]] = None,
+        deduplicate: Optional[Mapping[str, Any]] = None,
+        input_priorities: Optional[Mapping[InputInterface, int]] = None,
+        output_guard: Optional[Mapping[str, Any]] = None,
+        output_guards: Optional[Mapping[OutputInterface, Mapping[str, Any]]] = None,
+        output_rate_limit: Optional[Mapping[str, Any]] = None,
+        output_rate_limits: Optional[Mapping[OutputInterface, Mapping[str, Any]]] = None,
+        output_coalesce: Optional[Mapping[str, Any]] = None,
+        output_coalesces: Optional[Mapping[OutputInterface, Mapping[str, Any]]] = None,
+        output_retry: Optional[Mapping[str, Any]] = None,
+        output_retries: Optional[Mapping[OutputInterface, Mapping[str, Any]]] = None,
+        dead_letters: Sequence[DeadLetterSink] = (),
+        drain_timeout: float = 5.0,
+        batch_size: int = 1,
+        metrics_host: str = "localhost",
+        metrics_port: Optional[int] = None,
+        trace_exporters: Sequence[SpanExporter] = (),
+        profile_window: float = 30.0,
+        profile_report: Optional[str] = None,
+        record_events: Optional[str] = None,
+        thread_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        watch_config: Optional[str] = None,
+        watch_interval: float = 2.0,
     ) -> None:
+        """
+        :param input_workers:
+            The number of tasks which concurrently take events off the input
+            queue and pass them to behaviours.
+        :param partition_key:
+            Optional function mapping each input event to a key. Events which
+            share a key are always processed in order by the same worker;
+            events with different keys may be processed in parallel.
+            Events with a key of None are shared out between the workers.
+        :param output_lane_size:
+            The number of events which can be waiting for each output before
+            further events for that output are dropped.
+        :param input_queue:
+            Options for the input queue (see mewbot.queues.create_queue), setting
+            its maximum size, overflow policy, and event priorities.
+            By default the queue is unbounded and first-in first-out.
+        :param output_queue:
+            Options for the output queue, as for the input queue.
+        :param input_log:
+            Options for a write-ahead log of the input queue (see mewbot.wal),
+            which must include the directory to keep it in. Each event is
+            logged before it is queued, and acknowledged once it has been
+            dispatched, so events which are still queued when the process is
+            killed are processed when it next starts.
+        :param deduplicate:
+            Options for dropping input events which have already been seen
+            (see mewbot.dedup.Deduplicator): the identities function for each
+            event class, and the size and ttl of the cache of seen events.
+        :param input_priorities:
+            The default priority of the events from each input, used when the
+            input queue is a priority queue. These are normally taken from the
+            priority property of each input's IOConfig.
+        :param output_guard:
+            The timeout, failure_threshold, and reset_timeout for calls to every
+            output (see mewbot.breaker.CircuitBreaker). By default there are none.
+        :param output_guards:
+            Guard settings for specific outputs, taking precedence over the
+            output_guard option. These are normally taken from the output_guard
+            property of each output's IOConfig.
+        :param output_rate_limit:
+            The rate, burst, global_rate, and global_burst of the events sent by
+            every output (see mewbot.scheduling.OutputScheduler). Events for
+            each destination are sent at up to rate per second, and for all
+            of an output's destinations at up to global_rate per second.
+            By default events are sent as soon as possible.
+        :param output_rate_limits:
+            Rate limits for specific outputs, taking precedence over the
+            output_rate_limit option. These are normally taken from the
+            output_rate_limit property of each output's IOConfig.
+        :param output_coalesce:
+            The merges, window, and max_events for merging bursts of events
+            sent to the same destination by every output (see
+            mewbot.coalescing.Coalescer). merges maps each event class to the
+            function merging its events. By default events are not merged.
+        :param output_coalesces:
+            Coalescing settings for specific outputs, taking precedence over
+            the output_coalesce option. These are normally taken from the
+            output_coalesce property of each output's IOConfig.
+        :param output_retry:
+            The max_attempts, base_delay, max_delay, and jitter for retrying the
+            events which every output fails to send (see mewbot.retry). Failed
+            events are retried after an exponential backoff, while the output
+            carries on with other events. By default failed events are not
+            retried, and an output raising an exception stops the bot.
+        :param output_retries:
+            Retry settings for specific outputs, taking precedence over the
+            output_retry option. These are normally taken from the
+            output_retry property of each output's IOConfig.
+        :param dead_letters:
+            Sinks for the events which outputs have failed to send max_attempts
+            times (see mewbot.retry.DeadLetterSink). By default they are logged.
+        :param drain_timeout:
+            How long, in seconds, to spend processing the events left in the
+            queues when the bot is stopped. Any events still queued after this
+            are dropped.
+        :param batch_size:
+            The maximum number of already-queued events to take and dispatch
+            together. Behaviours and Outputs with a process_batch/output_batch
+            method receive the events of a batch in one call.
+        :param metrics_host:
+            The address to serve the runner's metrics on, if metrics_port is set.
+        :param metrics_port:
+            If set, the runner's metrics (see mewbot.metrics) are served in the
+            Prometheus text format over HTTP on this port, at /metrics.
+        :param trace_exporters:
+            If any are given, events are traced from their input through to
+            their outputs (see mewbot.tracing), and the spans recorded for each
+            stage are passed to these exporters.
+        :param profile_window:
+            How long, in seconds, to profile the bot's components for when
+            profiling is switched on (by SIGUSR1, or the metrics listener's
+            /profile route).
+        :param profile_report:
+            A file to append profiling reports to. By default they are logged.
+        :param record_events:
+            A file to append every input event to as it is queued, so that the
+            events can be replayed later with mewbot.io.replay.ReplayIO.
+        :param thread_workers:
+            The size of the thread pool used by components with an execution
+            of "thread" (see mewbot.execution). By default this is based on the
+            number of CPUs.
+        :param process_workers:
+            The size of the process pool used by components with an execution
+            of "process". By default this is the number of CPUs.
+        :param watch_config:
+            The YAML configuration file the bot was loaded from. If set, the
+            file is watched, and changes to its behaviours are applied to the
+            running bot (see mewbot.loader.ConfigWatcher).
+        :param watch_interval:
+            How often, in seconds, to check the watched configuration file.
+        """
+
+        if batch_size < 1:
+            raise ValueError(f"BotRunner batch_size must be at least one, got {batch_size}")
+
+        if input_workers < 1:
+            raise ValueError(
+                f"BotRunner needs at least one input worker, got {input_workers}"
+            )
 
         self.logger = logging.getLogger(__name__ + "BotRunner")
 
-        self.input_event_queue = InputQueue()
-        self.output_event_queue = OutputQueue()
+        self.input_event_queue = create_queue(**input_queue) if input_queue else InputQueue()
+        self.output_event_queue = (
+            create_queue(**output_queue) if output_queue else OutputQueue()
+        )
 
         self.inputs = inputs
         self.outputs = outputs
         self.behaviours = behaviours
 
+        self.input_workers = input_workers
+        self.partition_key = partition_key
+        self.input_priorities = dict(input_priorities or {})
+        self.drain_timeout = drain_timeout
+        self.batch_size = batch_size
+
+        self.metrics = RunnerMetrics(self)
+        self.metrics_host = metrics_host
+        self.metrics_port = metrics_port
+        self.tracer = Tracer(trace_exporters) if trace_exporters else None
+        self.profile_window = profile_window
+        self.profile_report = profile_report
+        self.recorder = EventRecorder(record_events) if record_events else None
+        self.executors = Executors(thread_workers, process_workers)
+        self.input_log = WriteAheadLog(**input_log) if input_log else None
+        self.deduplicator = Deduplicator(**deduplicate) if deduplicate else None
+        self.watch_config = watch_config
+        self.watch_interval = watch_interval
+
+        # Tasks which are currently waiting for an event to arrive.
+        # These are cancelled on shutdown, as they have no work in progress.
+        self._idle = set()
+        self._partition_lanes = []
+        self._routing = None
+
+        # Each output gets its own delivery lane, so they can all run in parallel
+        guards = dict(output_guards or {})
+        rate_limits = dict(output_rate_limits or {})
+        coalesces = dict(output_coalesces or {})
+        retries = dict(output_retries or {})
+        self.dead_letters = dead_letters
+        self.output_lanes = {
+            output: OutputLane(
+                output,
+                output_lane_size,
+                self.tracer,
+                make_breaker(output, guards.get(output, output_guard)),
+                rate_limits.get(output, output_rate_limit),
+                coalesces.get(output, output_coalesce),
+                retries.get(output, output_retry),
+                dead_letters,
+            )
+            for output in itertools.chain(*self.outputs.values())
+        }
+
+        # Dispatch tables, mapping a concrete event class to everything which
+        # consumes it. These are seeded with the configured event types, and
+        # any subclasses seen at runtime are resolved on first sight.
+        self._input_dispatch = {}
+        self._output_dispatch = {}
+
+        for input_type in self.behaviours:
+            self.behaviours_for(input_type)
+        for output_type in self.outputs:
+            self.outputs_for(output_type)
+
+        # Behaviours only triggered by commands are looked up by each message's command
+        self.commands = CommandIndex(self.all_behaviours())
+
+        # Identical pure triggers and conditions are evaluated once per event
+        self.shared_results = SharedResults(self.all_behaviours())
+
     def run(self, _loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
         if self._running:
             raise RuntimeError("Bot is already running")
@@ -115,24 +463,24 @@ class BotRunner:
         loop = _loop if _loop else asyncio.get_event_loop()
 
         self.logger.info("Starting main event loop")
+        self._loop = loop
         self._running = True
 
-        def stop(info: Optional[Any] = None) -> None:
-            self.logger.warning("Stop called: %s", info)
-            if self._running and loop.is_running():
-                self.logger.info("Stopping loop run")
-                loop.stop()
-            self._running = False
+        processing_tasks = self.setup_workers(loop)
+        processing_tasks.append(loop.create_task(self.process_output_queue()))
+        processing_tasks.extend(
+            loop.create_task(self.process_output_lane(lane))
+            for lane in self.output_lanes.values()
+        )
 
-        input_task = loop.create_task(self.process_input_queue())
-        input_task.add_done_callback(stop)
-        output_task = loop.create_task(self.process_output_queue())
-        output_task.add_done_callback(stop)
+        for task in processing_tasks:
+            task.add_done_callback(self.stop)
 
         input_tasks = self.setup_tasks(loop)
 
         # Handle correctly terminating the loop
-        self.add_signal_handlers(loop, stop)
+        self.add_signal_handlers(loop, self.stop)
+        self.add_profile_handler(loop)
 
         try:
             loop.run_forever()
@@ -144,8 +492,26 @@ class BotRunner:
                     self.logger.warning("Cancelling %s: %s", task, result)
 
             # Finish processing anything already in the queues.
-            loop.run_until_complete(input_task)
-            loop.run_until_complete(output_task)
+            loop.run_until_complete(self.drain(processing_tasks))
+
+            if self.tracer:
+                self.tracer.close()
+            if self.recorder:
+                self.recorder.close()
+            if self.input_log:
+                self.input_log.close()
+            for sink in self.dead_letters:
+                sink.close()
+            self.executors.shutdown()
+
+    def stop(self, info: Optional[Any] = None) -> None:
+        """Stops the runner, which will then finish processing queued events"""
+
+        self.logger.warning("Stop called: %s", info)
+        if self._running and self._loop and self._loop.is_running():
+            self.logger.info("Stopping loop run")
+            self._loop.stop()
+        self._running = False
 
     @staticmethod
     def add_signal_handlers(
@@ -168,42 +534,522 @@ class BotRunner:
             # We're probably running on windows, where this is not an option
             pass
 
+    def add_profile_handler(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Switches on profiling for the profile window when sent SIGUSR1"""
+
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, self.start_profile)
+        except (AttributeError, NotImplementedError):
+            # We're probably running on windows, which has no SIGUSR1
+            pass
+
+    def start_profile(self) -> None:
+        """Starts profiling in the background, unless it is already running"""
+
+        if self._profiler or not self._loop:
+            self.logger.warning("Profiling is already running")
+            return
+
+        self._loop.create_task(self.profile())
+
+    async def profile(self, window: Optional[float] = None) -> ProfileReport:
+        """Profiles the bot's components for a time, then writes out a report
+
+        The report is appended to the profile_report file if one is configured,
+        and logged otherwise."""
+
+        if self._profiler:
+            raise RuntimeError("Profiling is already running")
+
+        window = self.profile_window if window is None else window
+
+        components: List[Any] = list(self.output_lanes)
+        for behaviour in self.all_behaviours():
+            components.extend(behaviour_components(behaviour))
+
+        self.logger.info("Profiling %d components for %ss", len(components), window)
+        self._profiler = Profiler(components)
+
+        try:
+            report = await self._profiler.profile(window)
+        finally:
+            self._profiler = None
+
+        if self.profile_report:
+            with open(self.profile_report, "a", encoding="utf-8") as output:
+                output.write(report.format() + "\n\n")
+        else:
+            self.logger.info("%s", report.format())
+
+        return report
+
     def setup_tasks(self, loop: asyncio.AbstractEventLoop) -> List[asyncio.Task[None]]:
         input_tasks: List[asyncio.Task[None]] = []
 
         # Startup the outputs - which are contained in the behaviors
         for behaviour in itertools.chain(*self.behaviours.values()):
-            self.logger.info("Binding behaviour %s", behaviour)
-            behaviour.bind_output(self.output_event_queue)
+            self.bind_behaviour(behaviour)
+
+        if self.input_log:
+            if isinstance(self.input_event_queue, BoundedQueue):
+                # Events dropped by the queue's overflow policy won't ever be processed
+                self.input_event_queue.on_drop = self.input_log.ack
+
+            input_tasks.append(loop.create_task(self.input_log.run()))
+            input_tasks.append(loop.create_task(self.recover_inputs(self.input_log)))
 
         # Startup the inputs
         for _input in self.inputs:
-            _input.bind(self.input_event_queue)
+            _input.bind(self.input_queue_for(_input))
             self.logger.info("Starting input %s", _input)
             input_tasks.append(loop.create_task(_input.run()))
 
+        if self.metrics_port is not None:
+            # Imported here, so that aiohttp is only loaded if metrics are served
+            # pylint: disable=import-outside-toplevel
+            from mewbot.io.http import MetricsListener
+
+            listener = MetricsListener(self, self.metrics_host, self.metrics_port)
+            self.logger.info("Serving metrics on %s", listener)
+            input_tasks.append(loop.create_task(listener.run()))
+
+        if self.watch_config:
+            # Imported here, as the loader depends on this module
+            # pylint: disable=import-outside-toplevel,cyclic-import
+            from mewbot.loader import ConfigWatcher
+
+            watcher = ConfigWatcher(self.watch_config, self, self.watch_interval)
+            self.logger.info("Watching %s for changes", self.watch_config)
+            input_tasks.append(loop.create_task(watcher.run()))
+
         return input_tasks
 
-    async def process_input_queue(self) -> None:
+    async def recover_inputs(self, input_log: WriteAheadLog) -> None:
+        """Queues the events which were not processed before the bot last stopped.
+
+        They are put on the queue like any other event, so a full queue applies
+        its overflow policy to them (and blocks this task if the policy is to
+        block). Events not yet queued when the bot stops are recovered again."""
+
+        for event in input_log.recover():
+            await self.input_event_queue.put(event)
+
+    def bind_behaviour(self, behaviour: BehaviourInterface) -> None:
+        self.logger.info("Binding behaviour %s", behaviour)
+        behaviour.bind_output(self.output_event_queue)
+
+        # Behaviours with components which can run in the thread or process pools
+        bind_executors = getattr(behaviour, "bind_executors", None)
+        if bind_executors:
+            bind_executors(self.executors)
+
+    def update_behaviours(
+        self,
+        added: Collection[BehaviourInterface] = (),
+        removed: Collection[BehaviourInterface] = (),
+        changed: Collection[BehaviourInterface] = (),
+    ) -> None:
+        """Adds and removes behaviours while the runner is running.
+
+        Changed behaviours are ones which are kept, but whose components have
+        been replaced; they are bound again, and the events they consume are
+        re-read. The dispatch tables are rebuilt and swapped in at once, so
+        each event is dispatched entirely to either the old or new behaviours."""
+
+        for behaviour in itertools.chain(added, changed):
+            self.bind_behaviour(behaviour)
+
+        behaviours: Dict[Type[InputEvent], Set[BehaviourInterface]] = {}
+
+        for behaviour in itertools.chain(self.all_behaviours(), added):
+            if behaviour in removed:
+                continue
+
+            for event_type in behaviour.consumes_inputs():
+                behaviours.setdefault(event_type, set()).add(behaviour)
+
+        dispatch = {
+            event_type: resolve_dispatch(behaviours, event_type)
+            for event_type in itertools.chain(behaviours, self._input_dispatch)
+        }
+
+        all_behaviours = dict.fromkeys(itertools.chain(*behaviours.values()))
+        commands = CommandIndex(all_behaviours)
+        shared_results = SharedResults(all_behaviours)
+
+        self.behaviours = behaviours
+        self._input_dispatch = dispatch
+        self.commands = commands
+        self.shared_results = shared_results
+
+        self.logger.info(
+            "Updated behaviours: %d added, %d removed, %d changed",
+            len(added),
+            len(removed),
+            len(changed),
+        )
+
+    def input_queue_for(self, _input: InputInterface) -> InputQueue:
+        """The queue an input should put its events on
+
+        When the input queue supports priorities and the input has a default
+        priority, the input is given a producer handle which applies it.
+        With an input log, the input's events are logged before being queued.
+        When tracing, the input's events are traced from when they are queued.
+        Duplicate events are dropped before they are traced or logged, and
+        when recording, events are recorded before anything else happens."""
+
+        queue = self.input_event_queue
+
+        if isinstance(queue, PriorityEventQueue) and _input in self.input_priorities:
+            # The producer offers the same put methods as the queue itself
+            queue = cast(InputQueue, queue.producer(self.input_priorities[_input]))
+
+        if self.input_log:
+            queue = cast(InputQueue, self.input_log.producer(queue))
+
+        if self.tracer:
+            queue = cast(InputQueue, self.tracer.producer(queue))
+
+        if self.deduplicator:
+            queue = cast(InputQueue, self.deduplicator.producer(queue))
+
+        if self.recorder:
+            queue = cast(InputQueue, self.recorder.producer(queue))
+
+        return queue
+
+    def setup_workers(self, loop: asyncio.AbstractEventLoop) -> List[asyncio.Task[None]]:
+        """Creates the tasks which consume the input queue
+
+        Without a partition key, every worker reads from the shared input queue.
+        With one, a router task takes events from the input queue and hands
+        each one to the worker which owns that event's key."""
+
+        if not self.partition_key:
+            return [
+                loop.create_task(self.process_input_queue())
+                for _ in range(self.input_workers)
+            ]
+
+        # The lanes only hold a batch plus one more event, so that events wait in the
+        # input queue, where its size limit, overflow policy and priorities apply
+        lanes: List[InputQueue] = [
+            InputQueue(maxsize=self.batch_size + 1) for _ in range(self.input_workers)
+        ]
+        self._partition_lanes = lanes
+
+        tasks = [loop.create_task(self.process_input_queue(lane)) for lane in lanes]
+        tasks.append(loop.create_task(self.route_input_queue(self.partition_key, lanes)))
+
+        return tasks
+
+    async def drain(self, tasks: Collection[asyncio.Task[None]]) -> int:
+        """Finishes processing events once the runner has been stopped.
+
+        Processing tasks which are waiting for an event are stopped, and those
+        part way through an event are allowed to finish it. Events left in the
+        queues are then processed until the queues are empty, or until the
+        drain_timeout expires.
+
+        Returns the number of events which were dropped."""
+
+        for task in self._idle:
+            task.cancel()
+
+        try:
+            await asyncio.wait_for(self._drain(tasks), self.drain_timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning("Timed out after %ss draining events", self.drain_timeout)
+
+        remaining = [task for task in tasks if not task.done()]
+        for task in remaining:
+            task.cancel()
+        await asyncio.gather(*remaining, return_exceptions=True)
+
+        # Events still waiting to be retried are not dropped silently
+        for lane in self.output_lanes.values():
+            lane.give_up()
+
+        dropped = self.pending_events()
+
+        if dropped:
+            self.logger.warning("Dropped %d events which were not processed", dropped)
+        else:
+            self.logger.info("All events processed")
+
+        return dropped
+
+    async def _drain(self, tasks: Collection[asyncio.Task[None]]) -> None:
+        await self._drain_inputs(tasks)
+        await self._drain_outputs()
+
+    async def _drain_inputs(self, tasks: Collection[asyncio.Task[None]]) -> None:
+        if tasks:
+            await asyncio.wait(tasks)
+
+        # Events are drained oldest first, so each key's events stay in order:
+        # those already routed to a lane, then the one the router was waiting
+        # to put in a lane, then those still in the input queue
+        for lane in self._partition_lanes:
+            while not lane.empty():
+                await self._dispatch_drained(lane.get_nowait())
+
+        if self._routing is not None:
+            event, self._routing = self._routing, None
+            await self._dispatch_drained(event)
+
+        while not self.input_event_queue.empty():
+            await self._dispatch_drained(self.input_event_queue.get_nowait())
+
+    async def _dispatch_drained(self, event: InputEvent) -> None:
+        await self.dispatch_input(event)
+
+        if self.input_log:
+            self.input_log.ack(event)
+
+    async def _drain_outputs(self) -> None:
+        while not self.output_event_queue.empty():
+            self.dispatch_output(self.output_event_queue.get_nowait())
+
+        # Lanes are drained side by side, as rate-limited ones may have to wait
+        await asyncio.gather(*(self._drain_lane(lane) for lane in self.output_lanes.values()))
+
+    @staticmethod
+    async def _drain_lane(lane: OutputLane) -> None:
+        lane.flush()
+
+        while lane.depth:
+            await lane.deliver(await lane.take())
+
+    def event_queues(self) -> Dict[str, asyncio.Queue[Any]]:
+        """The runner's event queues, by name"""
+
+        queues: Dict[str, asyncio.Queue[Any]] = {
+            "input": self.input_event_queue,
+            "output": self.output_event_queue,
+        }
+
+        for number, lane in enumerate(self._partition_lanes):
+            queues[f"partition_{number}"] = lane
+
+        return queues
+
+    def pending_events(self) -> int:
+        """The number of events which are queued, but not yet processed"""
+
+        return (
+            self.input_event_queue.qsize()
+            + sum(lane.qsize() for lane in self._partition_lanes)
+            + (self._routing is not None)
+            + self.output_event_queue.qsize()
+            + sum(lane.depth for lane in self.output_lanes.values())
+        )
+
+    def breakers(self) -> Dict[str, CircuitBreaker]:
+        """The circuit breakers guarding the runner's components, by name"""
+
+        components: List[Any] = list(self.output_lanes.values())
+        for behaviour in self.all_behaviours():
+            components.extend(behaviour_components(behaviour))
+
+        breakers = (getattr(component, "breaker", None) for component in components)
+
+        return {
+            breaker.name: breaker
+            for breaker in breakers
+            if isinstance(breaker, CircuitBreaker)
+        }
+
+    def all_behaviours(self) -> Tuple[BehaviourInterface, ...]:
+        """Every behaviour the runner dispatches events to"""
+        return tuple(dict.fromkeys(itertools.chain(*self.behaviours.values())))
+
+    def behaviours_for(self, event_type: Type[InputEvent]) -> Tuple[BehaviourInterface, ...]:
+        """All the behaviours which consume a given class of input event"""
+
+        try:
+            return self._input_dispatch[event_type]
+        except KeyError:
+            handlers = resolve_dispatch(self.behaviours, event_type)
+            self._input_dispatch[event_type] = handlers
+            return handlers
+
+    def outputs_for(self, event_type: Type[OutputEvent]) -> Tuple[OutputInterface, ...]:
+        """All the outputs which consume a given class of output event"""
+
+        try:
+            return self._output_dispatch[event_type]
+        except KeyError:
+            handlers = resolve_dispatch(self.outputs, event_type)
+            self._output_dispatch[event_type] = handlers
+            return handlers
+
+    async def next_item(self, getter: Awaitable[ItemType]) -> Optional[ItemType]:
+        """Waits for the next item from a queue.
+
+        While waiting, the current task is marked as idle, so that it can be
+        cancelled when the runner stops. Returns None if that happens."""
+
+        task = asyncio.current_task()
+        assert task, "next_item must be called from a task"
+
+        self._idle.add(task)
+        try:
+            return await getter
+        except asyncio.CancelledError:
+            if self._running:
+                raise
+            return None
+        finally:
+            self._idle.discard(task)
+
+    async def route_input_queue(self, key: PartitionKey, lanes: List[InputQueue]) -> None:
+        while self._running:
+            event = await self.next_item(self.input_event_queue.get())
+
+            if event is None:
+                return
+
+            partition = key(event)
+
+            if partition is None:
+                # Unkeyed events go to whichever worker has the least waiting
+                lane = min(lanes, key=lambda lane: lane.qsize())
+            else:
+                lane = lanes[hash(partition) % len(lanes)]
+
+            # Held while waiting for room in the lane, so that the drain can
+            # process it if the runner stops in the meantime
+            self._routing = event
+
+            if not await self.next_item(put_item(lane, event)):
+                return
+
+            self._routing = None
+
+    async def process_input_queue(self, queue: Optional[InputQueue] = None) -> None:
+        queue = queue if queue is not None else self.input_event_queue
+
         while self._running:
-            try:
-                event = await asyncio.wait_for(self.input_event_queue.get(), 5)
-            except asyncio.exceptions.TimeoutError:
+            event = await self.next_item(queue.get())
+
+            if event is None:
+                return
+
+            if self.batch_size > 1:
+                batch = take_batch(queue, event, self.batch_size)
+                await self.dispatch_input_batch(batch)
+
+                if self.input_log:
+                    self.input_log.ack_all(batch)
                 continue
 
-            for event_type in self.behaviours:
-                if isinstance(event, event_type):
-                    for behaviour in self.behaviours[event_type]:
-                        await behaviour.process(event)
+            await self.dispatch_input(event)
+
+            if self.input_log:
+                self.input_log.ack(event)
 
     async def process_output_queue(self) -> None:
         while self._running:
-            try:
-                event = await asyncio.wait_for(self.output_event_queue.get(), 5)
-            except asyncio.exceptions.TimeoutError:
-                continue
+            event = await self.next_item(self.output_event_queue.get())
+
+            if event is None:
+                return
+
+            self.dispatch_output(event)
+
+    async def process_output_lane(self, lane: OutputLane) -> None:
+        while self._running:
+            entry = await self.next_item(lane.take())
+
+            if entry is None:
+                return
+
+            if self.batch_size > 1:
+                await lane.deliver_batch(lane.take_batch(entry, self.batch_size))
+            else:
+                await lane.deliver(entry)
+
+    async def dispatch_input(self, event: InputEvent) -> None:
+        self.metrics.record_input(type(event))
+
+        behaviours = self.commands.select(event, self.behaviours_for(type(event)))
+
+        with self.shared_results.dispatching():
+            if self.tracer:
+                await self.tracer.process(event, behaviours)
+                return
+
+            for behaviour in behaviours:
+                await behaviour.process(event)
+
+    async def dispatch_input_batch(self, events: Sequence[InputEvent]) -> None:
+        """Passes a batch of events to the behaviours which consume them.
+
+        Each behaviour is given all of its events from the batch in turn, either
+        with one call to process_batch if it has one, or in order to process().
+        Traced events are dispatched one at a time, so each can be followed."""
+
+        if self.tracer:
+            for event in events:
+                await self.dispatch_input(event)
+            return
+
+        batches: Dict[BehaviourInterface, List[InputEvent]] = {}
+
+        for event in events:
+            self.metrics.record_input(type(event))
+
+            for behaviour in self.commands.select(event, self.behaviours_for(type(event))):
+                batches.setdefault(behaviour, []).append(event)
+
+        with self.shared_results.dispatching():
+            for behaviour, batch in batches.items():
+                if len(batch) > 1 and isinstance(behaviour, BatchBehaviourInterface):
+                    await behaviour.process_batch(batch)
+                    continue
+
+                for event in batch:
+                    await behaviour.process(event)
+
+    def dispatch_output(self, event: OutputEvent) -> None:
+        self.metrics.record_output(type(event))
+
+        for output in self.outputs_for(type(event)):
+            self.output_lanes[output].offer(event)
+
+
+async def put_item(queue: asyncio.Queue[ItemType], item: ItemType) -> bool:
+    """Puts an item on a queue, waiting for room, and returns True once it has been put"""
+
+    await queue.put(item)
+    return True
+
+
+def make_breaker(
+    output: OutputInterface, guard: Optional[Mapping[str, Any]]
+) -> Optional[CircuitBreaker]:
+    """Creates the circuit breaker for an output, if it has guard settings"""
+
+    if not guard:
+        return None
+
+    return CircuitBreaker.from_config(f"{type(output).__qualname__} {id(output):x}", guard)
+
+
+def resolve_dispatch(
+    registry: Dict[Type[Any], Set[HandlerType]], event_type: Type[Any]
+) -> Tuple[HandlerType, ...]:
+    """Flattens the handlers for an event class and all of its parent classes
+
+    The registry is walked in method resolution order, so handlers registered
+    against the most specific class come first. A handler registered against
+    more than one class in the hierarchy is only included once."""
+
+    handlers: Dict[HandlerType, None] = {}
+
+    for base in event_type.__mro__:
+        handlers.update(dict.fromkeys(registry.get(base, ())))
 
-            for event_type in self.outputs:
-                if isinstance(event, event_type):
-                    for output in self.outputs[event_type]:
-                        await output.output(event)
+    return tuple(handlers)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""Timeouts and circuit breakers for the components of a bot.
+
+A CircuitBreaker runs a component's coroutines (such as Action.act or
+Output.output) with an optional timeout. After a number of consecutive
+failures or timeouts it opens, and the component is skipped for a while.
+After that the breaker is half-open: one call is let through as a probe,
+and the breaker closes again if it succeeds, or reopens if it fails.
+
+Calls which fail, time out, or are skipped raise ComponentFailure, so a
+misbehaving component is contained rather than stopping the bot.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Coroutine, Mapping, Optional, TypeVar
+
+import asyncio
+import enum
+import logging
+import time
+
+ResultType = TypeVar("ResultType")  # pylint: disable=invalid-name
+
+
+class BreakerState(str, enum.Enum):
+    CLOSED = "closed"  # Calls are made as normal
+    OPEN = "open"  # Calls are skipped
+    HALF_OPEN = "half_open"  # One call is being made to see if the component has recovered
+
+
+class ComponentFailure(Exception):
+    """A guarded call failed, timed out, or was skipped by an open breaker"""
+
+
+class CircuitBreaker:  # pylint: disable=too-many-instance-attributes
+    """Guards calls to one component with a timeout and a circuit breaker"""
+
+    name: str
+    timeout: Optional[float]  # Seconds a call may take, or None for no limit
+    failure_threshold: int  # Consecutive failures which open the breaker, or 0 to never open
+    reset_timeout: float  # Seconds the breaker stays open before a probe call
+
+    state: BreakerState
+
+    calls: int  # Calls made to the component
+    failures: int  # Calls which raised an exception
+    timeouts: int  # Calls which took too long
+    skipped: int  # Calls not made because the breaker was open
+    trips: int  # Number of times the breaker has opened
+
+    _consecutive: int
+    _opened: float
+    _logger: logging.Logger
+
+    def __init__(
+        self,
+        name: str,
+        timeout: Optional[float] = None,
+        failure_threshold: int = 0,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.timeout = None if timeout is None else float(timeout)
+        self.failure_threshold = int(failure_threshold)
+        self.reset_timeout = float(reset_timeout)
+
+        self.state = BreakerState.CLOSED
+
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.trips = 0
+
+        self._consecutive = 0
+        self._opened = 0.0
+        self._logger = logging.getLogger(__name__ + "CircuitBreaker")
+
+    @classmethod
+    def from_config(cls, name: str, config: Mapping[str, Any]) -> CircuitBreaker:
+        """Creates a breaker from a `guard` configuration block.
+
+        The block may set timeout, failure_threshold, and reset_timeout."""
+
+        unknown = set(config).difference({"timeout", "failure_threshold", "reset_timeout"})
+        if unknown:
+            raise ValueError(f"Unknown guard options {unknown} for {name}")
+
+        return cls(name, **config)
+
+    def __str__(self) -> str:
+        return f"CircuitBreaker({self.name}, {self.state.value})"
+
+    def allow(self) -> bool:
+        """Whether a call should be made to the component now"""
+
+        if self.state == BreakerState.CLOSED:
+            return True
+
+        if self.state == BreakerState.OPEN:
+            if time.monotonic() - self._opened < self.reset_timeout:
+                return False
+
+            self.state = BreakerState.HALF_OPEN
+            self._logger.info("Probing %s after %ss", self.name, self.reset_timeout)
+            return True
+
+        # Half-open, with a probe call already in progress
+        return False
+
+    async def call(self, coroutine: Coroutine[Any, Any, ResultType]) -> ResultType:
+        """Awaits a call to the component, subject to the timeout and breaker"""
+
+        if not self.allow():
+            coroutine.close()
+            self.skipped += 1
+            raise ComponentFailure(f"{self.name} is unavailable (circuit open)")
+
+        self.calls += 1
+
+        try:
+            if self.timeout is None:
+                result = await coroutine
+            else:
+                result = await asyncio.wait_for(coroutine, self.timeout)
+        except asyncio.TimeoutError as exc:
+            self.timeouts += 1
+            self._failed(f"timed out after {self.timeout}s")
+            raise ComponentFailure(f"{self.name} timed out") from exc
+        except Exception as exc:
+            self.failures += 1
+            self._failed(repr(exc))
+            raise ComponentFailure(f"{self.name} failed: {exc!r}") from exc
+        except BaseException:
+            # Cancelled (e.g. by an outer guard's timeout, or the bot stopping), which
+            # says nothing about the component; a probe gives up its slot to the next call
+            if self.state == BreakerState.HALF_OPEN:
+                self.state = BreakerState.OPEN
+            raise
+
+        self._succeeded()
+        return result
+
+    def _succeeded(self) -> None:
+        if self.state == BreakerState.HALF_OPEN:
+            self._logger.warning("Closing circuit for %s, as it has recovered", self.name)
+
+        self.state = BreakerState.CLOSED
+        self._consecutive = 0
+
+    def _failed(self, reason: str) -> None:
+        self._consecutive += 1
+        self._logger.warning("%s %s", self.name, reason)
+
+        if self.state == BreakerState.HALF_OPEN or (
+            self.failure_threshold and self._consecutive >= self.failure_threshold
+        ):
+            self.state = BreakerState.OPEN
+            self._opened = time.monotonic()
+            self.trips += 1
+
+            self._logger.error(
+                "Opening circuit for %s after %d consecutive failures; skipping it for %ss",
+                self.name,
+                self._consecutive,
+                self.reset_timeout,
+            )
+
+
+__all__ = ["BreakerState", "CircuitBreaker", "ComponentFailure"]
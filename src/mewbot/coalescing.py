@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+"""Merging bursts of output events for the same destination.
+
+Behaviours often send several events to one destination in quick succession
+(e.g. a line of text per result), each of which costs an API call and a share
+of the destination's rate limit. A Coalescer sits in front of an output's
+lane: it holds each destination's events for a short window (or until enough
+have arrived), then merges them with the merge function configured for their
+class (or the nearest parent class which has one), e.g. joining their texts
+into a single message.
+
+Events of classes without a merge function are passed straight through, after
+any events held for the same destination so the order is kept. Each merged
+event is queued as of the earliest event merged into it, and carries on its
+trace.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+import asyncio
+import dataclasses
+import logging
+
+from mewbot.core import OutputEvent
+from mewbot.tracing import TRACE_ATTRIBUTE
+
+Entry = Tuple[float, OutputEvent]  # The time an event was queued, and the event
+MergeFunction = Callable[[Sequence[Any]], Sequence[Any]]
+
+
+class Coalescer:  # pylint: disable=too-many-instance-attributes
+    """Holds an output's events for each destination, and merges them"""
+
+    destination: Callable[[OutputEvent], Hashable]  # Gets the destination of an event
+    sink: Callable[[Entry], bool]  # Queues an event for delivery
+    window: float  # Seconds to hold a destination's first event for
+    max_events: int  # Events to hold for a destination before merging early
+    merges: Dict[Type[Any], MergeFunction]
+
+    held: int  # Events which have been held to be merged
+    coalesced: int  # Events which were merged into another (i.e. calls saved)
+
+    _buffers: Dict[Hashable, List[Entry]]
+    _timers: Dict[Hashable, asyncio.TimerHandle]
+    _resolved: Dict[Type[Any], Optional[MergeFunction]]
+    _logger: logging.Logger
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        destination: Callable[[OutputEvent], Hashable],
+        sink: Callable[[Entry], bool],
+        merges: Mapping[Type[Any], MergeFunction],
+        window: float = 0.5,
+        max_events: int = 20,
+    ) -> None:
+        """
+        :param destination: Function giving the destination an event will be sent to
+        :param sink: Function queuing an event for delivery, returning whether it fit
+        :param merges: Mapping of event class to the function merging its events
+        :param window: How long, in seconds, to hold a destination's events for
+        :param max_events: The most events to hold for a destination at once
+        """
+
+        if window <= 0:
+            raise ValueError(f"Coalescer window must be positive, got {window}")
+
+        if max_events < 1:
+            raise ValueError(f"Coalescer max_events must be at least one, got {max_events}")
+
+        self.destination = destination
+        self.sink = sink
+        self.window = window
+        self.max_events = max_events
+        self.merges = dict(merges)
+
+        self.held = 0
+        self.coalesced = 0
+
+        self._buffers = {}
+        self._timers = {}
+        self._resolved = {}
+        self._logger = logging.getLogger(__name__ + "Coalescer")
+
+    @classmethod
+    def from_config(
+        cls,
+        destination: Callable[[OutputEvent], Hashable],
+        sink: Callable[[Entry], bool],
+        config: Mapping[str, Any],
+    ) -> Coalescer:
+        """Creates a coalescer from a `coalesce` configuration block.
+
+        The block sets the merges, and may set the window and max_events.
+        Event classes and merge functions may be given by their fully-qualified
+        names."""
+
+        unknown = set(config).difference({"merges", "window", "max_events"})
+        if unknown:
+            raise ValueError(f"Unknown coalescing options {unknown}")
+
+        options = dict(config)
+        options["merges"] = {
+            _resolve(event_type): _resolve(function)
+            for event_type, function in options.get("merges", {}).items()
+        }
+
+        return cls(destination, sink, **options)
+
+    @property
+    def pending(self) -> int:
+        """The number of events being held"""
+        return sum(len(buffer) for buffer in self._buffers.values())
+
+    def merge_function(self, event: OutputEvent) -> Optional[MergeFunction]:
+        """The merge function for an event's class, or None if it has none"""
+
+        event_type = type(event)
+
+        try:
+            return self._resolved[event_type]
+        except KeyError:
+            function = next(
+                (self.merges[base] for base in event_type.__mro__ if base in self.merges),
+                None,
+            )
+            self._resolved[event_type] = function
+            return function
+
+    def offer(self, entry: Entry) -> bool:
+        """Holds an event to be merged, or passes it on if it can't be.
+
+        Returns False if the event was passed on, and there was no room for it."""
+
+        destination = self.destination(entry[1])
+
+        if self.merge_function(entry[1]) is None:
+            self.flush(destination)
+            return self.sink(entry)
+
+        buffer = self._buffers.get(destination)
+
+        if buffer is None:
+            buffer = self._buffers[destination] = []
+            self._timers[destination] = asyncio.get_running_loop().call_later(
+                self.window, self.flush, destination
+            )
+
+        buffer.append(entry)
+        self.held += 1
+
+        if len(buffer) >= self.max_events:
+            self.flush(destination)
+
+        return True
+
+    def flush(self, destination: Hashable) -> None:
+        """Merges and passes on the events held for a destination"""
+
+        buffer = self._buffers.pop(destination, None)
+        timer = self._timers.pop(destination, None)
+
+        if timer:
+            timer.cancel()
+
+        if not buffer:
+            return
+
+        # Runs of events with the same merge function are merged together
+        start = 0
+        for end in range(1, len(buffer) + 1):
+            if end == len(buffer) or self.merge_function(
+                buffer[end][1]
+            ) is not self.merge_function(buffer[start][1]):
+                self._merge(buffer[start:end])
+                start = end
+
+    def flush_all(self) -> None:
+        for destination in list(self._buffers):
+            self.flush(destination)
+
+    def _merge(self, entries: Sequence[Entry]) -> None:
+        function = self.merge_function(entries[0][1])
+        events: Sequence[OutputEvent] = [event for _, event in entries]
+
+        if function and len(events) > 1:
+            try:
+                events = function(events)
+            except Exception:  # pylint: disable=broad-except
+                self._logger.exception(
+                    "Unable to merge %d events; sending them as they are", len(events)
+                )
+                events = [event for _, event in entries]
+
+        self.coalesced += len(entries) - len(events)
+
+        queued = entries[0][0]
+        trace = getattr(entries[0][1], TRACE_ATTRIBUTE, None)
+
+        for event in events:
+            if trace and getattr(event, TRACE_ATTRIBUTE, None) is None:
+                setattr(event, TRACE_ATTRIBUTE, trace)
+
+            self.sink((queued, event))
+
+
+def join_text(limit: Optional[int] = None, separator: str = "\n") -> MergeFunction:
+    """Creates a merge function joining the text of events, in as few events as possible.
+
+    The events must be dataclasses with a `text` field. Each merged event is a
+    copy of the first event merged into it, and its text is at most limit
+    characters (unless a single event's text is already longer)."""
+
+    def merge(events: Sequence[Any]) -> Sequence[Any]:
+        merged: List[Any] = []
+        first = events[0]
+        parts = [first.text]
+        length = len(first.text)
+
+        for event in events[1:]:
+            if limit is None or length + len(separator) + len(event.text) <= limit:
+                parts.append(event.text)
+                length += len(separator) + len(event.text)
+                continue
+
+            merged.append(dataclasses.replace(first, text=separator.join(parts)))
+            first, parts, length = event, [event.text], len(event.text)
+
+        merged.append(dataclasses.replace(first, text=separator.join(parts)))
+        return merged
+
+    return merge
+
+
+def _resolve(name: Any) -> Any:
+    # Imported here, as the loader imports the runner, which uses this module
+    # pylint: disable=import-outside-toplevel,cyclic-import
+    from mewbot.loader import get_implementation
+
+    return get_implementation(name) if isinstance(name, str) else name
+
+
+__all__ = ["Coalescer", "Entry", "MergeFunction", "join_text"]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""Indexing behaviours by the commands which trigger them.
+
+Bots often have many behaviours triggered by a chat command (e.g. "!help"),
+each of which would check every message. The runner keeps a CommandIndex of
+the behaviours whose triggers all have a command_words() method (such as
+mewbot.api.v1.CommandTrigger): a hash table from the first word of each of
+their commands to the behaviours. Each message is then looked up by its first
+word once, and only passed to the indexed behaviours it could trigger, while
+behaviours with other triggers are passed every event as usual.
+
+The index only narrows down the behaviours; those it finds still check their
+triggers, so the events each behaviour acts on are unchanged.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set, Tuple, Type
+
+import re
+
+from mewbot.core import BehaviourInterface, InputEvent
+
+_FIRST_WORD = re.compile(r"\s*(\S+)")
+
+Dispatch = Tuple[BehaviourInterface, ...]
+
+
+def command_word(text: Any) -> Optional[str]:
+    """The first word of a piece of text, which would be its command"""
+
+    if not isinstance(text, str):
+        return None
+
+    match = _FIRST_WORD.match(text)
+    return match.group(1) if match else None
+
+
+def command_words(behaviour: BehaviourInterface) -> Optional[Set[str]]:
+    """The first words of all the commands which can trigger a behaviour.
+
+    Returns None if the behaviour has a trigger which is not a command."""
+
+    triggers = getattr(behaviour, "triggers", None)
+
+    if not triggers:
+        return None
+
+    words: Set[str] = set()
+
+    for trigger in triggers:
+        trigger_words = getattr(trigger, "command_words", None)
+
+        if trigger_words is None:
+            return None
+
+        words.update(trigger_words())
+
+    return words
+
+
+class CommandIndex:
+    """Finds the behaviours which the command in an event could trigger"""
+
+    skipped: int  # Times an indexed behaviour was not passed an event
+
+    _commands: Dict[str, Dispatch]  # Indexed behaviours, by the first word of their commands
+    _indexed: FrozenSet[BehaviourInterface]
+    _split: Dict[Type[InputEvent], Tuple[Dispatch, FrozenSet[BehaviourInterface]]]
+
+    def __init__(self, behaviours: Iterable[BehaviourInterface]) -> None:
+        commands: Dict[str, Dict[BehaviourInterface, None]] = {}
+        indexed: Set[BehaviourInterface] = set()
+
+        for behaviour in behaviours:
+            words = command_words(behaviour)
+
+            if words is None:
+                continue
+
+            indexed.add(behaviour)
+            for word in words:
+                commands.setdefault(word, {})[behaviour] = None
+
+        self.skipped = 0
+
+        self._commands = {word: tuple(found) for word, found in commands.items()}
+        self._indexed = frozenset(indexed)
+        self._split = {}
+
+    def __len__(self) -> int:
+        """The number of indexed behaviours"""
+        return len(self._indexed)
+
+    def select(self, event: InputEvent, behaviours: Dispatch) -> Dispatch:
+        """Narrows down the behaviours which consume an event's class to those it could trigger.
+
+        The behaviours must be those the runner dispatches the event's class to,
+        as the split between indexed and other behaviours is cached by class.
+        Indexed behaviours are only kept if the event's text starts with one of
+        their commands (in which case they come after the other behaviours)."""
+
+        if not self._indexed:
+            return behaviours
+
+        event_type = type(event)
+
+        try:
+            others, indexed = self._split[event_type]
+        except KeyError:
+            others = tuple(
+                behaviour for behaviour in behaviours if behaviour not in self._indexed
+            )
+            indexed = self._indexed.intersection(behaviours)
+            self._split[event_type] = others, indexed
+
+        if not indexed:
+            return behaviours
+
+        found = self._commands.get(command_word(getattr(event, "text", None)) or "", ())
+        candidates = tuple(behaviour for behaviour in found if behaviour in indexed)
+
+        self.skipped += len(indexed) - len(candidates)
+        return others + candidates if candidates else others
+
+
+__all__ = ["CommandIndex", "command_word", "command_words"]
@@ -64,6 +64,18 @@ class OutputInterface(Protocol):
         """
 
 
+@runtime_checkable
+class BatchOutputInterface(OutputInterface, Protocol):
+    async def output_batch(self, events: Sequence[OutputEvent]) -> bool:
+        """
+        Optional extension of an Output, which transmits a number of events in one go.
+        If an Output has this method, the bot may use it instead of output() when
+        more than one event is waiting to be sent.
+        :param events: The events, in the order they were produced
+        :return:
+        """
+
+
 @runtime_checkable
 class TriggerInterface(Protocol):
     @staticmethod
@@ -118,6 +130,17 @@ class BehaviourInterface(Protocol):
         pass
 
 
+@runtime_checkable
+class BatchBehaviourInterface(BehaviourInterface, Protocol):
+    async def process_batch(self, events: Sequence[InputEvent]) -> None:
+        """
+        Optional extension of a Behaviour, which processes a number of events in one go.
+        If a Behaviour has this method, the bot may use it instead of process() when
+        more than one event is waiting to be processed.
+        :param events: The events, in the order they were received
+        """
+
+
 Component = Union[
     BehaviourInterface,
     IOConfigInterface,
@@ -136,6 +159,7 @@ class ComponentKind(str, enum.Enum):
     IOConfig = "IOConfig"
     Template = "Template"
     DataSource = "DataSource"
+    Runner = "Runner"
 
     @classmethod
     def values(cls) -> List[str]:
@@ -163,7 +187,9 @@ __all__ = [
     "IOConfigInterface",
     "InputInterface",
     "OutputInterface",
+    "BatchOutputInterface",
     "BehaviourInterface",
+    "BatchBehaviourInterface",
     "TriggerInterface",
     "ConditionInterface",
     "ActionInterface",
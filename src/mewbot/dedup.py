@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+"""Dropping input events which the bot has already seen.
+
+Inputs can produce the same event more than once: e.g. when reconnecting,
+when fetching recent history at startup, or when a webhook sender retries.
+A Deduplicator sits between the inputs and the input queue, and drops any
+event whose identity it has seen recently.
+
+Each event's identity comes from a function configured for its class (or the
+nearest parent class which has one). Events of classes without one, or whose
+identity is None, are never treated as duplicates. Identities are remembered
+for a limited time, and only a limited number are kept, so the memory used
+is bounded however many events arrive.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple, Type
+
+import asyncio
+import collections
+import logging
+import time
+
+from mewbot.core import InputEvent
+
+IdentityFunction = Callable[[Any], Optional[Hashable]]
+
+
+class ExpiringKeySet:
+    """A set of keys which are forgotten after a time, or when it is full.
+
+    Keys are kept in the order they were added, so both the expired keys
+    and (when full) the oldest key are at the front. Adding and checking a
+    key is O(1), allowing for the expired keys cleared out along the way."""
+
+    size: int  # The most keys to remember at once
+    ttl: float  # Seconds to remember each key for
+
+    evicted: int  # Keys forgotten early because the set was full
+
+    _keys: collections.OrderedDict[Hashable, float]
+
+    def __init__(self, size: int, ttl: float) -> None:
+        if size < 1:
+            raise ValueError(f"ExpiringKeySet size must be at least one, got {size}")
+
+        self.size = size
+        self.ttl = ttl
+        self.evicted = 0
+        self._keys = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: Hashable, now: Optional[float] = None) -> bool:
+        """Adds a key, returning False if it was already present"""
+
+        now = time.monotonic() if now is None else now
+        keys = self._keys
+
+        while keys:
+            oldest, added = next(iter(keys.items()))
+            if now - added < self.ttl:
+                break
+            del keys[oldest]
+
+        if key in keys:
+            return False
+
+        if len(keys) >= self.size:
+            keys.popitem(last=False)
+            self.evicted += 1
+
+        keys[key] = now
+        return True
+
+
+class Deduplicator:
+    """Recognises input events which have been seen recently"""
+
+    identities: Dict[Type[Any], IdentityFunction]
+
+    checked: int  # Events checked for duplicates
+    duplicates: int  # Events recognised as duplicates
+    duplicates_by_type: Dict[Type[Any], int]
+
+    _seen: ExpiringKeySet
+    _resolved: Dict[Type[Any], Optional[IdentityFunction]]
+    _logger: logging.Logger
+
+    def __init__(
+        self,
+        identities: Mapping[Type[Any], IdentityFunction],
+        size: int = 10000,
+        ttl: float = 300.0,
+    ) -> None:
+        """
+        :param identities: Mapping of event class to the function giving its events' identity
+        :param size: The most event identities to remember at once
+        :param ttl: How long, in seconds, to remember each event's identity
+        """
+
+        self.identities = dict(identities)
+
+        self.checked = 0
+        self.duplicates = 0
+        self.duplicates_by_type = {}
+
+        self._seen = ExpiringKeySet(size, ttl)
+        self._resolved = {}
+        self._logger = logging.getLogger(__name__ + "Deduplicator")
+
+    def identity_of(self, event: InputEvent) -> Optional[Tuple[Type[Any], Hashable]]:
+        """The identity of an event, or None if it has none"""
+
+        event_type = type(event)
+
+        try:
+            function = self._resolved[event_type]
+        except KeyError:
+            function = next(
+                (
+                    self.identities[base]
+                    for base in event_type.__mro__
+                    if base in self.identities
+                ),
+                None,
+            )
+            self._resolved[event_type] = function
+
+        if function is None:
+            return None
+
+        identity = function(event)
+
+        # Events of different classes (e.g. a message and its edit) may share an id
+        return None if identity is None else (event_type, identity)
+
+    def is_duplicate(self, event: InputEvent) -> bool:
+        """Checks an event, remembering it so that later copies are duplicates"""
+
+        self.checked += 1
+        identity = self.identity_of(event)
+
+        if identity is None or self._seen.add(identity):
+            return False
+
+        self.duplicates += 1
+        self.duplicates_by_type[type(event)] = self.duplicates_by_type.get(type(event), 0) + 1
+
+        self._logger.debug("Dropping duplicate event %s", event)
+        return True
+
+    def producer(self, queue: asyncio.Queue[InputEvent]) -> DedupProducer:
+        """Wraps the queue an input is bound to, so that duplicate events are dropped"""
+        return DedupProducer(queue, self)
+
+
+class DedupProducer:
+    """Handle on an input queue which drops duplicate events.
+
+    This offers the put methods of a queue, so it can be bound to an Input in
+    place of the queue itself."""
+
+    queue: asyncio.Queue[InputEvent]
+    deduplicator: Deduplicator
+
+    def __init__(self, queue: asyncio.Queue[InputEvent], deduplicator: Deduplicator) -> None:
+        self.queue = queue
+        self.deduplicator = deduplicator
+
+    async def put(self, item: InputEvent) -> None:
+        if not self.deduplicator.is_duplicate(item):
+            await self.queue.put(item)
+
+    def put_nowait(self, item: InputEvent) -> None:
+        if not self.deduplicator.is_duplicate(item):
+            self.queue.put_nowait(item)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.queue, name)
+
+
+__all__ = ["ExpiringKeySet", "Deduplicator", "DedupProducer", "IdentityFunction"]
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+
+"""Tooling for delivering output events to the Outputs that consume them"""
+
+from __future__ import annotations
+
+from typing import (
+    Any,
+    Coroutine,
+    Dict,
+    Hashable,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import asyncio
+import logging
+import time
+
+from mewbot.core import BatchOutputInterface, OutputEvent, OutputInterface
+from mewbot.breaker import CircuitBreaker, ComponentFailure
+from mewbot.coalescing import Coalescer
+from mewbot.metrics import Histogram
+from mewbot.retry import DeadLetterSink, RetryPolicy, RetryQueue
+from mewbot.scheduling import OutputScheduler
+from mewbot.tracing import Tracer, component_label
+
+ItemType = TypeVar("ItemType")  # pylint: disable=invalid-name
+
+LaneEntry = Tuple[float, OutputEvent]  # The time an event was queued, and the event
+
+
+class OutputLane:  # pylint: disable=too-many-instance-attributes
+    """A bounded queue and delivery task for a single Output.
+
+    Each Output gets its own lane, so that events are delivered to it in
+    order, but a slow Output does not hold up delivery to the others.
+    If the lane is full, new events for it are dropped (and counted).
+
+    A lane with a scheduler instead delivers events as the rate limits of
+    their destinations allow (see mewbot.scheduling); events are then in
+    order for each destination, but not between destinations.
+
+    A lane with a coalescer holds bursts of events for each destination
+    briefly, and merges them before they are queued (see mewbot.coalescing).
+
+    A lane with a retry queue catches the output's failures, and puts the
+    events it failed to send back in the lane after a backoff (see
+    mewbot.retry), rather than stopping.
+    """
+
+    output: OutputInterface
+
+    delivered: int  # Number of events passed to the output
+    failed: int  # Number of delivered events which the output failed to send
+    dropped: int  # Number of events rejected because the lane was full
+    latency: float  # Time between queuing and delivery of the most recent event
+    total_latency: float  # Sum of the latencies of all delivered events
+    output_latency: Histogram  # Time spent in the output sending events
+    tracer: Optional[Tracer]  # Records the delivery of traced events
+    breaker: Optional[CircuitBreaker]  # Timeout and circuit breaker for the output
+    scheduler: Optional[OutputScheduler[LaneEntry]]  # Rate limits for the output
+    coalescer: Optional[Coalescer]  # Merges bursts of events for a destination
+    retry: Optional[RetryQueue]  # Events waiting to be tried again
+
+    _queue: Union[asyncio.Queue[LaneEntry], OutputScheduler[LaneEntry]]
+    _logger: logging.Logger
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        output: OutputInterface,
+        maxsize: int,
+        tracer: Optional[Tracer] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        rate_limit: Optional[Mapping[str, Any]] = None,
+        coalesce: Optional[Mapping[str, Any]] = None,
+        retry: Optional[Mapping[str, Any]] = None,
+        dead_letters: Sequence[DeadLetterSink] = (),
+    ) -> None:
+        """
+        :param rate_limit:
+            The rate, burst, global_rate, and global_burst of events sent to the
+            output (see mewbot.scheduling.OutputScheduler). Events are sent to
+            the destinations given by the output's destination() method, if it
+            has one.
+        :param coalesce:
+            The merges, window, and max_events for merging the events sent to
+            each destination in quick succession (see mewbot.coalescing.Coalescer).
+        :param retry:
+            The max_attempts, base_delay, max_delay, and jitter for retrying the
+            events the output fails to send (see mewbot.retry.RetryPolicy).
+        :param dead_letters:
+            Where to send the events which are not sent after max_attempts.
+            By default they are logged.
+        """
+
+        self.output = output
+        self.tracer = tracer
+        self.breaker = breaker
+
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.latency = 0.0
+        self.total_latency = 0.0
+        self.output_latency = Histogram()
+
+        self.scheduler = None
+
+        if rate_limit:
+            self.scheduler = OutputScheduler.from_config(
+                self._destination, maxsize, rate_limit
+            )
+            self._queue = self.scheduler
+        else:
+            self._queue = asyncio.Queue(maxsize)
+
+        self.coalescer = (
+            Coalescer.from_config(self._event_destination, self._enqueue, coalesce)
+            if coalesce
+            else None
+        )
+        self.retry = (
+            RetryQueue(
+                RetryPolicy.from_config(retry),
+                self._enqueue,
+                dead_letters,
+                component_label(output),
+            )
+            if retry
+            else None
+        )
+        self._logger = logging.getLogger(__name__ + "OutputLane")
+
+    def __str__(self) -> str:
+        return f"OutputLane({self.output}, depth={self.depth})"
+
+    @property
+    def depth(self) -> int:
+        """The number of events waiting to be delivered"""
+        return (
+            self._queue.qsize()
+            + (self.coalescer.pending if self.coalescer else 0)
+            + (self.retry.pending if self.retry else 0)
+        )
+
+    @property
+    def mean_latency(self) -> float:
+        """Average time between an event being queued and being delivered"""
+        return self.total_latency / self.delivered if self.delivered else 0.0
+
+    def backlog(self) -> Dict[Hashable, int]:
+        """The number of events waiting to be delivered to each destination"""
+
+        if self.scheduler:
+            return self.scheduler.backlog()
+
+        return {None: self.depth} if self.depth else {}
+
+    def offer(self, event: OutputEvent) -> bool:
+        """Queues an event for delivery, returning whether there was room for it"""
+
+        if not self.coalescer:
+            return self._enqueue((time.monotonic(), event))
+
+        if 0 < self._queue.maxsize <= self.depth:
+            return self._drop(event)
+
+        return self.coalescer.offer((time.monotonic(), event))
+
+    def flush(self) -> None:
+        """Queues any events being held to be merged or retried, without waiting"""
+
+        if self.coalescer:
+            self.coalescer.flush_all()
+        if self.retry:
+            self.retry.flush()
+
+    def give_up(self) -> None:
+        """Passes any events waiting to be retried to the dead letter sinks"""
+
+        if self.retry:
+            self.retry.abandon()
+
+    def _enqueue(self, entry: LaneEntry) -> bool:
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            return self._drop(entry[1])
+
+        return True
+
+    def _drop(self, event: OutputEvent) -> bool:
+        self.dropped += 1
+        self._logger.warning("Lane for %s is full; dropping %s", self.output, event)
+        return False
+
+    async def take(self) -> LaneEntry:
+        """Waits for the next event to deliver"""
+        return await self._queue.get()
+
+    def take_nowait(self) -> LaneEntry:
+        """Gets the next event to deliver, raising QueueEmpty if there is none"""
+        return self._queue.get_nowait()
+
+    def take_batch(self, first: LaneEntry, limit: int) -> Sequence[LaneEntry]:
+        """Adds up to limit - 1 events which are already waiting to a taken entry"""
+
+        if isinstance(self._queue, OutputScheduler):
+            # Each event sent uses up part of the rate limit, so they are taken singly
+            return (first,)
+
+        return take_batch(self._queue, first, limit)
+
+    async def deliver(self, entry: LaneEntry) -> None:
+        """Passes an event taken from this lane to the output"""
+
+        started = time.monotonic()
+
+        try:
+            sent = await self._call(self.output.output(entry[1]))
+        except Exception as exc:
+            self._record(entry, started, False, exc)
+            if isinstance(exc, ComponentFailure) or self.retry:
+                # The output is guarded, or its events retried, so its failure
+                # does not stop the lane
+                return
+            raise
+
+        self._record(entry, started, sent)
+
+    async def deliver_batch(self, entries: Sequence[LaneEntry]) -> None:
+        """Passes a number of events taken from this lane to the output.
+
+        If the output supports batches, they are all sent with one call."""
+
+        if len(entries) == 1 or not isinstance(self.output, BatchOutputInterface):
+            for entry in entries:
+                await self.deliver(entry)
+            return
+
+        started = time.monotonic()
+
+        try:
+            sent = await self._call(self.output.output_batch([event for _, event in entries]))
+        except Exception as exc:
+            for entry in entries:
+                self._record(entry, started, False, exc)
+            if isinstance(exc, ComponentFailure) or self.retry:
+                return
+            raise
+
+        for entry in entries:
+            self._record(entry, started, sent)
+
+    def _destination(self, entry: LaneEntry) -> Hashable:
+        return self._event_destination(entry[1])
+
+    def _event_destination(self, event: OutputEvent) -> Hashable:
+        destination = getattr(self.output, "destination", None)
+        return destination(event) if destination else None
+
+    async def _call(self, call: Coroutine[Any, Any, bool]) -> bool:
+        if self.breaker:
+            return await self.breaker.call(call)
+
+        return await call
+
+    def _record(
+        self,
+        entry: LaneEntry,
+        started: float,
+        sent: Optional[bool],
+        error: Optional[BaseException] = None,
+    ) -> None:
+        queued, event = entry
+        now = time.monotonic()
+
+        self.latency = now - queued
+        self.total_latency += self.latency
+        self.output_latency.observe(now - started)
+        self.delivered += 1
+
+        # Outputs which do not report a result are assumed to have succeeded
+        if sent is False:
+            self.failed += 1
+
+        if self.retry:
+            if sent is False:
+                self.retry.failed(entry, error)
+            else:
+                self.retry.succeeded(entry)
+
+        if self.tracer:
+            self.tracer.record_output(event, self.output, started, error)
+
+
+def take_batch(
+    queue: asyncio.Queue[ItemType], first: ItemType, limit: int
+) -> Sequence[ItemType]:
+    """Collects an item already taken from a queue, plus up to limit - 1 more
+    items which are immediately available, without waiting."""
+
+    if limit <= 1 or queue.empty():
+        return (first,)
+
+    batch = [first]
+
+    while len(batch) < limit and not queue.empty():
+        batch.append(queue.get_nowait())
+
+    return batch
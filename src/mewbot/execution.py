@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""Running the synchronous work of components off the event loop.
+
+Each Trigger, Condition, and Action has an execution setting:
+  - inline:  run directly on the event loop (the default),
+  - thread:  run in the runner's thread pool,
+  - process: run in the runner's process pool.
+Offloading a slow matches() or allows() means it no longer holds up every
+other event on the loop. For process execution, the component and the
+event are pickled to be sent to the worker process, and so must support it.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Optional, TypeVar, Union
+
+import asyncio
+import concurrent.futures
+import enum
+import functools
+import multiprocessing
+
+ResultType = TypeVar("ResultType")  # pylint: disable=invalid-name
+
+
+class Execution(str, enum.Enum):
+    INLINE = "inline"
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+class Executors:
+    """The thread and process pools of a runner, created when first needed"""
+
+    thread_workers: Optional[int]
+    process_workers: Optional[int]
+
+    _threads: Optional[concurrent.futures.ThreadPoolExecutor]
+    _processes: Optional[concurrent.futures.ProcessPoolExecutor]
+
+    def __init__(
+        self, thread_workers: Optional[int] = None, process_workers: Optional[int] = None
+    ) -> None:
+        """
+        :param thread_workers: Size of the thread pool (by default, based on the CPU count)
+        :param process_workers: Size of the process pool (by default, the CPU count)
+        """
+
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+
+        self._threads = None
+        self._processes = None
+
+    def pool(self, execution: Execution) -> concurrent.futures.Executor:
+        if execution == Execution.THREAD:
+            if not self._threads:
+                self._threads = concurrent.futures.ThreadPoolExecutor(
+                    self.thread_workers, thread_name_prefix="mewbot"
+                )
+            return self._threads
+
+        if execution == Execution.PROCESS:
+            if not self._processes:
+                # Workers are spawned, rather than forked, so they do not inherit
+                # the bot's event loop and threads
+                self._processes = concurrent.futures.ProcessPoolExecutor(
+                    self.process_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._processes
+
+        raise ValueError(f"No pool is used for {execution} execution")
+
+    def shutdown(self) -> None:
+        for pool in (self._threads, self._processes):
+            if pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        self._threads = None
+        self._processes = None
+
+
+async def execute(
+    executors: Optional[Executors],
+    execution: Execution,
+    func: Callable[..., ResultType],
+    *args: Any,
+) -> ResultType:
+    """Calls a function in the given way, returning its result to the event loop.
+
+    Without executors (i.e. for components which were never bound to a
+    runner), thread execution uses the loop's default executor."""
+
+    if execution == Execution.INLINE:
+        return func(*args)
+
+    pool: Optional[concurrent.futures.Executor] = None
+
+    if executors:
+        pool = executors.pool(execution)
+    elif execution == Execution.PROCESS:
+        raise RuntimeError("Process execution needs the executors of a runner")
+
+    return await asyncio.get_running_loop().run_in_executor(
+        pool, functools.partial(func, *args)
+    )
+
+
+def parse_execution(execution: Union[Execution, str]) -> Execution:
+    try:
+        return Execution(execution)
+    except ValueError:
+        raise ValueError(
+            f"Unknown execution '{execution}' (must be one of "
+            f"{', '.join(option.value for option in Execution)})"
+        ) from None
+
+
+__all__ = ["Execution", "Executors", "execute"]
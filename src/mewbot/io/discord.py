@@ -2,19 +2,94 @@
 
 from __future__ import annotations
 
-from typing import Optional, Set, Sequence, Type, List
+from typing import Any, ClassVar, Hashable, Optional, Set, Sequence, Type, List
 
 import dataclasses
+import datetime
 import logging
 
 import discord  # type: ignore
 
-from mewbot.api.v1 import IOConfig, Input, Output, InputEvent, OutputEvent
+from mewbot.api.v1 import (
+    CommandTrigger,
+    IOConfig,
+    Input,
+    Output,
+    InputEvent,
+    OutputEvent,
+    RegexTrigger,
+)
+from mewbot.coalescing import join_text
+
+MESSAGE_LIMIT = 2000  # The most characters Discord allows in a message
+
+
+@dataclasses.dataclass(frozen=True)
+class RecordedUser:
+    """
+    The parts of a Discord user (or member) which are kept when an event is recorded.
+    """
+
+    id: int  # pylint: disable=invalid-name  # As in discord.py
+    name: str
+    display_name: str
+
+    @classmethod
+    def snapshot(cls, user: Any) -> RecordedUser:
+        return cls(id=int(user.id), name=str(user.name), display_name=str(user.display_name))
+
+
+@dataclasses.dataclass(frozen=True)
+class RecordedChannel:
+    """
+    The parts of a Discord channel which are kept when an event is recorded.
+    """
+
+    id: int  # pylint: disable=invalid-name  # As in discord.py
+    name: Optional[str]  # Direct message channels have no name
+
+    @classmethod
+    def snapshot(cls, channel: Any) -> RecordedChannel:
+        return cls(id=int(channel.id), name=getattr(channel, "name", None))
+
+
+@dataclasses.dataclass(frozen=True)
+class RecordedMessage:
+    """
+    The parts of a discord.Message which are kept when an event is recorded.
+    Replayed events have enough for triggers, conditions, channel_partition_key
+    and message_identity, but can't be replied to.
+    """
+
+    id: int  # pylint: disable=invalid-name  # As in discord.py
+    content: str
+    author: RecordedUser
+    channel: RecordedChannel
+    created_at: Optional[datetime.datetime]
+    edited_at: Optional[datetime.datetime]
+
+    @classmethod
+    def snapshot(cls, message: Any) -> RecordedMessage:
+        return cls(
+            id=int(message.id),
+            content=str(message.content),
+            author=RecordedUser.snapshot(message.author),
+            channel=RecordedChannel.snapshot(message.channel),
+            created_at=message.created_at,
+            edited_at=message.edited_at,
+        )
 
 
 @dataclasses.dataclass
 class DiscordInputEvent(InputEvent):
-    pass
+    """
+    Base class for events from Discord.
+    These hold the live objects from the Discord client, which can't be pickled,
+    so each event is recorded with snapshots of them (see mewbot.recording),
+    and they can't be sent to worker processes (see mewbot.sharding).
+    """
+
+    picklable: ClassVar[bool] = False
 
 
 @dataclasses.dataclass
@@ -25,6 +100,9 @@ class DiscordUserJoinInputEvent(DiscordInputEvent):
 
     member: discord.member.Member
 
+    def for_recording(self) -> DiscordInputEvent:
+        return dataclasses.replace(self, member=RecordedUser.snapshot(self.member))
+
 
 @dataclasses.dataclass
 class DiscordMessageCreationEvent(DiscordInputEvent):
@@ -37,6 +115,9 @@ class DiscordMessageCreationEvent(DiscordInputEvent):
     text: str
     message: discord.Message
 
+    def for_recording(self) -> DiscordInputEvent:
+        return dataclasses.replace(self, message=RecordedMessage.snapshot(self.message))
+
 
 @dataclasses.dataclass
 class DiscordMessageEditInputEvent(DiscordInputEvent):
@@ -51,6 +132,13 @@ class DiscordMessageEditInputEvent(DiscordInputEvent):
     text_after: str
     message_after: discord.Message
 
+    def for_recording(self) -> DiscordInputEvent:
+        return dataclasses.replace(
+            self,
+            message_before=RecordedMessage.snapshot(self.message_before),
+            message_after=RecordedMessage.snapshot(self.message_after),
+        )
+
 
 @dataclasses.dataclass
 class DiscordMessageDeleteInputEvent(DiscordInputEvent):
@@ -58,6 +146,9 @@ class DiscordMessageDeleteInputEvent(DiscordInputEvent):
     text_before: str
     message: discord.Message
 
+    def for_recording(self) -> DiscordInputEvent:
+        return dataclasses.replace(self, message=RecordedMessage.snapshot(self.message))
+
 
 @dataclasses.dataclass
 class DiscordOutputEvent(OutputEvent):
@@ -70,6 +161,62 @@ class DiscordOutputEvent(OutputEvent):
     use_message_channel: bool
 
 
+def channel_partition_key(event: InputEvent) -> Optional[Hashable]:
+    """
+    BotRunner partition key which keeps the events from each Discord channel in order.
+    Events without a channel (e.g. users joining) are not partitioned.
+    """
+
+    if isinstance(event, DiscordMessageCreationEvent):
+        return int(event.message.channel.id)
+    if isinstance(event, DiscordMessageDeleteInputEvent):
+        return int(event.message.channel.id)
+    if isinstance(event, DiscordMessageEditInputEvent):
+        return int(event.message_after.channel.id)
+
+    return None
+
+
+def message_identity(event: InputEvent) -> Optional[Hashable]:
+    """
+    Deduplicator identity function for Discord message events (see mewbot.dedup).
+    Messages seen again after reconnecting, or fetched as history at startup,
+    have the same identity as the original event. Each edit of a message is distinct.
+    """
+
+    if isinstance(event, (DiscordMessageCreationEvent, DiscordMessageDeleteInputEvent)):
+        return int(event.message.id)
+    if isinstance(event, DiscordMessageEditInputEvent):
+        return int(event.message_after.id), event.message_after.edited_at
+
+    return None
+
+
+# Coalescer merge function for DiscordOutputEvents (see mewbot.coalescing), which
+# joins the replies sent to a channel in quick succession into as few messages as fit
+merge_messages = join_text(MESSAGE_LIMIT)
+
+
+class DiscordCommandTrigger(CommandTrigger):
+    """
+    Fires on new messages starting with the command, e.g. "!hello".
+    """
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {DiscordMessageCreationEvent}
+
+
+class DiscordRegexTrigger(RegexTrigger):
+    """
+    Fires on new messages matching the pattern.
+    """
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {DiscordMessageCreationEvent}
+
+
 class DiscordIO(IOConfig):
     _input: Optional[DiscordInput] = None
     _output: Optional[DiscordOutput] = None
@@ -300,3 +447,13 @@ class DiscordOutput(Output):
             return True
 
         raise NotImplementedError("Currently can only respond to a message")
+
+    def destination(self, event: OutputEvent) -> Optional[Hashable]:
+        """
+        Discord's rate limits are applied per channel
+        """
+
+        if isinstance(event, DiscordOutputEvent) and event.use_message_channel:
+            return int(event.message.channel.id)
+
+        return None
@@ -11,8 +11,9 @@ When defining a new IOConfig, you need to define the components for it
 
 from __future__ import annotations
 
-from typing import Set, Type
+from typing import TYPE_CHECKING, Hashable, Optional, Set, Type
 
+import asyncio
 import dataclasses
 import logging
 import time
@@ -22,10 +23,26 @@ from aiohttp import web
 from mewbot.api.v1 import InputEvent
 from mewbot.io.socket import SocketIO, SocketInput
 
+if TYPE_CHECKING:
+    from mewbot.bot import BotRunner
+
+# The longest the /profile route will profile the bot for
+MAX_PROFILE_SECONDS = 3600.0
+
 
 @dataclasses.dataclass  # Needed for pycharm linting
 class IncomingWebhookEvent(InputEvent):
     text: str
+    idempotency_key: Optional[str] = None  # From the request's Idempotency-Key header
+
+
+def webhook_identity(event: IncomingWebhookEvent) -> Optional[Hashable]:
+    """
+    Deduplicator identity function for webhook events (see mewbot.dedup).
+    Retries of a request which gave an Idempotency-Key header have the same
+    identity; requests without one are never treated as duplicates.
+    """
+    return event.idempotency_key
 
 
 class HTTPServlet(SocketIO):
@@ -74,7 +91,11 @@ class HTTPInputListener(SocketInput):
 
         # Get the message on the wire
         r_text = await request.text()
-        await self.queue.put(IncomingWebhookEvent(text=r_text))
+        await self.queue.put(
+            IncomingWebhookEvent(
+                text=r_text, idempotency_key=request.headers.get("Idempotency-Key")
+            )
+        )
 
         self._logger.info(r_text)
         return web.Response(text=f"Received - {time.time()}")
@@ -89,3 +110,87 @@ class HTTPInputListener(SocketInput):
 
         # Run the bot
         await site.start()
+
+
+class MetricsListener:
+    """
+    Runs an aiohttp microservice which serves a bot's metrics to Prometheus
+
+    This is started by the BotRunner when it is given a metrics_port.
+    It also offers an admin route, POST /profile?seconds=N, which profiles
+    the bot for that long (or the runner's profile_window) and returns the report.
+    N must be more than 0, and at most MAX_PROFILE_SECONDS.
+    """
+
+    _runner_to_serve: BotRunner
+    _host: str
+    _port: int
+    _runner: web.AppRunner
+
+    def __init__(self, runner: BotRunner, host: str, port: int) -> None:
+        self._runner_to_serve = runner
+        self._host = host
+        self._port = port
+
+        logger = logging.getLogger(__name__ + "MetricsListener")
+
+        servlet = web.Application()
+        servlet.add_routes(
+            [
+                web.get("/metrics", self.metrics_response),
+                web.post("/profile", self.profile_response),
+            ]
+        )
+
+        self._runner = web.AppRunner(
+            servlet, handle_signals=False, access_log=logger, logger=logger
+        )
+
+    def __str__(self) -> str:
+        return f"http://{self._host}:{self._port}/metrics"
+
+    async def metrics_response(self, _: web.Request) -> web.Response:
+        """
+        Renders the current metrics in the Prometheus text format
+        """
+        return web.Response(
+            body=self._runner_to_serve.metrics.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    async def profile_response(self, request: web.Request) -> web.Response:
+        """
+        Profiles the bot, and responds with the report once it is complete
+        """
+        try:
+            seconds = float(request.query["seconds"]) if "seconds" in request.query else None
+        except ValueError:
+            return web.Response(status=400, text="seconds must be a number")
+
+        # Also rejects nan and infinity, which would never finish
+        if seconds is not None and not 0 < seconds <= MAX_PROFILE_SECONDS:
+            return web.Response(
+                status=400,
+                text=f"seconds must be more than 0, and at most {MAX_PROFILE_SECONDS:g}",
+            )
+
+        try:
+            report = await self._runner_to_serve.profile(seconds)
+        except RuntimeError as error:
+            return web.Response(status=409, text=str(error))
+
+        return web.Response(text=report.format())
+
+    async def run(self) -> None:
+        """
+        Serves the metrics until this task is cancelled
+        """
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, self._host, self._port)
+
+        try:
+            await site.start()
+            await asyncio.Event().wait()
+        finally:
+            await self._runner.cleanup()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""
+Replays a recording of input events (see mewbot.recording) into a bot.
+
+Recordings are made by running a bot with the record_events runner option.
+The events can then be fed back to the same or a different configuration,
+at the speed they were recorded, faster, or as fast as possible.
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Sequence, Set, Type
+
+import asyncio
+import logging
+import time
+
+from mewbot.api.v1 import Input, InputEvent, IOConfig, Output
+from mewbot.recording import read_recording
+
+
+class ReplayIO(IOConfig):
+    """
+    Feeds the events from a recording file into the bot
+    """
+
+    _path: str = ""
+    _speed: float = 1.0
+
+    _input: Optional[ReplayInput] = None
+
+    @property
+    def path(self) -> str:
+        """The recording file to replay"""
+        return self._path
+
+    @path.setter
+    def path(self, path: str) -> None:
+        self._path = str(path)
+
+    @property
+    def speed(self) -> float:
+        """How many times faster than real time to replay, or 0 for as fast as possible"""
+        return self._speed
+
+    @speed.setter
+    def speed(self, speed: float) -> None:
+        if float(speed) < 0:
+            raise ValueError(f"Replay speed can not be negative, got {speed}")
+
+        self._speed = float(speed)
+
+    def get_inputs(self) -> Sequence[Input]:
+        if not self._input:
+            self._input = ReplayInput(self._path, self._speed)
+
+        return [self._input]
+
+    def get_outputs(self) -> Sequence[Output]:
+        return []
+
+
+class ReplayInput(Input):
+    """
+    Puts each recorded event on the input queue, keeping the recorded
+    intervals between them (scaled by the replay speed)
+    """
+
+    path: str
+    speed: float
+    replayed: int
+
+    _logger: logging.Logger
+
+    def __init__(self, path: str, speed: float) -> None:
+        super().__init__()
+
+        self.path = path
+        self.speed = speed
+        self.replayed = 0
+
+        self._logger = logging.getLogger(__name__ + "ReplayInput")
+
+    @staticmethod
+    def produces_inputs() -> Set[Type[InputEvent]]:
+        """
+        A recording can hold any type of input event
+        """
+        return {InputEvent}
+
+    async def run(self) -> None:
+        if not self.queue:
+            return
+
+        started = time.monotonic()
+        first: Optional[float] = None
+
+        for timestamp, event in read_recording(self.path):
+            if first is None:
+                first = timestamp
+
+            if self.speed:
+                delay = started + (timestamp - first) / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif self.replayed % 100 == 0:
+                # Give the rest of the bot a chance to run
+                await asyncio.sleep(0)
+
+            await self.queue.put(event)
+            self.replayed += 1
+
+        self._logger.info(
+            "Replayed %d events from %s in %.2fs",
+            self.replayed,
+            self.path,
+            time.monotonic() - started,
+        )
@@ -2,13 +2,18 @@
 
 from __future__ import annotations
 
-from typing import Any, TextIO, Type
+from typing import Any, Dict, List, Optional, TextIO, Tuple, Type, cast
 
+import asyncio
+import dataclasses
 import importlib
+import itertools
+import logging
+import os
 import sys
 import yaml
 
-from mewbot.bot import Bot
+from mewbot.bot import Bot, BotRunner
 from mewbot.config import ConfigBlock, BehaviourConfigBlock
 from mewbot.core import (
     Component,
@@ -23,6 +28,14 @@ from mewbot.core import (
 
 _REQUIRED_KEYS = set(ConfigBlock.__annotations__.keys())  # pylint: disable=no-member
 
+# BotRunner options which are given in YAML as the fully-qualified name of a function
+_RUNNER_CALLABLE_OPTIONS = {"partition_key"}
+# BotRunner options which configure an event queue
+_RUNNER_QUEUE_OPTIONS = {"input_queue", "output_queue"}
+# BotRunner options which are lists of objects, each given in YAML as an
+# implementation (a fully-qualified class name) and the properties to create it with
+_RUNNER_OBJECT_LIST_OPTIONS = {"trace_exporters", "dead_letters"}
+
 
 def assert_message(obj: Any, interface: Type[Any]) -> str:
     """Generates the assert error message for an incomplete interface"""
@@ -37,21 +50,14 @@ def assert_message(obj: Any, interface: Type[Any]) -> str:
 def configure_bot(name: str, stream: TextIO) -> Bot:
     """Loads a series of components from a YAML file to crate a bot
 
-    The YAML is expected to be a series of IOConfig, DataSource, and Behaviour blocks."""
+    The YAML is expected to be a series of IOConfig, DataSource, and Behaviour blocks,
+    optionally with a Runner block to configure how the bot processes events."""
 
     bot = Bot(name)
-    number = 0
-
-    for document in yaml.load_all(stream, Loader=yaml.CSafeLoader):
-        number += 1
-
-        if not _REQUIRED_KEYS.issubset(document.keys()):
-            raise ValueError(
-                f"Document {number} missing some keys: {_REQUIRED_KEYS.difference(document.keys())}"
-            )
 
+    for document in read_config(stream):
         if document["kind"] == ComponentKind.Behaviour:
-            bot.add_behaviour(load_behaviour(document))
+            bot.add_behaviour(load_behaviour(cast(BehaviourConfigBlock, document)))
         if document["kind"] == ComponentKind.DataSource:
             ...
         if document["kind"] == ComponentKind.IOConfig:
@@ -60,10 +66,89 @@ def configure_bot(name: str, stream: TextIO) -> Bot:
                 component, IOConfigInterface
             )
             bot.add_io_config(component)
+        if document["kind"] == ComponentKind.Runner:
+            bot.configure_runner(**load_runner_options(document))
 
     return bot
 
 
+def read_config(stream: TextIO) -> List[ConfigBlock]:
+    """Reads the blocks of a YAML configuration, checking each has the required keys"""
+
+    documents: List[ConfigBlock] = []
+
+    for number, document in enumerate(yaml.load_all(stream, Loader=yaml.CSafeLoader), 1):
+        if not _REQUIRED_KEYS.issubset(document.keys()):
+            raise ValueError(
+                f"Document {number} missing some keys: {_REQUIRED_KEYS.difference(document.keys())}"
+            )
+
+        documents.append(document)
+
+    return documents
+
+
+def load_runner_options(config: ConfigBlock) -> Dict[str, Any]:
+    """Reads the BotRunner options from a Runner configuration block"""
+
+    target_class = get_implementation(config["implementation"])
+
+    if not isinstance(target_class, type) or not issubclass(target_class, BotRunner):
+        raise TypeError(f"Class {target_class} is not a BotRunner, requested by {config}")
+
+    options = dict(config["properties"])
+
+    for option in _RUNNER_CALLABLE_OPTIONS.intersection(options.keys()):
+        if isinstance(options[option], str):
+            options[option] = get_implementation(options[option])
+
+    for option in _RUNNER_QUEUE_OPTIONS.intersection(options.keys()):
+        options[option] = _load_queue_options(options[option])
+
+    if "deduplicate" in options:
+        # Event classes and their identity functions are given by their
+        # fully-qualified names
+        dedup_options = dict(options["deduplicate"])
+        dedup_options["identities"] = {
+            _resolve(event_type): _resolve(function)
+            for event_type, function in dedup_options.get("identities", {}).items()
+        }
+        options["deduplicate"] = dedup_options
+
+    for option in _RUNNER_OBJECT_LIST_OPTIONS.intersection(options.keys()):
+        options[option] = [
+            get_implementation(item["implementation"])(**item.get("properties", {}))
+            if isinstance(item, dict)
+            else item
+            for item in options[option]
+        ]
+
+    return options
+
+
+def _load_queue_options(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Reads the options for an event queue (see mewbot.queues.create_queue)"""
+
+    queue_options = dict(config)
+
+    # Event types to shed are given by their fully-qualified class names
+    if "shed" in queue_options:
+        queue_options["shed"] = [_resolve(name) for name in queue_options["shed"]]
+
+    # Event priorities are keyed by fully-qualified class names
+    if "priorities" in queue_options:
+        queue_options["priorities"] = {
+            _resolve(name): priority for name, priority in queue_options["priorities"].items()
+        }
+
+    return queue_options
+
+
+def _resolve(name: Any) -> Any:
+    """Gets the object a fully-qualified name refers to, passing other values through"""
+    return get_implementation(name) if isinstance(name, str) else name
+
+
 def load_behaviour(config: BehaviourConfigBlock) -> BehaviourInterface:
     """Creates a behaviour and its components based on a configuration block"""
 
@@ -158,3 +243,249 @@ def get_implementation(implementation: str) -> Type[Any]:
     target_class: Type[Component] = getattr(module, class_name)
 
     return target_class
+
+
+@dataclasses.dataclass
+class ConfigDiff:
+    """The changes between two versions of a bot's configuration.
+
+    Behaviours are matched up by their uuid. A behaviour whose own block has
+    changed is replaced as a whole; one where only some of its triggers,
+    conditions, or actions have changed is updated in place."""
+
+    added: List[BehaviourConfigBlock] = dataclasses.field(default_factory=list)
+    removed: List[BehaviourConfigBlock] = dataclasses.field(default_factory=list)
+    replaced: List[BehaviourConfigBlock] = dataclasses.field(default_factory=list)
+    updated: List[BehaviourConfigBlock] = dataclasses.field(default_factory=list)
+    # Changes which can not be applied to a running bot (to IOConfigs, DataSources,
+    # and the Runner block), which take effect the next time it is started
+    unsupported: List[str] = dataclasses.field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.added or self.removed or self.replaced or self.updated or self.unsupported
+        )
+
+
+def diff_config(old: List[ConfigBlock], new: List[ConfigBlock]) -> ConfigDiff:
+    """Finds the behaviours which have changed between two configurations"""
+
+    diff = ConfigDiff()
+
+    old_behaviours = _blocks_by_uuid(old, ComponentKind.Behaviour)
+    new_behaviours = _blocks_by_uuid(new, ComponentKind.Behaviour)
+
+    for uuid, config in new_behaviours.items():
+        previous = old_behaviours.get(uuid)
+
+        if previous is None:
+            diff.added.append(cast(BehaviourConfigBlock, config))
+        elif _own_block(previous) != _own_block(config):
+            diff.replaced.append(cast(BehaviourConfigBlock, config))
+        elif previous != config:
+            diff.updated.append(cast(BehaviourConfigBlock, config))
+
+    diff.removed.extend(
+        cast(BehaviourConfigBlock, config)
+        for uuid, config in old_behaviours.items()
+        if uuid not in new_behaviours
+    )
+
+    for kind in (ComponentKind.IOConfig, ComponentKind.DataSource):
+        old_blocks = _blocks_by_uuid(old, kind)
+        new_blocks = _blocks_by_uuid(new, kind)
+
+        diff.unsupported.extend(
+            f"{kind.value} {uuid}"
+            for uuid in dict.fromkeys([*old_blocks, *new_blocks])
+            if old_blocks.get(uuid) != new_blocks.get(uuid)
+        )
+
+    if _blocks_of(old, ComponentKind.Runner) != _blocks_of(new, ComponentKind.Runner):
+        diff.unsupported.append("Runner options")
+
+    return diff
+
+
+def _blocks_of(documents: List[ConfigBlock], kind: ComponentKind) -> List[ConfigBlock]:
+    return [document for document in documents if document["kind"] == kind]
+
+
+def _blocks_by_uuid(
+    documents: List[ConfigBlock], kind: ComponentKind
+) -> Dict[str, ConfigBlock]:
+    return {document["uuid"]: document for document in _blocks_of(documents, kind)}
+
+
+def _own_block(config: ConfigBlock) -> ConfigBlock:
+    """A configuration block without any of its sub-components"""
+
+    return {
+        "kind": config["kind"],
+        "implementation": config["implementation"],
+        "uuid": config["uuid"],
+        "properties": config["properties"],
+    }
+
+
+class ConfigWatcher:
+    """Reloads the behaviours of a running bot when its configuration file changes.
+
+    The file is checked every few seconds. Only the behaviours, triggers,
+    conditions, and actions which have changed are reloaded, so the rest keep
+    their state, and the bot's inputs and outputs keep their connections.
+    If the new configuration can not be loaded, the bot carries on as it was."""
+
+    path: str
+    runner: BotRunner
+    interval: float  # Seconds between checks of the file
+    documents: List[ConfigBlock]  # The configuration currently in use
+
+    _stamp: Tuple[int, int]
+    _logger: logging.Logger
+
+    def __init__(self, path: str, runner: BotRunner, interval: float = 2.0) -> None:
+        self.path = path
+        self.runner = runner
+        self.interval = interval
+        self._logger = logging.getLogger(__name__ + "ConfigWatcher")
+
+        self._stamp = self._file_stamp()
+        with open(path, "r", encoding="utf-8") as config:
+            self.documents = read_config(config)
+
+    def __str__(self) -> str:
+        return f"ConfigWatcher({self.path})"
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.check()
+
+    def check(self) -> Optional[ConfigDiff]:
+        """Reloads the configuration if the file has changed since it was last read"""
+
+        try:
+            stamp = self._file_stamp()
+        except OSError as err:
+            self._logger.warning("Unable to check %s: %s", self.path, err)
+            return None
+
+        if stamp == self._stamp:
+            return None
+
+        self._stamp = stamp
+
+        try:
+            return self.reload()
+        except Exception as err:  # pylint: disable=broad-except
+            self._logger.exception("Not reloading %s: %s", self.path, err)
+            return None
+
+    def reload(self) -> ConfigDiff:
+        """Reads the configuration file and applies any changes to the runner"""
+
+        with open(self.path, "r", encoding="utf-8") as config:
+            documents = read_config(config)
+
+        diff = diff_config(self.documents, documents)
+        self.apply(diff)
+        self.documents = documents
+
+        return diff
+
+    def apply(self, diff: ConfigDiff) -> None:
+        """Changes the runner's behaviours to match a new configuration.
+
+        Every new component is created before any changes are made, so that an
+        error in the new configuration leaves the bot as it was."""
+
+        running = {
+            getattr(behaviour, "uuid", None): behaviour
+            for behaviour in self.runner.all_behaviours()
+        }
+        old_configs = _blocks_by_uuid(self.documents, ComponentKind.Behaviour)
+
+        added = [load_behaviour(config) for config in [*diff.added, *diff.replaced]]
+        removed = [
+            running[config["uuid"]]
+            for config in [*diff.removed, *diff.replaced]
+            if config["uuid"] in running
+        ]
+        updates: List[Tuple[BehaviourInterface, List[Component]]] = []
+
+        for config in diff.updated:
+            behaviour = running.get(config["uuid"])
+
+            if behaviour is None or not hasattr(behaviour, "replace_components"):
+                # Behaviours which can't have their components replaced are reloaded whole
+                added.append(load_behaviour(config))
+                if behaviour is not None:
+                    removed.append(behaviour)
+                continue
+
+            old_config = cast(BehaviourConfigBlock, old_configs[config["uuid"]])
+            updates.append((behaviour, _reload_components(behaviour, old_config, config)))
+
+        _replace_components(updates)
+        self.runner.update_behaviours(added, removed, [behaviour for behaviour, _ in updates])
+
+        for change in diff.unsupported:
+            self._logger.warning("Changes to %s need a restart to take effect", change)
+
+    def _file_stamp(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+
+def _reload_components(
+    behaviour: BehaviourInterface, old: BehaviourConfigBlock, new: BehaviourConfigBlock
+) -> List[Component]:
+    """The new components of a behaviour, reusing those whose configuration is unchanged"""
+
+    existing = {
+        getattr(component, "uuid", ""): component for component in _components_of(behaviour)
+    }
+    old_configs = {
+        config["uuid"]: config
+        for config in itertools.chain(old["triggers"], old["conditions"], old["actions"])
+    }
+
+    components: List[Component] = []
+
+    for config in itertools.chain(new["triggers"], new["conditions"], new["actions"]):
+        uuid = config["uuid"]
+
+        if uuid in existing and old_configs.get(uuid) == config:
+            components.append(existing[uuid])
+        else:
+            components.append(load_component(config))
+
+    return components
+
+
+def _replace_components(updates: List[Tuple[BehaviourInterface, List[Component]]]) -> None:
+    """Replaces the components of several behaviours, either all or none of them"""
+
+    replaced: List[Tuple[BehaviourInterface, List[Component]]] = []
+
+    try:
+        for behaviour, components in updates:
+            previous = _components_of(behaviour)
+            getattr(behaviour, "replace_components")(components)
+            replaced.append((behaviour, previous))
+    except (TypeError, ValueError):
+        # Put back the components of the behaviours which were already changed
+        for behaviour, previous in replaced:
+            getattr(behaviour, "replace_components")(previous)
+        raise
+
+
+def _components_of(behaviour: BehaviourInterface) -> List[Component]:
+    """The triggers, conditions, and actions of a behaviour"""
+
+    return [
+        *getattr(behaviour, "triggers", ()),
+        *getattr(behaviour, "conditions", ()),
+        *getattr(behaviour, "actions", ()),
+    ]
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+"""Sharing the results of identical triggers and conditions between behaviours.
+
+Bots often have many behaviours with the same condition (e.g. an allow-list of
+channels) configured identically, each of which would be checked again for
+every event. Triggers and conditions which declare themselves pure (their
+result only depends on their properties and the event) can be memoised: the
+runner keeps a SharedResults of those which are structurally identical to
+another in a different behaviour, by implementation and serialised properties.
+
+While the runner dispatches an event, the results of these components are
+kept, so each distinct one is evaluated at most once per event. Components
+which are not pure, or not shared, are evaluated as usual.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+import contextlib
+import contextvars
+import json
+
+from mewbot.core import BehaviourInterface, InputEvent
+
+Identity = Tuple[str, str]  # A component's implementation, and its serialised properties
+
+# Properties which change how a component runs, but not its results
+IGNORED_PROPERTIES = frozenset({"execution"})
+
+
+def component_identity(component: Any) -> Optional[Identity]:
+    """What makes a pure component's results the same as another's.
+
+    Returns None if the component is not pure, or can't be serialised."""
+
+    if not getattr(component, "pure", False):
+        return None
+
+    try:
+        config = component.serialise()
+        properties = {
+            name: value
+            for name, value in config["properties"].items()
+            if name not in IGNORED_PROPERTIES
+        }
+        return config["implementation"], json.dumps(properties, sort_keys=True, default=repr)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        # e.g. a property which can not be read yet
+        return None
+
+
+class SharedResults:
+    """The pure triggers and conditions which share results, by their identity"""
+
+    hits: int  # Results which were reused, rather than evaluated again
+    misses: int  # Results of shared components which were evaluated
+
+    _identities: Dict[Any, Identity]
+
+    def __init__(self, behaviours: Iterable[BehaviourInterface]) -> None:
+        found: Dict[Any, Identity] = {}
+        uses: Dict[Identity, int] = {}
+
+        for behaviour in behaviours:
+            components = [
+                *getattr(behaviour, "triggers", ()),
+                *getattr(behaviour, "conditions", ()),
+            ]
+
+            for component in components:
+                identity = component_identity(component)
+
+                if identity is not None:
+                    found[component] = identity
+                    uses[identity] = uses.get(identity, 0) + 1
+
+        self.hits = 0
+        self.misses = 0
+
+        # A component used once has nothing to share its results with
+        self._identities = {
+            component: identity for component, identity in found.items() if uses[identity] > 1
+        }
+
+    def __len__(self) -> int:
+        """The number of components whose results are shared"""
+        return len(self._identities)
+
+    def identity(self, component: Any) -> Optional[Identity]:
+        return self._identities.get(component)
+
+    @contextlib.contextmanager
+    def dispatching(self) -> Iterator[None]:
+        """Keeps the shared results of the events dispatched by the current task"""
+
+        if not self._identities:
+            yield
+            return
+
+        token = _current.set(EventResults(self))
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+
+class EventResults:
+    """The results of the shared components for the events being dispatched"""
+
+    shared: SharedResults
+
+    _results: Dict[Tuple[int, Identity], bool]  # Results, by event id and identity
+
+    def __init__(self, shared: SharedResults) -> None:
+        self.shared = shared
+        self._results = {}
+
+    def lookup(self, component: Any, event: InputEvent) -> Tuple[Any, Optional[bool]]:
+        """The key to store a component's result under, and the result if it is known"""
+
+        identity = self.shared.identity(component)
+
+        if identity is None:
+            return None, None
+
+        key = (id(event), identity)
+        result = self._results.get(key)
+
+        if result is None:
+            self.shared.misses += 1
+        else:
+            self.shared.hits += 1
+
+        return key, result
+
+    def store(self, key: Any, result: bool) -> bool:
+        if key is not None:
+            self._results[key] = result
+        return result
+
+
+_current: contextvars.ContextVar[Optional[EventResults]] = contextvars.ContextVar(
+    "mewbot_results", default=None
+)
+
+
+def evaluate(component: Any, check: Callable[[InputEvent], bool], event: InputEvent) -> bool:
+    """Calls a trigger's matches or condition's allows, sharing its result if it can be"""
+
+    results = _current.get()
+
+    if results is None:
+        return check(event)
+
+    key, result = results.lookup(component, event)
+    return result if result is not None else results.store(key, bool(check(event)))
+
+
+async def evaluate_async(
+    component: Any, check: Callable[[InputEvent], Awaitable[bool]], event: InputEvent
+) -> bool:
+    """As evaluate, for a check which is awaited (e.g. as it is offloaded)"""
+
+    results = _current.get()
+
+    if results is None:
+        return await check(event)
+
+    key, result = results.lookup(component, event)
+    return result if result is not None else results.store(key, bool(await check(event)))
+
+
+__all__ = [
+    "SharedResults",
+    "EventResults",
+    "component_identity",
+    "evaluate",
+    "evaluate_async",
+]
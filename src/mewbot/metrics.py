@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+
+"""Runtime metrics for a running bot, and rendering them for Prometheus.
+
+Recording is kept cheap, as it happens for every event: counters are plain
+integer attributes and dictionaries, and histograms have fixed buckets.
+Anything which can be read from the runner's current state (such as queue
+depths) is only collected when the metrics are read.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+import bisect
+import time
+
+if TYPE_CHECKING:
+    from mewbot.bot import BotRunner
+    from mewbot.delivery import OutputLane
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """Counts observations into fixed buckets, like a Prometheus histogram"""
+
+    buckets: Tuple[float, ...]
+    counts: List[int]  # Observations in each bucket, with a final one for the overflow
+    count: int
+    total: float
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """The number of observations at or below each bucket's upper bound"""
+
+        running = 0
+        result = []
+
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            running += count
+            result.append((bound, running))
+
+        return result
+
+
+class BehaviourStats:
+    """Counts of how a behaviour handled the events passed to it"""
+
+    events: int  # Events passed to the behaviour
+    matched: int  # Events which matched one of its triggers
+    rejected: int  # Matched events which a condition did not allow
+    action_latency: Histogram  # Time taken running the actions for an allowed event
+
+    def __init__(self) -> None:
+        self.events = 0
+        self.matched = 0
+        self.rejected = 0
+        self.action_latency = Histogram()
+
+    @property
+    def match_rate(self) -> float:
+        """The proportion of events which matched a trigger"""
+        return self.matched / self.events if self.events else 0.0
+
+    @property
+    def reject_rate(self) -> float:
+        """The proportion of matched events which were rejected by a condition"""
+        return self.rejected / self.matched if self.matched else 0.0
+
+
+class RunnerMetrics:
+    """Metrics for the events passing through a BotRunner.
+
+    The runner counts the events it dispatches by type; behaviours with a
+    BehaviourStats `stats` attribute (such as mewbot.api.v1.Behaviour) and the
+    output lanes keep their own counts, which are collected from them here.
+    """
+
+    runner: BotRunner
+    started: float
+
+    input_events: Dict[Type[Any], int]  # Input events dispatched, by class
+    output_events: Dict[Type[Any], int]  # Output events dispatched, by class
+
+    def __init__(self, runner: BotRunner) -> None:
+        self.runner = runner
+        self.started = time.monotonic()
+
+        self.input_events = {}
+        self.output_events = {}
+
+    def record_input(self, event_type: Type[Any]) -> None:
+        self.input_events[event_type] = self.input_events.get(event_type, 0) + 1
+
+    def record_output(self, event_type: Type[Any]) -> None:
+        self.output_events[event_type] = self.output_events.get(event_type, 0) + 1
+
+    @property
+    def uptime(self) -> float:
+        return time.monotonic() - self.started
+
+    def rate(self, event_type: Type[Any]) -> float:
+        """Mean events per second of an (input or output) event class since startup"""
+
+        count = self.input_events.get(event_type, 0) + self.output_events.get(event_type, 0)
+        return count / self.uptime
+
+    def behaviour_stats(self) -> Dict[str, BehaviourStats]:
+        """The stats of each behaviour which records them, by behaviour name"""
+
+        behaviours: Dict[Any, BehaviourStats] = {}
+
+        for behaviour in self.runner.all_behaviours():
+            stats = getattr(behaviour, "stats", None)
+            if isinstance(stats, BehaviourStats):
+                behaviours[behaviour] = stats
+
+        return dict(zip(unique_labels(behaviours), behaviours.values()))
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format"""
+
+        text = Exposition()
+
+        text.family("uptime_seconds", "gauge", "Time since the runner was started")
+        text.sample("uptime_seconds", {}, self.uptime)
+
+        for direction, counts in (
+            ("input", self.input_events),
+            ("output", self.output_events),
+        ):
+            name = f"{direction}_events_total"
+            text.family(name, "counter", f"The {direction} events dispatched, by type")
+            for event_type, count in counts.items():
+                text.sample(name, {"event_type": qualname(event_type)}, count)
+
+        queues = self.runner.event_queues()
+
+        text.family("queue_depth", "gauge", "Events waiting in each queue")
+        for name, queue in queues.items():
+            text.sample("queue_depth", {"queue": name}, queue.qsize())
+
+        text.family("queue_dropped_total", "counter", "Events dropped by a full queue")
+        for name, queue in queues.items():
+            text.sample("queue_dropped_total", {"queue": name}, getattr(queue, "dropped", 0))
+
+        deduplicator = self.runner.deduplicator
+
+        if deduplicator:
+            name = "input_duplicates_total"
+            text.family(name, "counter", "Duplicate input events dropped, by type")
+            for event_type, count in deduplicator.duplicates_by_type.items():
+                text.sample(name, {"event_type": qualname(event_type)}, count)
+
+        self._render_behaviours(text)
+        self._render_outputs(text)
+        self._render_breakers(text)
+
+        return str(text)
+
+    def _render_behaviours(self, text: Exposition) -> None:
+        stats = self.behaviour_stats()
+
+        for name, attribute, help_text in (
+            ("behaviour_events_total", "events", "Events passed to each behaviour"),
+            ("behaviour_matched_total", "matched", "Events which matched a trigger"),
+            (
+                "behaviour_rejected_total",
+                "rejected",
+                "Matched events rejected by a condition",
+            ),
+        ):
+            text.family(name, "counter", help_text)
+            for label, behaviour in stats.items():
+                text.sample(name, {"behaviour": label}, getattr(behaviour, attribute))
+
+        text.family("behaviour_action_seconds", "histogram", "Time taken running actions")
+        for label, behaviour in stats.items():
+            text.histogram(
+                "behaviour_action_seconds", {"behaviour": label}, behaviour.action_latency
+            )
+
+        shared = self.runner.shared_results
+        text.family("shared_results_total", "counter", "Results of shared components reused")
+        text.sample("shared_results_total", {}, shared.hits)
+
+    def _render_outputs(self, text: Exposition) -> None:
+        lanes = self.runner.output_lanes
+        labels = dict(zip(lanes.values(), unique_labels(lanes)))
+
+        text.family("output_lane_depth", "gauge", "Events waiting to be sent by each output")
+        for lane, label in labels.items():
+            text.sample("output_lane_depth", {"output": label}, lane.depth)
+
+        self._render_destinations(text, labels)
+
+        text.family("output_dropped_total", "counter", "Events dropped by a full output lane")
+        for lane, label in labels.items():
+            text.sample("output_dropped_total", {"output": label}, lane.dropped)
+
+        self._render_retries(text, labels)
+
+        text.family(
+            "output_calls_total", "counter", "Events passed to each output, by result"
+        )
+        for lane, label in labels.items():
+            succeeded = lane.delivered - lane.failed
+            text.sample(
+                "output_calls_total", {"output": label, "result": "success"}, succeeded
+            )
+            text.sample(
+                "output_calls_total", {"output": label, "result": "failure"}, lane.failed
+            )
+
+        text.family(
+            "output_seconds", "histogram", "Time taken by each output to send an event"
+        )
+        for lane, label in labels.items():
+            text.histogram("output_seconds", {"output": label}, lane.output_latency)
+
+    @staticmethod
+    def _render_destinations(text: Exposition, labels: Dict[OutputLane, str]) -> None:
+        """Metrics for outputs which rate limit or coalesce events by destination"""
+
+        text.family(
+            "output_destination_backlog",
+            "gauge",
+            "Events waiting for each destination of a rate-limited output",
+        )
+        for lane, label in labels.items():
+            if not lane.scheduler:
+                continue
+            for destination, depth in lane.backlog().items():
+                text.sample(
+                    "output_destination_backlog",
+                    {"output": label, "destination": str(destination)},
+                    depth,
+                )
+
+        text.family(
+            "output_coalesced_total",
+            "counter",
+            "Events merged into another event for the same destination",
+        )
+        for lane, label in labels.items():
+            if lane.coalescer:
+                text.sample(
+                    "output_coalesced_total", {"output": label}, lane.coalescer.coalesced
+                )
+
+    @staticmethod
+    def _render_retries(text: Exposition, labels: Dict[OutputLane, str]) -> None:
+        """Metrics for outputs which retry the events they fail to send"""
+
+        for name, attribute, help_text in (
+            ("output_retries_total", "retried", "Failed events put back to be sent again"),
+            ("output_dead_letters_total", "dead", "Failed events which were given up on"),
+        ):
+            text.family(name, "counter", help_text)
+            for lane, label in labels.items():
+                if lane.retry:
+                    text.sample(name, {"output": label}, getattr(lane.retry, attribute))
+
+    def _render_breakers(self, text: Exposition) -> None:
+        breakers = self.runner.breakers()
+
+        text.family("breaker_open", "gauge", "Whether each circuit breaker is open")
+        for name, breaker in breakers.items():
+            text.sample("breaker_open", {"component": name}, breaker.state != "closed")
+
+        for name, attribute, help_text in (
+            ("breaker_trips_total", "trips", "Times each circuit breaker has opened"),
+            ("breaker_timeouts_total", "timeouts", "Guarded calls which timed out"),
+            ("breaker_failures_total", "failures", "Guarded calls which raised an exception"),
+            ("breaker_skipped_total", "skipped", "Calls skipped as the breaker was open"),
+        ):
+            text.family(name, "counter", help_text)
+            for component, breaker in breakers.items():
+                text.sample(name, {"component": component}, getattr(breaker, attribute))
+
+
+class Exposition:
+    """Builds up metrics in the Prometheus text format"""
+
+    lines: List[str]
+
+    def __init__(self) -> None:
+        self.lines = []
+
+    def __str__(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+    def family(self, name: str, kind: str, help_text: str) -> None:
+        self.lines.append(f"# HELP mewbot_{name} {help_text}")
+        self.lines.append(f"# TYPE mewbot_{name} {kind}")
+
+    def sample(self, name: str, labels: Dict[str, str], value: float) -> None:
+        self.lines.append(f"mewbot_{name}{format_labels(labels)} {value:g}")
+
+    def histogram(self, name: str, labels: Dict[str, str], histogram: Histogram) -> None:
+        for bound, count in histogram.cumulative():
+            bucket = "+Inf" if bound == float("inf") else f"{bound:g}"
+            self.sample(f"{name}_bucket", {**labels, "le": bucket}, count)
+
+        self.sample(f"{name}_sum", labels, histogram.total)
+        self.sample(f"{name}_count", labels, histogram.count)
+
+
+def unique_labels(components: Iterable[Any]) -> List[str]:
+    """Gives each component a distinct label, based on its name or class.
+
+    Components which would share a label have a counter appended."""
+
+    labels: List[str] = []
+    seen: Dict[str, int] = {}
+
+    for component in components:
+        label = getattr(component, "name", None) or qualname(type(component))
+
+        seen[label] = seen.get(label, 0) + 1
+        labels.append(label if seen[label] == 1 else f"{label}#{seen[label]}")
+
+    return labels
+
+
+def qualname(cls: Type[Any]) -> str:
+    return cls.__module__ + "." + cls.__qualname__
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+__all__ = [
+    "DEFAULT_BUCKETS",
+    "Histogram",
+    "BehaviourStats",
+    "RunnerMetrics",
+]
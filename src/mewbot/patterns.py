@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+"""Matching the patterns of many regex triggers against an event at once.
+
+Every mewbot.api.v1.RegexTrigger registers its pattern with a shared
+PatternEngine, which compiles the patterns for each event field (e.g. "text")
+together into a PatternSet. The first trigger to check an event scans its
+field with the set, which finds the keys of every pattern in it; the result is
+kept, so every other trigger just looks its own key up.
+
+Most patterns contain a literal which any match must include (e.g. "hello" in
+r"\bhello\b"). A PatternSet indexes the patterns by that literal, and only
+searches with those whose literal is in the text (a fast substring check);
+patterns without one are always searched with. Identical patterns (e.g. the
+same trigger in several behaviours) are only searched with once. The set is
+rebuilt lazily, on the first scan after triggers have been added, changed, or
+garbage collected.
+
+Copies of triggers unpickled in another process (e.g. to run in the process
+pool) don't register themselves, as each call would unpickle a new copy and
+rebuild the set. They use a shared key for their pattern instead, which is
+registered once in each process and kept for as long as it runs.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, FrozenSet, List, Optional, Pattern, Set, Tuple
+
+import itertools
+import re
+import threading
+import weakref
+
+try:
+    from re import _parser as sre_parse  # type: ignore  # Python 3.11 onwards
+except ImportError:  # pragma: no cover
+    import sre_parse  # pylint: disable=deprecated-module
+
+# The parser's opcodes for a literal character, and an anchor (e.g. \b)
+_LITERAL = getattr(sre_parse, "LITERAL")
+_AT = getattr(sre_parse, "AT")
+
+# Literals shorter than this are too common to be worth checking for
+MIN_LITERAL = 2
+
+Spec = Tuple[str, bool]  # A pattern, and whether it ignores case
+
+_keys = itertools.count(1)
+
+
+def new_key() -> int:
+    """A unique key for a pattern registered with an engine"""
+    return next(_keys)
+
+
+def compile_pattern(pattern: str, ignore_case: bool = False) -> Pattern[str]:
+    """Compiles a trigger's pattern, raising ValueError if it is invalid"""
+
+    try:
+        return re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+    except re.error as exc:
+        raise ValueError(f"Invalid regular expression {pattern!r}: {exc}") from exc
+
+
+def required_literal(pattern: str, ignore_case: bool = False) -> Tuple[Optional[str], bool]:
+    """The longest literal which every match of a pattern contains, if it has one.
+
+    Also returns whether the pattern ignores case (including with an inline
+    flag), in which case the literal is lower case. Only the top level of the
+    pattern is considered, so the literal may not be the longest possible."""
+
+    parsed = sre_parse.parse(pattern, re.IGNORECASE if ignore_case else 0)
+    ignore_case = bool(parsed.state.flags & re.IGNORECASE)
+
+    best = ""
+    run: List[str] = []
+
+    for opcode, value in parsed:
+        if opcode is _LITERAL:
+            run.append(chr(value))
+        elif opcode is not _AT:
+            # Anything but a literal or an anchor (e.g. \b) ends the run
+            best = max(best, "".join(run), key=len)
+            run = []
+
+    best = max(best, "".join(run), key=len)
+
+    if len(best) < MIN_LITERAL or (ignore_case and not best.isascii()):
+        return None, ignore_case
+
+    return (best.lower() if ignore_case else best), ignore_case
+
+
+class PatternSet:
+    """The patterns for one field of the events, which are searched for together"""
+
+    _patterns: Dict[Spec, Pattern[str]]
+    _keys: Dict[Spec, FrozenSet[int]]  # The keys registered with each pattern
+    _literals: Dict[str, List[Spec]]  # Case-sensitive patterns, by their literal
+    _lower_literals: Dict[str, List[Spec]]  # Case-insensitive patterns, by their literal
+    _unfiltered: List[Spec]  # Patterns without a literal
+
+    def __init__(self, patterns: Dict[int, Spec]) -> None:
+        keys: Dict[Spec, Set[int]] = {}
+        for key, spec in patterns.items():
+            keys.setdefault(spec, set()).add(key)
+
+        self._patterns = {spec: compile_pattern(*spec) for spec in keys}
+        self._keys = {spec: frozenset(spec_keys) for spec, spec_keys in keys.items()}
+        self._literals = {}
+        self._lower_literals = {}
+        self._unfiltered = []
+
+        for spec in keys:
+            literal, ignore_case = required_literal(*spec)
+
+            if literal is None:
+                self._unfiltered.append(spec)
+            elif ignore_case:
+                self._lower_literals.setdefault(literal, []).append(spec)
+            else:
+                self._literals.setdefault(literal, []).append(spec)
+
+    def __len__(self) -> int:
+        """The number of distinct patterns"""
+        return len(self._patterns)
+
+    def scan(self, text: Any) -> FrozenSet[int]:
+        """The keys of every pattern found in some text"""
+
+        if not isinstance(text, str) or not self._patterns:
+            return frozenset()
+
+        found: Set[int] = set()
+
+        for spec in self._candidates(text):
+            if self._patterns[spec].search(text):
+                found.update(self._keys[spec])
+
+        return frozenset(found)
+
+    def _candidates(self, text: str) -> List[Spec]:
+        """The patterns which could be found in some text, by their literals"""
+
+        candidates = list(self._unfiltered)
+
+        for literal, specs in self._literals.items():
+            if literal in text:
+                candidates.extend(specs)
+
+        if self._lower_literals:
+            # Case folding text which isn't ASCII may not match the way the
+            # regex engine does, so the literals are not checked for in it
+            lowered = text.lower() if text.isascii() else None
+
+            for literal, specs in self._lower_literals.items():
+                if lowered is None or literal in lowered:
+                    candidates.extend(specs)
+
+        return candidates
+
+
+class PatternEngine:
+    """Compiles the patterns of all the registered triggers together, by field"""
+
+    _patterns: Dict[str, Dict[int, Spec]]  # The registered patterns, by field and key
+    _registered: Dict[int, str]  # The field of each registered pattern, by key
+
+    # The compiled patterns for each field. A field whose patterns have changed
+    # is removed, and compiled again by its next scan.
+    _sets: Dict[str, PatternSet]
+
+    # The most recent event scanned for each field, with the patterns it was
+    # scanned with and the keys found. These are replaced together, so that
+    # triggers running in other threads always see a consistent result.
+    _last: Dict[str, Tuple[Any, PatternSet, FrozenSet[int]]]
+
+    # The keys of the patterns registered without an owner, by field and pattern
+    _shared: Dict[Tuple[str, Spec], int]
+
+    _lock: threading.Lock
+
+    def __init__(self) -> None:
+        self._patterns = {}
+        self._registered = {}
+        self._sets = {}
+        self._last = {}
+        self._shared = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._registered)
+
+    def register(  # pylint: disable=too-many-arguments
+        self, owner: Any, key: int, pattern: str, field: str, ignore_case: bool = False
+    ) -> None:
+        """Adds or replaces the pattern with a key, which is removed once the owner is gone"""
+
+        compile_pattern(pattern, ignore_case)
+
+        with self._lock:
+            if key not in self._registered:
+                weakref.finalize(owner, self.unregister, key)
+            else:
+                self._discard(key)
+
+            self._patterns.setdefault(field, {})[key] = (pattern, ignore_case)
+            self._registered[key] = field
+            self._sets.pop(field, None)
+
+    def shared_key(self, pattern: str, field: str, ignore_case: bool = False) -> int:
+        """The key of a pattern registered without an owner, registering it if needed"""
+
+        spec = (pattern, ignore_case)
+        key = self._shared.get((field, spec))
+
+        if key is not None:
+            return key
+
+        compile_pattern(pattern, ignore_case)
+
+        with self._lock:
+            key = self._shared.get((field, spec))
+
+            if key is None:
+                key = self._shared[(field, spec)] = new_key()
+                self._patterns.setdefault(field, {})[key] = spec
+                self._registered[key] = field
+                self._sets.pop(field, None)
+
+        return key
+
+    def unregister(self, key: int) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def is_registered(self, key: int) -> bool:
+        return key in self._registered
+
+    def matches(self, key: int, event: Any) -> bool:
+        """Whether the registered pattern with a key is found in an event's field"""
+
+        field = self._registered.get(key)
+        return field is not None and key in self.scan(event, field)
+
+    def scan(self, event: Any, field: str) -> FrozenSet[int]:
+        """The keys of every pattern for a field which is found in an event"""
+
+        patterns = self._sets.get(field)
+
+        if patterns is None:
+            with self._lock:
+                patterns = self._sets.get(field)
+                if patterns is None:
+                    patterns = PatternSet(self._patterns.get(field, {}))
+                    self._sets[field] = patterns
+
+        last = self._last.get(field)
+
+        if last is not None and last[0] is event and last[1] is patterns:
+            return last[2]
+
+        found = patterns.scan(getattr(event, field, None))
+        self._last[field] = (event, patterns, found)
+
+        return found
+
+    def matching(self, event: Any) -> Set[int]:
+        """The keys of every registered pattern found in an event"""
+
+        found: Set[int] = set()
+
+        for field in list(self._patterns):
+            found.update(self.scan(event, field))
+
+        return found
+
+    def _discard(self, key: int) -> None:
+        field = self._registered.pop(key, None)
+
+        if field is not None:
+            self._patterns[field].pop(key, None)
+            self._sets.pop(field, None)
+
+
+# The engine shared by all regex triggers
+ENGINE = PatternEngine()
+
+
+__all__ = [
+    "PatternEngine",
+    "PatternSet",
+    "ENGINE",
+    "compile_pattern",
+    "required_literal",
+    "new_key",
+]
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+"""Ordering a behaviour's triggers and conditions by what they cost.
+
+A behaviour acts on an event if any of its triggers match it, and all of its
+conditions allow it, so only as many need checking as it takes to find the
+answer. A PredicatePlan is built when the behaviour's components are added,
+and keeps statistics on each check: how often it passes, and (sampled) how
+long it takes. Every so many events the plan is reordered, so that the checks
+most likely to settle the answer for the least time come first:
+
+ - triggers by their time over the rate at which they match
+ - conditions by their time over the rate at which they reject
+
+Checks which have not been timed yet are tried first, so they can be. The
+order only changes which checks run, not the result, so triggers and
+conditions should not rely on being run in the order they were added.
+"""
+
+from __future__ import annotations
+
+from typing import Any, List, Optional, Sequence
+
+import functools
+import time
+
+from mewbot.memo import evaluate, evaluate_async
+
+# How often each check is timed, as timing every call would cost more than many checks
+SAMPLE_EVERY = 16
+
+# The events between reordering the checks
+REPLAN_EVERY = 256
+
+# The smallest rate a check's time is divided by, so checks which never pass
+# (or never fail) are ordered by their time rather than all last
+MIN_RATE = 0.01
+
+
+class Predicate:
+    """One trigger or condition in a plan, with its statistics"""
+
+    __slots__ = ("component", "method", "calls", "passed", "timed", "seconds")
+
+    component: Any
+    method: str  # The check's name, looked up on each call as it may be profiled
+
+    calls: int
+    passed: int
+    timed: int  # Calls which were timed
+    seconds: float  # Time taken by the timed calls
+
+    def __init__(self, component: Any, method: str) -> None:
+        self.component = component
+        self.method = method
+
+        self.calls = 0
+        self.passed = 0
+        self.timed = 0
+        self.seconds = 0.0
+
+    def __call__(self, event: Any) -> bool:
+        check = getattr(self.component, self.method)
+
+        if self.calls % SAMPLE_EVERY:
+            result = evaluate(self.component, check, event)
+            self.record(result)
+        else:
+            started = time.perf_counter()
+            result = evaluate(self.component, check, event)
+            self.record(result, time.perf_counter() - started)
+
+        return result
+
+    async def offload(self, event: Any) -> bool:
+        """Calls the check according to the component's execution setting"""
+
+        check = functools.partial(
+            self.component.offload, getattr(self.component, self.method)
+        )
+
+        started = time.perf_counter()
+        result = await evaluate_async(self.component, check, event)
+
+        self.record(result, time.perf_counter() - started)
+        return result
+
+    def record(self, result: bool, seconds: Optional[float] = None) -> None:
+        """Counts the result of a call, and the time it took if it was timed"""
+
+        self.calls += 1
+        if result:
+            self.passed += 1
+
+        if seconds is not None:
+            self.timed += 1
+            self.seconds += seconds
+
+    @property
+    def cost(self) -> float:
+        """The mean seconds taken by each call, or zero if it has not been timed"""
+        return self.seconds / self.timed if self.timed else 0.0
+
+    @property
+    def pass_rate(self) -> float:
+        return self.passed / self.calls if self.calls else 0.5
+
+
+class PredicatePlan:
+    """The order to check a behaviour's triggers and conditions in"""
+
+    triggers: List[Predicate]
+    conditions: List[Predicate]
+
+    events: int  # Events checked since the plan was last reordered
+
+    def __init__(self, triggers: Sequence[Any], conditions: Sequence[Any]) -> None:
+        self.triggers = [Predicate(trigger, "matches") for trigger in triggers]
+        self.conditions = [Predicate(condition, "allows") for condition in conditions]
+        self.events = 0
+
+    def matches(self, event: Any) -> bool:
+        """Whether any of the triggers match an event"""
+
+        self.checking()
+
+        for trigger in self.triggers:
+            if trigger(event):
+                return True
+
+        return False
+
+    def allows(self, event: Any) -> bool:
+        """Whether all the conditions allow an event"""
+
+        for condition in self.conditions:
+            if not condition(event):
+                return False
+
+        return True
+
+    async def matches_offloaded(self, event: Any) -> bool:
+        """As matches, for triggers some of which run off the event loop"""
+
+        self.checking()
+
+        for trigger in self.triggers:
+            if await trigger.offload(event):
+                return True
+
+        return False
+
+    async def allows_offloaded(self, event: Any) -> bool:
+        """As allows, for conditions some of which run off the event loop"""
+
+        for condition in self.conditions:
+            if not await condition.offload(event):
+                return False
+
+        return True
+
+    def checking(self) -> None:
+        """Counts an event being checked, reordering the checks when they are due"""
+
+        self.events += 1
+        if self.events >= REPLAN_EVERY:
+            self.replan()
+
+    def replan(self) -> None:
+        """Reorders the checks by their statistics so far"""
+
+        self.events = 0
+
+        # Sorting is stable, so checks with the same statistics keep their order
+        self.triggers = sorted(
+            self.triggers, key=lambda check: check.cost / max(check.pass_rate, MIN_RATE)
+        )
+        self.conditions = sorted(
+            self.conditions,
+            key=lambda check: check.cost / max(1 - check.pass_rate, MIN_RATE),
+        )
+
+
+__all__ = ["Predicate", "PredicatePlan"]
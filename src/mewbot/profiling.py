@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""On-demand profiling of the components of a running bot.
+
+A Profiler wraps the methods which do a component's work (Behaviour.process,
+Trigger.matches, Condition.allows, Action.act, and Output.output) with timers
+for a fixed window, then removes them again, so it costs nothing outside of
+that window. The report groups the timings by each component's uuid and
+implementation class, so they can be matched to the YAML configuration.
+
+Times are inclusive: a behaviour's time includes that of its triggers,
+conditions and actions. Components run in the process pool (with
+`execution: process`) are not wrapped, as they are pickled to be run, and
+would be timed in the other process; their time is included in their
+behaviour's.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import asyncio
+import dataclasses
+import functools
+import time
+
+from mewbot.execution import Execution
+
+# The methods of each kind of component which are timed
+PROFILED_METHODS = ("process", "matches", "allows", "act", "output")
+
+
+@dataclasses.dataclass
+class ComponentProfile:
+    """Timings of calls to one method of one component"""
+
+    implementation: str
+    uuid: str
+    method: str
+    calls: int = 0
+    total: float = 0.0
+    longest: float = 0.0
+
+    def record(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total += elapsed
+        self.longest = max(self.longest, elapsed)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+@dataclasses.dataclass
+class ProfileReport:
+    window: float  # How long the profiler ran for, in seconds
+    profiles: List[ComponentProfile]
+
+    def format(self) -> str:
+        """A table of the profiled methods, which took the most time first"""
+
+        lines = [
+            f"Profile of {self.window:.1f}s",
+            f"{'total (s)':>10} {'calls':>8} {'mean (ms)':>10} {'max (ms)':>10}  component",
+        ]
+
+        for profile in sorted(self.profiles, key=lambda p: p.total, reverse=True):
+            lines.append(
+                f"{profile.total:10.4f} {profile.calls:8d} "
+                f"{profile.mean * 1000:10.3f} {profile.longest * 1000:10.3f}  "
+                f"{profile.implementation}.{profile.method} [{profile.uuid}]"
+            )
+
+        return "\n".join(lines)
+
+
+class Profiler:
+    """Times the work done by a set of components while it is running"""
+
+    components: List[Any]
+
+    _profiles: Dict[Tuple[int, str], ComponentProfile]
+    _wrapped: List[Tuple[Any, str]]
+    _started: Optional[float]
+
+    def __init__(self, components: Iterable[Any]) -> None:
+        self.components = list(components)
+        self._profiles = {}
+        self._wrapped = []
+        self._started = None
+
+    @property
+    def active(self) -> bool:
+        return self._started is not None
+
+    def start(self) -> None:
+        if self.active:
+            raise RuntimeError("Profiler is already running")
+
+        self._profiles = {}
+        self._started = time.monotonic()
+
+        for component in self.components:
+            if getattr(component, "execution", None) == Execution.PROCESS.value:
+                continue
+
+            own = getattr(component, "__dict__", {})
+
+            for method in PROFILED_METHODS:
+                # Methods which are already instance attributes are left alone,
+                # as they could not be restored afterwards
+                if method not in own and callable(getattr(component, method, None)):
+                    self._wrap(component, method)
+
+    def stop(self) -> ProfileReport:
+        if self._started is None:
+            raise RuntimeError("Profiler is not running")
+
+        # The wrappers are instance attributes, hiding the class's methods
+        for component, method in self._wrapped:
+            delattr(component, method)
+
+        self._wrapped = []
+
+        window = time.monotonic() - self._started
+        self._started = None
+
+        return ProfileReport(window, list(self._profiles.values()))
+
+    async def profile(self, window: float) -> ProfileReport:
+        """Runs the profiler for a number of seconds"""
+
+        self.start()
+        try:
+            await asyncio.sleep(window)
+        finally:
+            report = self.stop()
+
+        return report
+
+    def _wrap(self, component: Any, method: str) -> None:
+        target: Callable[..., Any] = getattr(component, method)
+        cls = type(component)
+
+        self._wrapped.append((component, method))
+        profile = self._profiles[(id(component), method)] = ComponentProfile(
+            implementation=cls.__module__ + "." + cls.__qualname__,
+            uuid=getattr(component, "uuid", None) or f"id:{id(component):x}",
+            method=method,
+        )
+
+        if asyncio.iscoroutinefunction(target):
+
+            @functools.wraps(target)
+            async def timed_coroutine(*args: Any, **kwargs: Any) -> Any:
+                started = time.perf_counter()
+                try:
+                    return await target(*args, **kwargs)
+                finally:
+                    profile.record(time.perf_counter() - started)
+
+            setattr(component, method, timed_coroutine)
+            return
+
+        @functools.wraps(target)
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return target(*args, **kwargs)
+            finally:
+                profile.record(time.perf_counter() - started)
+
+        setattr(component, method, timed)
+
+
+def behaviour_components(behaviour: Any) -> List[Any]:
+    """A behaviour along with its triggers, conditions and actions"""
+
+    return [
+        behaviour,
+        *getattr(behaviour, "triggers", ()),
+        *getattr(behaviour, "conditions", ()),
+        *getattr(behaviour, "actions", ()),
+    ]
+
+
+__all__ = ["ComponentProfile", "ProfileReport", "Profiler", "PROFILED_METHODS"]
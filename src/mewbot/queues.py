@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+"""Event queue implementations which can stand in for InputQueue and OutputQueue"""
+
+from __future__ import annotations
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+import asyncio
+import enum
+import heapq
+import itertools
+import logging
+
+EventType = TypeVar("EventType")  # pylint: disable=invalid-name
+
+
+class OverflowPolicy(str, enum.Enum):
+    """What a BoundedQueue does with a new event when it is full"""
+
+    BLOCK = "block"  # Wait for space (put_nowait raises QueueFull)
+    DROP_NEWEST = "drop_newest"  # Discard the new event
+    DROP_OLDEST = "drop_oldest"  # Discard the event at the front of the queue
+    SHED = "shed"  # Discard an event of one of the shed types, otherwise block
+
+
+class BoundedQueue(asyncio.Queue[EventType]):
+    """An asyncio Queue with a choice of behaviour when it is full.
+
+    Every event dropped because of the overflow policy is counted, both in
+    total and by event class, so that overloads can be monitored.
+    """
+
+    policy: OverflowPolicy
+    shed_types: Tuple[Type[Any], ...]
+
+    dropped: int
+    dropped_by_type: Dict[Type[Any], int]
+    on_drop: Optional[Callable[[EventType], None]]  # Called with each dropped event
+
+    _logger: logging.Logger
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        policy: Union[OverflowPolicy, str] = OverflowPolicy.BLOCK,
+        shed: Collection[Type[Any]] = (),
+    ) -> None:
+        """
+        :param maxsize: The number of events the queue can hold, or 0 for unbounded
+        :param policy: The OverflowPolicy (or its value) to apply when the queue is full
+        :param shed: The event classes which may be discarded with the SHED policy
+        """
+
+        super().__init__(maxsize)
+
+        self.policy = OverflowPolicy(policy)
+        self.shed_types = tuple(shed)
+
+        if self.policy == OverflowPolicy.SHED and not self.shed_types:
+            raise ValueError("The shed overflow policy needs at least one event type to shed")
+
+        self.dropped = 0
+        self.dropped_by_type = {}
+        self.on_drop = None
+
+        self._logger = logging.getLogger(__name__ + "BoundedQueue")
+
+    async def put(self, item: EventType) -> None:
+        if self.full() and self._make_room(item) is not None:
+            return
+
+        await super().put(item)
+
+    def put_nowait(self, item: EventType) -> None:
+        if self.full() and self._make_room(item) is not None:
+            return
+
+        super().put_nowait(item)
+
+    def _make_room(self, item: EventType) -> Optional[EventType]:
+        """Applies the overflow policy to a full queue before adding an item.
+
+        Returns the new item if it was the one dropped, or None if there may now
+        be room for it (either because another event was dropped, or the policy
+        is to wait)."""
+
+        if self.policy == OverflowPolicy.DROP_NEWEST:
+            self._record_drop(item)
+            return item
+
+        if self.policy == OverflowPolicy.DROP_OLDEST:
+            self._record_drop(self._evict(lambda _: True))
+            return None
+
+        if self.policy == OverflowPolicy.SHED:
+            if isinstance(item, self.shed_types):
+                self._record_drop(item)
+                return item
+
+            self._record_drop(self._evict(self._sheddable))
+
+        return None
+
+    def _sheddable(self, item: EventType) -> bool:
+        return isinstance(item, self.shed_types)
+
+    def _evict(self, predicate: Callable[[EventType], bool]) -> Optional[EventType]:
+        """Removes and returns the first queued item matching the predicate"""
+
+        queue = self._queue  # type: ignore  # pylint: disable=no-member
+
+        for index, item in enumerate(queue):
+            if predicate(item):
+                del queue[index]
+                # The dropped item will never be returned by get(), so balance
+                # the counter used by join().
+                self.task_done()
+                return item  # type: ignore
+
+        return None
+
+    def _record_drop(self, item: Optional[EventType]) -> None:
+        if item is None:
+            return
+
+        self.dropped += 1
+        self.dropped_by_type[type(item)] = self.dropped_by_type.get(type(item), 0) + 1
+
+        self._logger.debug("Queue full; dropped %s (%d dropped so far)", item, self.dropped)
+
+        on_drop = self.on_drop
+        if on_drop is not None:
+            on_drop(item)
+
+
+class PriorityEventQueue(BoundedQueue[EventType]):
+    """A BoundedQueue which returns the most urgent event first.
+
+    Each event's priority comes from, in order of preference:
+      - the priority configured for its class (or the nearest parent class),
+      - the priority of the producer it was put through (see producer()),
+      - zero.
+    Higher numbers are more urgent. Events of the same priority are returned
+    in the order they were added, and adding or taking an event is O(log n).
+
+    When the overflow policy needs to discard a queued event, the oldest of
+    the least urgent candidates is chosen.
+    """
+
+    priorities: Dict[Type[Any], int]
+
+    _queue: List[Tuple[int, int, EventType]]
+    _resolved: Dict[Type[Any], Optional[int]]
+    _pending: Dict[int, int]
+    _sequence: Iterator[int]
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        policy: Union[OverflowPolicy, str] = OverflowPolicy.BLOCK,
+        shed: Collection[Type[Any]] = (),
+        priorities: Optional[Mapping[Type[Any], int]] = None,
+    ) -> None:
+        """
+        :param priorities: Mapping of event class to the priority of those events
+        """
+
+        super().__init__(maxsize, policy, shed)
+
+        self.priorities = dict(priorities or {})
+
+        self._resolved = {}
+        self._pending = {}
+        self._sequence = itertools.count()
+
+    def priority_of(self, event: EventType, default: int = 0) -> int:
+        """Gets the priority configured for an event's class, or the default"""
+
+        event_type = type(event)
+
+        try:
+            priority = self._resolved[event_type]
+        except KeyError:
+            priority = next(
+                (
+                    self.priorities[base]
+                    for base in event_type.__mro__
+                    if base in self.priorities
+                ),
+                None,
+            )
+            self._resolved[event_type] = priority
+
+        return default if priority is None else priority
+
+    def producer(self, priority: int) -> PriorityProducer[EventType]:
+        """Creates a handle for putting events onto this queue with a default priority"""
+        return PriorityProducer(self, priority)
+
+    async def put_with_priority(self, item: EventType, priority: int) -> None:
+        # asyncio.Queue.put hands the item to _put (possibly after waiting),
+        # so the producer's priority is passed alongside it by identity.
+        self._pending[id(item)] = priority
+        try:
+            await self.put(item)
+        finally:
+            self._pending.pop(id(item), None)
+
+    def put_nowait_with_priority(self, item: EventType, priority: int) -> None:
+        self._pending[id(item)] = priority
+        try:
+            self.put_nowait(item)
+        finally:
+            self._pending.pop(id(item), None)
+
+    def _init(self, maxsize: int) -> None:  # pylint: disable=unused-argument
+        self._queue = []
+
+    def _put(self, item: EventType) -> None:
+        priority = self.priority_of(item, self._pending.get(id(item), 0))
+        heapq.heappush(self._queue, (-priority, next(self._sequence), item))
+
+    def _get(self) -> EventType:
+        return heapq.heappop(self._queue)[2]
+
+    def _evict(self, predicate: Callable[[EventType], bool]) -> Optional[EventType]:
+        candidates = [
+            (entry[0], -entry[1], index)
+            for index, entry in enumerate(self._queue)
+            if predicate(entry[2])
+        ]
+
+        if not candidates:
+            return None
+
+        _, _, index = max(candidates)
+        _, _, item = self._queue[index]
+
+        self._queue[index] = self._queue[-1]
+        self._queue.pop()
+        heapq.heapify(self._queue)
+
+        self.task_done()
+        return item
+
+
+class PriorityProducer(Generic[EventType]):
+    """Handle on a PriorityEventQueue for a producer with a default priority.
+
+    This offers the put methods of a queue, so it can be bound to an Input in
+    place of the queue itself."""
+
+    queue: PriorityEventQueue[EventType]
+    priority: int
+
+    def __init__(self, queue: PriorityEventQueue[EventType], priority: int) -> None:
+        self.queue = queue
+        self.priority = priority
+
+    async def put(self, item: EventType) -> None:
+        await self.queue.put_with_priority(item, self.priority)
+
+    def put_nowait(self, item: EventType) -> None:
+        self.queue.put_nowait_with_priority(item, self.priority)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.queue, name)
+
+
+def create_queue(
+    maxsize: int = 0,
+    policy: Union[OverflowPolicy, str] = OverflowPolicy.BLOCK,
+    shed: Collection[Type[Any]] = (),
+    priorities: Optional[Mapping[Type[Any], int]] = None,
+) -> BoundedQueue[Any]:
+    """Creates an event queue from its configuration
+
+    If any priorities are given (even an empty mapping), a PriorityEventQueue
+    is created; otherwise a first-in first-out BoundedQueue is used."""
+
+    if priorities is not None:
+        return PriorityEventQueue(maxsize, policy, shed, priorities)
+
+    return BoundedQueue(maxsize, policy, shed)
+
+
+__all__ = [
+    "OverflowPolicy",
+    "BoundedQueue",
+    "PriorityEventQueue",
+    "PriorityProducer",
+    "create_queue",
+]
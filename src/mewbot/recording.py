@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+"""Recording of the input events a bot receives, so that they can be replayed.
+
+Recordings are append-only files: a short header, followed by one record per
+event. Each record is the wall-clock time the event was queued and the
+length of the event's pickled data, followed by that data. Each record is
+flushed as it is written, so a bot which crashes loses at most the last one.
+
+Events which hold live connections (e.g. to Discord) can't be pickled as
+they are. An event can define a for_recording method, which returns an
+equivalent event without them (e.g. with a snapshot of the message it is
+for) to be recorded in its place.
+See mewbot.io.replay.ReplayIO for feeding a recording back into a bot.
+"""
+
+from __future__ import annotations
+
+from typing import Any, BinaryIO, Iterator, Optional, Set, Tuple, Type
+
+import asyncio
+import logging
+import pickle
+import struct
+import time
+
+from mewbot.core import InputEvent
+
+MAGIC = b"MEWREC1\n"
+RECORD_HEADER = struct.Struct("<dI")  # Timestamp, and length of the event data
+
+
+class EventRecorder:
+    """Appends input events to a recording file"""
+
+    path: str
+    recorded: int  # Events written to the recording
+    skipped: int  # Events which could not be recorded
+
+    _file: BinaryIO
+    _unpicklable: Set[Type[Any]]
+    _logger: logging.Logger
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.recorded = 0
+        self.skipped = 0
+
+        self._file = open(path, "ab")  # pylint: disable=consider-using-with
+        self._unpicklable = set()
+        self._logger = logging.getLogger(__name__ + "EventRecorder")
+
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def record(self, event: Any) -> None:
+        for_recording = getattr(event, "for_recording", None)
+        if for_recording is not None:
+            event = for_recording()
+
+        data = dump_event(event, self._unpicklable, self._logger)
+
+        if data is None:
+            self.skipped += 1
+            return
+
+        self._file.write(RECORD_HEADER.pack(time.time(), len(data)) + data)
+        self._file.flush()
+        self.recorded += 1
+
+    def producer(self, queue: asyncio.Queue[InputEvent]) -> RecordingProducer:
+        """Wraps the queue an input is bound to, so that its events are recorded"""
+        return RecordingProducer(queue, self)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class RecordingProducer:
+    """Handle on an input queue which records each event put on it.
+
+    This offers the put methods of a queue, so it can be bound to an Input in
+    place of the queue itself."""
+
+    queue: asyncio.Queue[InputEvent]
+    recorder: EventRecorder
+
+    def __init__(self, queue: asyncio.Queue[InputEvent], recorder: EventRecorder) -> None:
+        self.queue = queue
+        self.recorder = recorder
+
+    async def put(self, item: InputEvent) -> None:
+        self.recorder.record(item)
+        await self.queue.put(item)
+
+    def put_nowait(self, item: InputEvent) -> None:
+        self.recorder.record(item)
+        self.queue.put_nowait(item)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.queue, name)
+
+
+def dump_event(
+    event: Any, unpicklable: Set[Type[Any]], logger: logging.Logger
+) -> Optional[bytes]:
+    """Pickles an event, or returns None if it can't be.
+
+    Events holding live connections (e.g. to Discord) can not be pickled.
+    A warning is logged the first time each class of event fails, after
+    which it is added to the unpicklable set."""
+
+    try:
+        return pickle.dumps(event, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:  # pylint: disable=broad-except
+        if type(event) not in unpicklable:
+            unpicklable.add(type(event))
+            logger.warning("Unable to pickle events of type %s", type(event))
+        return None
+
+
+def read_recording(path: str) -> Iterator[Tuple[float, Any]]:
+    """Reads the timestamp and event (or dead letter) of each record in a recording file.
+
+    A truncated final record (e.g. from a bot which was killed while
+    recording) is ignored."""
+
+    with open(path, "rb") as recording:
+        if recording.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an event recording")
+
+        while True:
+            header = recording.read(RECORD_HEADER.size)
+
+            if len(header) < RECORD_HEADER.size:
+                return
+
+            timestamp, length = RECORD_HEADER.unpack(header)
+            data = recording.read(length)
+
+            if len(data) < length:
+                return
+
+            yield timestamp, pickle.loads(data)
+
+
+__all__ = ["EventRecorder", "RecordingProducer", "dump_event", "read_recording"]
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+"""Retrying the output events which an Output failed to send.
+
+An output fails to send an event when output() returns False or raises an
+exception (including a ComponentFailure from its guard). A RetryQueue takes
+each failed event off the output's hands: it waits for an exponential backoff
+(with random jitter, so that a burst of failures does not retry in lockstep)
+on a timer, then puts the event back in the output's lane. The lane carries on
+delivering fresh events in the meantime.
+
+Events which have failed max_attempts times are passed to the dead letter
+sinks instead, along with the last error, so they are not lost silently. So
+are events which are due to be retried when their lane is full.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Mapping, Optional, Protocol, Sequence, Tuple
+
+import asyncio
+import dataclasses
+import logging
+import random
+
+from mewbot.core import OutputEvent
+from mewbot.recording import EventRecorder
+
+Entry = Tuple[float, OutputEvent]  # The time an event was queued, and the event
+
+
+class RetryPolicy:
+    """How many times, and how often, to try sending an event"""
+
+    max_attempts: int  # Attempts to send each event, including the first
+    base_delay: float  # Seconds to wait before the first retry
+    max_delay: float  # The longest to wait before any retry
+    jitter: float  # Fraction of each delay which is random, from 0 to 1
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        jitter: float = 0.5,
+    ) -> None:
+        if max_attempts < 1:
+            raise ValueError(
+                f"RetryPolicy max_attempts must be at least one, got {max_attempts}"
+            )
+
+        if base_delay <= 0 or max_delay < base_delay:
+            raise ValueError(
+                f"RetryPolicy delays must be positive, and base_delay ({base_delay}) "
+                f"no more than max_delay ({max_delay})"
+            )
+
+        if not 0 <= jitter <= 1:
+            raise ValueError(f"RetryPolicy jitter must be between 0 and 1, got {jitter}")
+
+        self.max_attempts = int(max_attempts)
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.jitter = float(jitter)
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> RetryPolicy:
+        """Creates a policy from a `retry` configuration block"""
+
+        unknown = set(config).difference(
+            {"max_attempts", "base_delay", "max_delay", "jitter"}
+        )
+        if unknown:
+            raise ValueError(f"Unknown retry options {unknown}")
+
+        return cls(**config)
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retrying an event which has failed this many times"""
+
+        backoff = min(self.max_delay, self.base_delay * 2.0 ** (attempt - 1))
+        return backoff * (1 - self.jitter * random.random())
+
+
+@dataclasses.dataclass
+class DeadLetter:
+    """An event which an output could not send"""
+
+    event: OutputEvent
+    output: str  # The output which failed to send it
+    attempts: int  # The number of times it was tried
+    error: Optional[str]  # The last error, if the output raised one
+
+
+class DeadLetterSink(Protocol):
+    def dead_letter(self, letter: DeadLetter) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class LoggingDeadLetters:
+    """Logs each dead letter as an error"""
+
+    def __init__(self) -> None:
+        self._logger = logging.getLogger(__name__ + "LoggingDeadLetters")
+
+    def dead_letter(self, letter: DeadLetter) -> None:
+        self._logger.error(
+            "%s failed to send %s after %d attempts: %s",
+            letter.output,
+            letter.event,
+            letter.attempts,
+            letter.error,
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class DeadLetterFile(EventRecorder):
+    """Appends each dead letter to a file.
+
+    The file uses the recording format, so the letters can be read back with
+    mewbot.recording.read_recording. Letters whose event can't be pickled
+    (e.g. as it holds a live connection) are skipped, with a warning."""
+
+    def dead_letter(self, letter: DeadLetter) -> None:
+        self.record(letter)
+
+
+class RetryQueue:  # pylint: disable=too-many-instance-attributes
+    """Holds the events an output failed to send until they are due to be retried"""
+
+    policy: RetryPolicy
+    requeue: Callable[[Entry], bool]  # Puts an event back in the output's lane
+    dead_letters: Sequence[DeadLetterSink]
+    name: str  # The output's name, for dead letters
+
+    retried: int  # Events put back in the lane to be retried
+    dead: int  # Events given up on
+
+    _attempts: Dict[int, int]  # Failed attempts to send each event, by event id
+    _timers: Dict[int, Tuple[asyncio.TimerHandle, Entry]]  # Events waiting to be retried
+    _logger: logging.Logger
+
+    def __init__(
+        self,
+        policy: RetryPolicy,
+        requeue: Callable[[Entry], bool],
+        dead_letters: Sequence[DeadLetterSink] = (),
+        name: str = "output",
+    ) -> None:
+        """
+        :param policy: How many times, and how often, to try sending each event
+        :param requeue: Function putting an event back in the lane, returning whether it fit
+        :param dead_letters: Sinks for the events given up on. By default these are logged.
+        :param name: The name of the output, for dead letters
+        """
+
+        self.policy = policy
+        self.requeue = requeue
+        self.dead_letters = dead_letters or (LoggingDeadLetters(),)
+        self.name = name
+
+        self.retried = 0
+        self.dead = 0
+
+        self._attempts = {}
+        self._timers = {}
+        self._logger = logging.getLogger(__name__ + "RetryQueue")
+
+    @property
+    def pending(self) -> int:
+        """The number of events waiting to be retried"""
+        return len(self._timers)
+
+    def succeeded(self, entry: Entry) -> None:
+        self._attempts.pop(id(entry[1]), None)
+
+    def failed(self, entry: Entry, error: Optional[BaseException] = None) -> None:
+        """Schedules a retry of an event which failed to send, or gives up on it"""
+
+        key = id(entry[1])
+        attempts = self._attempts.pop(key, 0) + 1
+
+        if attempts >= self.policy.max_attempts:
+            self._give_up(entry, attempts, error)
+            return
+
+        self._attempts[key] = attempts
+        timer = asyncio.get_running_loop().call_later(
+            self.policy.delay(attempts), self._retry, key
+        )
+        self._timers[key] = (timer, entry)
+
+    def flush(self) -> None:
+        """Puts every waiting event back in the lane now, without waiting for its backoff"""
+
+        for key in list(self._timers):
+            self._retry(key)
+
+    def abandon(self) -> None:
+        """Gives up on every event waiting to be retried (e.g. when the bot stops)"""
+
+        for key, (timer, entry) in list(self._timers.items()):
+            timer.cancel()
+            del self._timers[key]
+            self._give_up(entry, self._attempts.pop(key, 0), None)
+
+    def _retry(self, key: int) -> None:
+        timer, entry = self._timers.pop(key)
+        timer.cancel()
+
+        if self.requeue(entry):
+            self.retried += 1
+        else:
+            # The lane was full, and has dropped the event
+            self._give_up(entry, self._attempts.pop(key, 0), None)
+
+    def _give_up(self, entry: Entry, attempts: int, error: Optional[BaseException]) -> None:
+        self.dead += 1
+        letter = DeadLetter(
+            entry[1], self.name, attempts, None if error is None else repr(error)
+        )
+
+        for sink in self.dead_letters:
+            try:
+                sink.dead_letter(letter)
+            except Exception:  # pylint: disable=broad-except
+                self._logger.exception("Dead letter sink %s failed", sink)
+
+
+__all__ = [
+    "RetryPolicy",
+    "RetryQueue",
+    "DeadLetter",
+    "DeadLetterSink",
+    "LoggingDeadLetters",
+    "DeadLetterFile",
+]
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+
+"""Rate-limited scheduling of the events waiting to be sent by an Output.
+
+Services limit how fast a bot may send to each destination (e.g. a Discord
+channel, or a webhook URL), and often overall. An OutputScheduler stands in
+for the queue of an output's lane: it keeps a backlog of events for each
+destination, and hands them out as token buckets for each destination (and
+optionally a global bucket for the output) allow, going round-robin between
+the destinations which have events waiting so a busy one can't starve the
+rest. Events wait in the scheduler, rather than the output blocking on the
+service's rate limit while holding up everything else.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Generic,
+    Hashable,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+import asyncio
+import collections
+import time
+
+ItemType = TypeVar("ItemType")  # pylint: disable=invalid-name
+
+
+class TokenBucket:
+    """Allows a steady rate of operations, with bursts of up to a number at once"""
+
+    rate: float  # Tokens added per second
+    burst: float  # The most tokens which can be saved up
+
+    tokens: float
+    updated: float
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError(f"TokenBucket rate must be positive, got {rate}")
+
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(self.rate, 1.0)
+
+        if self.burst < 1:
+            raise ValueError(f"TokenBucket burst must be at least one, got {burst}")
+
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token will be available, or 0 if there is one now"""
+
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    @property
+    def full(self) -> bool:
+        return self.tokens >= self.burst
+
+
+class OutputScheduler(Generic[ItemType]):  # pylint: disable=too-many-instance-attributes
+    """A queue which releases items as the rate limits of their destinations allow.
+
+    This offers the methods of an asyncio Queue used by an OutputLane."""
+
+    destination: Callable[[ItemType], Hashable]  # Gets the destination of an item
+    maxsize: int  # The most items which can be waiting, or 0 for no limit
+    rate: float  # Items per second which may be sent to each destination
+    burst: Optional[float]  # Items which may be sent to a destination at once
+    global_bucket: Optional[TokenBucket]  # Limits the items sent to all destinations
+
+    _backlogs: Dict[Hashable, Deque[ItemType]]
+    _ready: Deque[Hashable]  # Destinations with a backlog, in round-robin order
+    _buckets: Dict[Hashable, TokenBucket]
+    _size: int
+    _arrived: asyncio.Event
+
+    # Idle destinations' buckets are forgotten once there are more than this
+    PRUNE_THRESHOLD = 1024
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        destination: Callable[[ItemType], Hashable],
+        maxsize: int = 0,
+        rate: float = 1.0,
+        burst: Optional[float] = None,
+        global_rate: Optional[float] = None,
+        global_burst: Optional[float] = None,
+    ) -> None:
+        """
+        :param destination: Function giving the destination an item will be sent to
+        :param maxsize: The most items which can be waiting, or 0 for no limit
+        :param rate: The items per second which may be sent to each destination
+        :param burst: The items which may be sent to a destination in a burst
+        :param global_rate: If set, the items per second which may be sent overall
+        :param global_burst: The items which may be sent overall in a burst
+        """
+
+        # Checks the rate and burst, as every destination's bucket will use them
+        TokenBucket(rate, burst)
+
+        self.destination = destination
+        self.maxsize = maxsize
+        self.rate = rate
+        self.burst = burst
+        self.global_bucket = TokenBucket(global_rate, global_burst) if global_rate else None
+
+        self._backlogs = {}
+        self._ready = collections.deque()
+        self._buckets = {}
+        self._size = 0
+        self._arrived = asyncio.Event()
+
+    @classmethod
+    def from_config(
+        cls,
+        destination: Callable[[ItemType], Hashable],
+        maxsize: int,
+        config: Mapping[str, Any],
+    ) -> OutputScheduler[ItemType]:
+        """Creates a scheduler from a `rate_limit` configuration block.
+
+        The block may set rate, burst, global_rate, and global_burst."""
+
+        unknown = set(config).difference({"rate", "burst", "global_rate", "global_burst"})
+        if unknown:
+            raise ValueError(f"Unknown rate limit options {unknown}")
+
+        return cls(destination, maxsize, **config)
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return not self._size
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self._size
+
+    def backlog(self) -> Dict[Hashable, int]:
+        """The number of items waiting for each destination"""
+        return {destination: len(items) for destination, items in self._backlogs.items()}
+
+    def put_nowait(self, item: ItemType) -> None:
+        if self.full():
+            raise asyncio.QueueFull()
+
+        destination = self.destination(item)
+        backlog = self._backlogs.get(destination)
+
+        if backlog is None:
+            backlog = self._backlogs[destination] = collections.deque()
+            self._ready.append(destination)
+
+        backlog.append(item)
+        self._size += 1
+        self._arrived.set()
+
+    async def get(self) -> ItemType:
+        """Waits until an item can be sent, and returns it"""
+
+        while True:
+            found, item, wait = self._next(time.monotonic())
+
+            if found:
+                return item  # type: ignore
+
+            self._arrived.clear()
+
+            try:
+                await asyncio.wait_for(self._arrived.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_nowait(self) -> ItemType:
+        """Gets an item which can be sent now, raising QueueEmpty if there is none"""
+
+        found, item, _ = self._next(time.monotonic())
+
+        if not found:
+            raise asyncio.QueueEmpty()
+
+        return item  # type: ignore
+
+    def _next(self, now: float) -> Tuple[bool, Optional[ItemType], Optional[float]]:
+        """Takes the next item which can be sent, if there is one.
+
+        Returns whether an item was found, the item, and otherwise how long until
+        one might be (None if nothing is waiting)."""
+
+        if not self._ready:
+            return False, None, None
+
+        if self.global_bucket:
+            wait = self.global_bucket.wait_time(now)
+            if wait > 0:
+                return False, None, wait
+
+        shortest: Optional[float] = None
+
+        for _ in range(len(self._ready)):
+            destination = self._ready[0]
+            bucket = self._bucket(destination)
+            wait = bucket.wait_time(now)
+
+            if wait > 0:
+                # Try the next destination, leaving this one to its turn
+                self._ready.rotate(-1)
+                shortest = wait if shortest is None else min(shortest, wait)
+                continue
+
+            bucket.consume()
+            if self.global_bucket:
+                self.global_bucket.consume()
+
+            backlog = self._backlogs[destination]
+            item = backlog.popleft()
+            self._size -= 1
+
+            # Move this destination to the back of the round, or out of it
+            self._ready.popleft()
+            if backlog:
+                self._ready.append(destination)
+            else:
+                del self._backlogs[destination]
+
+            return True, item, None
+
+        return False, None, shortest
+
+    def _bucket(self, destination: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(destination)
+
+        if bucket is None:
+            if len(self._buckets) >= self.PRUNE_THRESHOLD:
+                self._prune()
+
+            bucket = self._buckets[destination] = TokenBucket(self.rate, self.burst)
+
+        return bucket
+
+    def _prune(self) -> None:
+        """Forgets the buckets of idle destinations, which are as good as new"""
+
+        now = time.monotonic()
+
+        for destination, bucket in list(self._buckets.items()):
+            if destination not in self._backlogs:
+                bucket.wait_time(now)
+                if bucket.full:
+                    del self._buckets[destination]
+
+
+__all__ = ["TokenBucket", "OutputScheduler"]
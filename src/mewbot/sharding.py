@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+
+"""
+Runs a bot's behaviours across several worker processes.
+
+The parent process keeps the inputs and outputs. Each worker process loads a
+shard of the behaviours from their serialised configuration, and runs them in
+its own BotRunner. Events cross the process boundary through a pipe per
+direction, encoded with the event codec below; every event (and every event
+an Action sends) must therefore be picklable. Classes of input event which
+never are (e.g. as they hold a live connection, as Discord events do) declare
+`picklable = False`, and the runner refuses to start if its behaviours would
+need them sent to a worker. Other input events which can't be pickled are
+logged and skipped, rather than stopping the bot.
+
+Shutdown is driven by the parent: on stopping, it finishes dispatching its
+queued input events, then closes the pipes to the workers. Each worker drains
+its own queues, sends back any resulting output events, and exits.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+)
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.context
+import multiprocessing.process
+import pickle
+import signal
+import threading
+
+from queue import SimpleQueue
+
+from mewbot.bot import BotRunner, PartitionKey, resolve_dispatch
+from mewbot.config import BehaviourConfigBlock
+from mewbot.core import (
+    BehaviourInterface,
+    InputEvent,
+    InputInterface,
+    InputQueue,
+    OutputEvent,
+    OutputInterface,
+)
+from mewbot.recording import dump_event
+from mewbot.tracing import current_trace, trace_of
+
+Connection = multiprocessing.connection.Connection
+
+
+def encode_event(event: Any) -> bytes:
+    """Serialises an event to be sent to another process"""
+    return pickle.dumps(event, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_event(data: bytes) -> Any:
+    """Restores an event sent from another process"""
+    return pickle.loads(data)
+
+
+def read_events(
+    connection: Connection,
+    loop: asyncio.AbstractEventLoop,
+    receive: Callable[[Any], None],
+    closed: Callable[[], None],
+) -> threading.Thread:
+    """Starts a thread which reads events from a pipe into an event loop.
+
+    receive is called (in the loop) for each event, and closed once the other
+    end of the pipe is closed."""
+
+    def reader() -> None:
+        while True:
+            try:
+                data = connection.recv_bytes()
+            except (EOFError, OSError):
+                break
+
+            loop.call_soon_threadsafe(receive, decode_event(data))
+
+        try:
+            loop.call_soon_threadsafe(closed)
+        except RuntimeError:
+            # The loop has already been closed, so there is nothing to notify
+            pass
+
+    thread = threading.Thread(target=reader, name="mewbot-shard-reader", daemon=True)
+    thread.start()
+    return thread
+
+
+def write_events(
+    connection: Connection, outbox: SimpleQueue[Optional[bytes]], name: str
+) -> threading.Thread:
+    """Starts a thread which writes the encoded events put in an outbox to a pipe.
+
+    Writes block once the pipe's buffer is full, which would otherwise stall the
+    event loop until the other end reads. The pipe is closed once None is put in
+    the outbox, after the events before it have been sent."""
+
+    logger = logging.getLogger(__name__ + "write_events")
+
+    def writer() -> None:
+        while True:
+            data = outbox.get()
+
+            if data is None:
+                break
+
+            try:
+                connection.send_bytes(data)
+            except OSError as err:
+                logger.error("Unable to send event from %s: %s", name, err)
+                break
+
+        connection.close()
+
+    thread = threading.Thread(target=writer, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+class Shard:  # pylint: disable=too-many-instance-attributes
+    """The parent's handle on a worker process and the behaviours it runs"""
+
+    index: int
+    configs: List[BehaviourConfigBlock]
+    interests: Set[Type[InputEvent]]
+
+    process: Optional[multiprocessing.process.BaseProcess]
+    reader: Optional[threading.Thread]
+
+    _outbox: SimpleQueue[Optional[bytes]]
+    _to_worker: Optional[Connection]
+    _from_worker: Optional[Connection]
+    _writer: Optional[threading.Thread]
+    _logger: logging.Logger
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.configs = []
+        self.interests = set()
+
+        self.process = None
+        self.reader = None
+
+        self._outbox = SimpleQueue()
+        self._to_worker = None
+        self._from_worker = None
+        self._writer = None
+        self._logger = logging.getLogger(__name__ + "Shard")
+
+    def __str__(self) -> str:
+        return f"Shard({self.index}, behaviours={len(self.configs)})"
+
+    def add(self, behaviour: BehaviourInterface) -> None:
+        serialise: Optional[Callable[[], BehaviourConfigBlock]]
+        serialise = getattr(behaviour, "serialise", None)
+
+        if not serialise:
+            raise TypeError(f"Behaviour {behaviour} can not be serialised for a worker")
+
+        self.configs.append(serialise())
+        self.interests.update(behaviour.consumes_inputs())
+
+    def start(
+        self, context: multiprocessing.context.BaseContext, options: Dict[str, Any]
+    ) -> Connection:
+        """Starts the worker process, returning the pipe its output events arrive on
+
+        The options are passed to the worker's BotRunner."""
+
+        worker_inbound, self._to_worker = context.Pipe(duplex=False)
+        self._from_worker, worker_outbound = context.Pipe(duplex=False)
+
+        self.process = context.Process(  # type: ignore
+            target=worker_main,
+            args=(self.configs, worker_inbound, worker_outbound, options),
+            name=f"mewbot-shard-{self.index}",
+        )
+        self.process.start()
+
+        # The worker now owns its ends of the pipes
+        worker_inbound.close()
+        worker_outbound.close()
+
+        self._writer = write_events(
+            self._to_worker, self._outbox, f"mewbot-shard-writer-{self.index}"
+        )
+
+        return self._from_worker
+
+    def send(self, data: bytes) -> None:
+        """Queues an encoded event to be sent to the worker"""
+        self._outbox.put(data)
+
+    def close(self) -> None:
+        """Closes the pipe to the worker, after any queued events have been sent"""
+        self._outbox.put(None)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Waits for the worker to exit, and for its output events to be read"""
+
+        if self.process:
+            self.process.join(timeout)
+        if self.reader:
+            self.reader.join(timeout)
+
+    def kill(self) -> None:
+        if self.process and self.process.is_alive():
+            self._logger.warning("Killing worker process for %s", self)
+            self.process.kill()
+
+
+class ShardedBotRunner(BotRunner):  # pylint: disable=too-many-instance-attributes
+    """A BotRunner which runs its behaviours in a number of worker processes.
+
+    By default, the behaviours are shared out between the workers, and each
+    input event is sent to the workers which hold behaviours for it.
+    If a partition_key is set, every worker gets every behaviour, and each
+    event is sent to one worker chosen by its key, so events with the same key
+    are still processed in order.
+    """
+
+    processes: int
+    shards: List[Shard]
+    unsendable: int  # Input events which could not be sent to a worker
+
+    _shard_registry: Dict[Type[InputEvent], Set[Shard]]
+    _shard_dispatch: Dict[Type[InputEvent], Tuple[Shard, ...]]
+    _shard_key: Optional[PartitionKey]
+    _unkeyed: Iterator[Shard]
+    _unpicklable: Set[Type[Any]]
+
+    def __init__(
+        self,
+        behaviours: Dict[Type[InputEvent], Set[BehaviourInterface]],
+        inputs: Set[InputInterface],
+        outputs: Dict[Type[OutputEvent], Set[OutputInterface]],
+        *,
+        processes: int,
+        partition_key: Optional[PartitionKey] = None,
+        **options: Any,
+    ) -> None:
+        """
+        :param processes: The number of worker processes to run behaviours in
+        :param partition_key:
+            If set, events are partitioned between the workers by this key,
+            rather than the behaviours being partitioned.
+        Other options are as for BotRunner.
+        """
+
+        if processes < 1:
+            raise ValueError(f"ShardedBotRunner needs at least one process, got {processes}")
+
+        # The behaviours are run in the workers, not in this process.
+        super().__init__({}, inputs, outputs, **options)
+
+        self.processes = processes
+        self.shards = [Shard(index) for index in range(processes)]
+        self.unsendable = 0
+
+        self._shard_registry = {}
+        self._shard_dispatch = {}
+        self._shard_key = partition_key
+        self._unkeyed = itertools.cycle(self.shards)
+        self._unpicklable = set()
+
+        unique = dict.fromkeys(itertools.chain(*behaviours.values()))
+
+        for number, behaviour in enumerate(unique):
+            targets = self.shards if partition_key else [self.shards[number % processes]]
+
+            for shard in targets:
+                shard.add(behaviour)
+
+        for shard in self.shards:
+            for event_type in shard.interests:
+                self._shard_registry.setdefault(event_type, set()).add(shard)
+
+        self._check_inputs(inputs)
+
+    def _check_inputs(self, inputs: Set[InputInterface]) -> None:
+        """Raises ValueError if an input's events would be sent to workers, but can't be"""
+
+        for _input in inputs:
+            for event_type in _input.produces_inputs():
+                if getattr(event_type, "picklable", True) or not self.shards_for(event_type):
+                    continue
+
+                raise ValueError(
+                    f"{event_type.__name__} events from {_input} can't be sent to worker "
+                    "processes; run this bot in a single process"
+                )
+
+    def setup_tasks(self, loop: asyncio.AbstractEventLoop) -> List[asyncio.Task[None]]:
+        # Workers are spawned, rather than forked, so they do not inherit
+        # this process's event loop and threads.
+        context = multiprocessing.get_context("spawn")
+
+        for shard in self.shards:
+            self.logger.info("Starting worker process for %s", shard)
+            from_worker = shard.start(
+                context,
+                {
+                    "batch_size": self.batch_size,
+                    "thread_workers": self.executors.thread_workers,
+                    "process_workers": self.executors.process_workers,
+                },
+            )
+            shard.reader = read_events(from_worker, loop, self.receive_output, lambda: None)
+
+        return super().setup_tasks(loop)
+
+    def update_behaviours(
+        self,
+        added: Collection[BehaviourInterface] = (),
+        removed: Collection[BehaviourInterface] = (),
+        changed: Collection[BehaviourInterface] = (),
+    ) -> None:
+        # The workers were started with their behaviours' configurations, and
+        # would need to be restarted to change them
+        raise RuntimeError("The behaviours of a sharded bot can not be changed while it runs")
+
+    def shards_for(self, event_type: Type[InputEvent]) -> Tuple[Shard, ...]:
+        """All the shards which have behaviours for a given class of input event"""
+
+        try:
+            return self._shard_dispatch[event_type]
+        except KeyError:
+            shards = resolve_dispatch(self._shard_registry, event_type)
+            self._shard_dispatch[event_type] = shards
+            return shards
+
+    async def dispatch_input(self, event: InputEvent) -> None:
+        self.metrics.record_input(type(event))
+
+        shards = self.shards_for(type(event))
+
+        if not shards:
+            return
+
+        if self._shard_key:
+            # Every shard holds every behaviour, so one worker handles each event
+            partition = self._shard_key(event)
+
+            if partition is None:
+                shards = (next(self._unkeyed),)
+            else:
+                shards = (self.shards[hash(partition) % self.processes],)
+
+        data = dump_event(event, self._unpicklable, self.logger)
+
+        if data is None:
+            # e.g. the event holds a live connection, so can't be sent to a worker
+            self.unsendable += 1
+            return
+
+        for shard in shards:
+            shard.send(data)
+
+    async def dispatch_input_batch(self, events: Sequence[InputEvent]) -> None:
+        # Batches are formed again by the workers, from their own queues
+        for event in events:
+            await self.dispatch_input(event)
+
+    def receive_output(self, event: OutputEvent) -> None:
+        """Accepts an output event sent by a worker process"""
+
+        try:
+            self.output_event_queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.logger.warning("Output queue full; dropping %s from a worker", event)
+
+    async def _drain(self, tasks: Collection[asyncio.Task[None]]) -> None:
+        await self._drain_inputs(tasks)
+
+        for shard in self.shards:
+            shard.close()
+
+        loop = asyncio.get_running_loop()
+        for shard in self.shards:
+            await loop.run_in_executor(None, shard.join)
+
+        # Give the readers' final output events a chance to arrive
+        await asyncio.sleep(0)
+
+        await self._drain_outputs()
+
+    async def drain(self, tasks: Collection[asyncio.Task[None]]) -> int:
+        dropped = await super().drain(tasks)
+
+        for shard in self.shards:
+            shard.kill()
+
+        return dropped
+
+
+class WorkerInput:
+    """Input for a worker process, which reads events sent by the parent"""
+
+    queue: Optional[InputQueue]
+
+    _connection: Connection
+    _closed: Callable[[], None]
+
+    def __init__(self, connection: Connection, closed: Callable[[], None]) -> None:
+        self.queue = None
+        self._connection = connection
+        self._closed = closed
+
+    @staticmethod
+    def produces_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def bind(self, queue: InputQueue) -> None:
+        self.queue = queue
+
+    async def run(self) -> None:
+        assert self.queue, "WorkerInput run before being bound"
+
+        read_events(
+            self._connection,
+            asyncio.get_running_loop(),
+            self.queue.put_nowait,
+            self._closed,
+        )
+
+
+class WorkerOutput:
+    """Output for a worker process, which sends events back to the parent.
+
+    Events are written to the pipe by a thread, so that a parent which is slow
+    to read them does not stall the worker's event loop."""
+
+    _outbox: SimpleQueue[Optional[bytes]]
+    _writer: threading.Thread
+
+    def __init__(self, connection: Connection) -> None:
+        self._outbox = SimpleQueue()
+        self._writer = write_events(connection, self._outbox, "mewbot-worker-writer")
+
+    @staticmethod
+    def consumes_outputs() -> Set[Type[OutputEvent]]:
+        return {OutputEvent}
+
+    async def output(self, event: OutputEvent) -> bool:
+        self._outbox.put(encode_event(event))
+        return True
+
+    def close(self) -> None:
+        """Closes the pipe to the parent, once the queued events have been sent"""
+
+        self._outbox.put(None)
+        self._writer.join()
+
+
+class WorkerRunner(BotRunner):
+    """The BotRunner within a worker process.
+
+    Workers are stopped by their parent closing the pipe to them, so they
+    ignore the signals which would normally stop a bot."""
+
+    @staticmethod
+    def add_signal_handlers(
+        loop: asyncio.AbstractEventLoop, stop: Callable[[Optional[Any]], None]
+    ) -> None:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    async def dispatch_input(self, event: InputEvent) -> None:
+        # Output events sent while processing a traced event carry on its trace,
+        # which is then recorded as they are delivered by the parent process.
+        with current_trace(trace_of(event)):
+            await super().dispatch_input(event)
+
+
+def worker_main(
+    configs: List[BehaviourConfigBlock],
+    inbound: Connection,
+    outbound: Connection,
+    options: Dict[str, Any],
+) -> None:
+    """Entry point of a worker process"""
+
+    # Imported here, as the loader depends on the bot module
+    from mewbot.loader import load_behaviour  # pylint: disable=import-outside-toplevel
+
+    behaviours: Dict[Type[InputEvent], Set[BehaviourInterface]] = {}
+
+    for config in configs:
+        behaviour = load_behaviour(config)
+
+        for event_type in behaviour.consumes_inputs():
+            behaviours.setdefault(event_type, set()).add(behaviour)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    output = WorkerOutput(outbound)
+    runner = WorkerRunner(
+        behaviours,
+        {WorkerInput(inbound, lambda: runner.stop("Parent closed the connection"))},
+        {OutputEvent: {output}},
+        **options,
+    )
+
+    try:
+        runner.run(loop)
+    finally:
+        output.close()
+        loop.close()
+
+
+__all__ = ["ShardedBotRunner", "encode_event", "decode_event"]
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+"""Tracing of events from the Input which produced them to the Outputs.
+
+Each input event is given a TraceContext when it is queued. Output events
+sent by an Action while a behaviour is processing a traced event inherit a
+context which points back to it, so the whole chain shares a trace id.
+
+As an event is handled, the runner's Tracer records a Span for each stage
+(dispatching the input event, each behaviour, and each output) with how long
+the event waited in the queues before that stage and how long the stage took.
+The spans are passed to the configured exporters.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    Any,
+    Collection,
+    Deque,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    runtime_checkable,
+)
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import dataclasses
+import json
+import logging
+import os
+import time
+
+from mewbot.core import BehaviourInterface, InputEvent, OutputEvent, OutputInterface
+
+# Traces are stored on the event objects, outside of their dataclass fields,
+# so they do not affect event equality and travel with them between processes.
+TRACE_ATTRIBUTE = "_mewbot_trace"
+
+
+@dataclasses.dataclass
+class TraceContext:
+    trace_id: str  # Shared by an input event and all the events it led to
+    event_id: str  # Unique to this event
+    parent_id: Optional[str]  # The event_id of the event this one was produced from
+    enqueued: float  # When the event was queued, from time.monotonic()
+
+
+@dataclasses.dataclass
+class Span:  # pylint: disable=too-many-instance-attributes
+    """One completed stage in the handling of a traced event"""
+
+    trace_id: str
+    event_id: str
+    parent_id: Optional[str]
+    stage: str  # "dispatch", "behaviour", or "output"
+    event_type: str
+    component: Optional[str]  # The behaviour or output for that stage
+    timestamp: float  # Wall-clock time at which the stage started
+    queue_wait: float  # Seconds between the event being queued and the stage starting
+    duration: float  # Seconds taken by the stage
+    error: Optional[str] = None  # The exception raised by the stage, if any
+
+
+@runtime_checkable
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class RingBufferExporter:
+    """Keeps the most recent spans in memory"""
+
+    spans: Deque[Span]
+
+    def __init__(self, size: int = 1000) -> None:
+        self.spans = collections.deque(maxlen=size)
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def close(self) -> None:
+        pass
+
+    def trace(self, trace_id: str) -> List[Span]:
+        """The buffered spans belonging to one trace"""
+        return [span for span in self.spans if span.trace_id == trace_id]
+
+
+class JsonLinesExporter:
+    """Appends each span to a file as a line of JSON"""
+
+    path: str
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")  # pylint: disable=consider-using-with
+
+    def export(self, span: Span) -> None:
+        self._file.write(json.dumps(dataclasses.asdict(span)) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+_current: contextvars.ContextVar[Optional[TraceContext]] = contextvars.ContextVar(
+    "mewbot_trace", default=None
+)
+
+
+def new_id() -> str:
+    return os.urandom(8).hex()
+
+
+def trace_of(event: Any) -> Optional[TraceContext]:
+    """The trace context attached to an event, if any"""
+    return getattr(event, TRACE_ATTRIBUTE, None)
+
+
+def start_trace(event: InputEvent) -> TraceContext:
+    """Attaches a new trace to an input event which is being queued"""
+
+    context = TraceContext(new_id(), new_id(), None, time.monotonic())
+    setattr(event, TRACE_ATTRIBUTE, context)
+    return context
+
+
+def inherit_trace(event: OutputEvent) -> Optional[TraceContext]:
+    """Attaches a trace to an output event, following on from the event being processed.
+
+    Nothing is done if the current task is not processing a traced event."""
+
+    parent = _current.get()
+
+    if parent is None:
+        return None
+
+    context = TraceContext(parent.trace_id, new_id(), parent.event_id, time.monotonic())
+    setattr(event, TRACE_ATTRIBUTE, context)
+    return context
+
+
+def component_label(component: Any) -> str:
+    return getattr(component, "name", None) or type(component).__qualname__
+
+
+@contextlib.contextmanager
+def current_trace(context: Optional[TraceContext]) -> Iterator[None]:
+    """Marks the trace of the event being processed by the current task"""
+
+    token = _current.set(context)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class Tracer:
+    """Records the spans of traced events and passes them to the exporters"""
+
+    exporters: List[SpanExporter]
+
+    _logger: logging.Logger
+
+    def __init__(self, exporters: Sequence[SpanExporter]) -> None:
+        self.exporters = list(exporters)
+        self._logger = logging.getLogger(__name__ + "Tracer")
+
+    def producer(self, queue: asyncio.Queue[InputEvent]) -> TracingProducer:
+        """Wraps the queue an input is bound to, so that its events are traced"""
+        return TracingProducer(queue)
+
+    async def process(
+        self, event: InputEvent, behaviours: Collection[BehaviourInterface]
+    ) -> None:
+        """Passes an input event to its behaviours, recording the time each takes"""
+
+        context = trace_of(event)
+
+        if context is None:
+            context = start_trace(event)
+
+        started = time.monotonic()
+        timestamp = time.time()
+
+        with current_trace(context):
+            for behaviour in behaviours:
+                stage_started = time.monotonic()
+                stage_timestamp = time.time()
+                error: Optional[BaseException] = None
+
+                try:
+                    await behaviour.process(event)
+                except Exception as exc:
+                    error = exc
+                    raise
+                finally:
+                    self.record(
+                        context,
+                        "behaviour",
+                        event,
+                        component_label(behaviour),
+                        stage_timestamp,
+                        stage_started,
+                        error,
+                    )
+
+        self.record(context, "dispatch", event, None, timestamp, started)
+
+    def record_output(
+        self,
+        event: OutputEvent,
+        output: OutputInterface,
+        started: float,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Records an output event having been passed to an output"""
+
+        context = trace_of(event)
+
+        if context is None:
+            return
+
+        timestamp = time.time() - (time.monotonic() - started)
+        self.record(
+            context, "output", event, component_label(output), timestamp, started, error
+        )
+
+    def record(  # pylint: disable=too-many-arguments
+        self,
+        context: TraceContext,
+        stage: str,
+        event: Any,
+        component: Optional[str],
+        timestamp: float,
+        started: float,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        span = Span(
+            trace_id=context.trace_id,
+            event_id=context.event_id,
+            parent_id=context.parent_id,
+            stage=stage,
+            event_type=type(event).__module__ + "." + type(event).__qualname__,
+            component=component,
+            timestamp=timestamp,
+            queue_wait=started - context.enqueued,
+            duration=time.monotonic() - started,
+            error=None if error is None else repr(error),
+        )
+
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:  # pylint: disable=broad-except
+                self._logger.exception("Exporter %s failed to export %s", exporter, span)
+
+    def close(self) -> None:
+        for exporter in self.exporters:
+            exporter.close()
+
+
+class TracingProducer:
+    """Handle on an input queue which starts a trace for each event put on it.
+
+    This offers the put methods of a queue, so it can be bound to an Input in
+    place of the queue itself."""
+
+    queue: asyncio.Queue[InputEvent]
+
+    def __init__(self, queue: asyncio.Queue[InputEvent]) -> None:
+        self.queue = queue
+
+    async def put(self, item: InputEvent) -> None:
+        start_trace(item)
+        await self.queue.put(item)
+
+    def put_nowait(self, item: InputEvent) -> None:
+        start_trace(item)
+        self.queue.put_nowait(item)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.queue, name)
+
+
+__all__ = [
+    "TraceContext",
+    "Span",
+    "SpanExporter",
+    "RingBufferExporter",
+    "JsonLinesExporter",
+    "Tracer",
+    "TracingProducer",
+    "trace_of",
+    "start_trace",
+    "inherit_trace",
+    "current_trace",
+]
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+"""A durable write-ahead log for the events on a bot's input queue.
+
+Each input event is appended to the log before it is queued, and an
+acknowledgement is appended once the behaviours have processed it. When the
+bot starts, any events which were logged but never acknowledged (e.g.
+because the process was killed) are put back on the input queue, so events
+are processed at least once.
+
+The log is a directory of segment files, each a series of records: a kind
+(event or acknowledgement), the event's sequence number, and the length and
+CRC32 of its pickled data, followed by that data. A new segment is started
+once the current one reaches segment_size bytes. Old segments are deleted
+once all of their events have been acknowledged; if there are more than
+max_segments old segments, the events still waiting in the oldest are
+copied forward so those can be deleted too.
+
+Writes are made durable with group commit: a background task fsyncs the
+log every sync_interval seconds if anything was written, and every producer
+waiting on an append in that window is released by the one fsync.
+"""
+
+from __future__ import annotations
+
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type
+
+import asyncio
+import logging
+import os
+import pickle
+import struct
+import zlib
+
+from mewbot.core import InputEvent
+from mewbot.recording import dump_event
+
+SEGMENT_SUFFIX = ".wal"
+RECORD_HEADER = struct.Struct("<BQII")  # Kind, sequence number, data length, data CRC32
+
+EVENT = 1
+ACK = 2
+
+
+class WriteAheadLog:  # pylint: disable=too-many-instance-attributes
+    """Durable log of the input events which have not yet been processed"""
+
+    directory: str
+    segment_size: int  # Bytes written to a segment before starting a new one
+    max_segments: int  # Old segments to keep before copying their events forward
+    sync_interval: float  # Seconds to gather writes for before each fsync
+
+    logged: int  # Events appended to the log
+    acknowledged: int  # Events marked as processed
+    skipped: int  # Events which could not be logged
+    syncs: int  # Number of fsyncs made
+
+    _segments: List[int]  # Index of each segment file, the last being the one written to
+    _file: BinaryIO
+    _written: int  # Bytes written to the current segment
+
+    _sequence: int
+    _pending: Dict[int, Tuple[int, bytes]]  # Unacknowledged events, by sequence number
+    _unacked: Dict[int, int]  # Number of unacknowledged events in each segment
+    _recovered: List[Tuple[int, bytes]]  # Events left unacknowledged by the last run
+    _sequences: Dict[int, int]  # Sequence numbers of the queued events, by event id
+
+    _waiters: List[asyncio.Future[None]]
+    _dirty: Optional[asyncio.Event]
+    _unpicklable: Set[Type[Any]]
+    _logger: logging.Logger
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = 64 * 1024 * 1024,
+        max_segments: int = 4,
+        sync_interval: float = 0.005,
+    ) -> None:
+        if segment_size < 1:
+            raise ValueError(f"segment_size must be positive, got {segment_size}")
+
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.sync_interval = sync_interval
+
+        self.logged = 0
+        self.acknowledged = 0
+        self.skipped = 0
+        self.syncs = 0
+
+        self._pending = {}
+        self._unacked = {}
+        self._sequences = {}
+        self._waiters = []
+        self._dirty = None
+        self._unpicklable = set()
+        self._logger = logging.getLogger(__name__ + "WriteAheadLog")
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._segments = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[: -len(SEGMENT_SUFFIX)].isdigit()
+        )
+        self._sequence = self._read_segments()
+        self._recovered = sorted(
+            (sequence, data) for sequence, (_, data) in self._pending.items()
+        )
+
+        # Writing always starts on a fresh segment, so a torn record at the end
+        # of the last run's segment is never followed by good ones.
+        self._open_segment((self._segments[-1] + 1) if self._segments else 0)
+        self._compact()
+
+        if self._recovered:
+            self._logger.warning(
+                "%d unprocessed events found in %s", len(self._recovered), directory
+            )
+
+    def __str__(self) -> str:
+        return f"WriteAheadLog({self.directory}, pending={len(self._pending)})"
+
+    @property
+    def pending(self) -> int:
+        """Number of logged events which have not been acknowledged"""
+        return len(self._pending)
+
+    def recover(self) -> Iterator[InputEvent]:
+        """The events left unacknowledged by the previous run, in the order logged.
+
+        These are still pending, so should be queued and acknowledged once
+        processed like any other event."""
+
+        recovered, self._recovered = self._recovered, []
+
+        for sequence, data in recovered:
+            try:
+                event: InputEvent = pickle.loads(data)
+            except Exception:  # pylint: disable=broad-except
+                # e.g. the event's class no longer exists
+                self._logger.exception("Discarding unreadable event %d", sequence)
+                self._acknowledge(sequence)
+                continue
+
+            self._sequences[id(event)] = sequence
+            yield event
+
+    async def append(self, event: InputEvent) -> None:
+        """Logs an event, waiting until it is durable (which needs run() to be running)"""
+
+        if not self.append_nowait(event):
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        await waiter
+
+    def append_nowait(self, event: InputEvent) -> bool:
+        """Logs an event, which will be durable after the next sync.
+
+        Returns False if the event could not be logged (as it can't be pickled)."""
+
+        data = dump_event(event, self._unpicklable, self._logger)
+
+        if data is None:
+            self.skipped += 1
+            return False
+
+        self._sequence += 1
+        self._sequences[id(event)] = self._sequence
+        self._write(EVENT, self._sequence, data)
+
+        self._pending[self._sequence] = (self._segments[-1], data)
+        self._unacked[self._segments[-1]] = self._unacked.get(self._segments[-1], 0) + 1
+        self.logged += 1
+
+        return True
+
+    def ack(self, event: InputEvent) -> None:
+        """Marks an event as processed, so it will not be recovered"""
+
+        sequence = self._sequences.pop(id(event), None)
+
+        if sequence is not None:
+            self._acknowledge(sequence)
+
+    def ack_all(self, events: Iterable[InputEvent]) -> None:
+        for event in events:
+            self.ack(event)
+
+    def producer(self, queue: asyncio.Queue[InputEvent]) -> DurableProducer:
+        """Wraps the queue an input is bound to, so that its events are logged"""
+        return DurableProducer(queue, self)
+
+    async def run(self) -> None:
+        """Syncs the log to disk whenever it has been written to"""
+
+        dirty = self._dirty = asyncio.Event()
+        dirty.set()  # For anything written before this started
+
+        while True:
+            await dirty.wait()
+
+            # Gather up the writes of the next few milliseconds into this sync
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    async def sync(self) -> None:
+        """Makes everything written so far durable, releasing any waiting producers"""
+
+        if self._dirty:
+            self._dirty.clear()
+
+        waiters, self._waiters = self._waiters, []
+
+        self._file.flush()
+        await asyncio.get_running_loop().run_in_executor(None, os.fsync, self._file.fileno())
+        self.syncs += 1
+
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+        # Segments are only changed between syncs, so none are closed mid-fsync
+        if self._written >= self.segment_size:
+            self._rotate()
+
+    def close(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+        self._waiters = []
+
+    def _acknowledge(self, sequence: int) -> None:
+        entry = self._pending.pop(sequence, None)
+
+        if entry is None:
+            return
+
+        self._unacked[entry[0]] -= 1
+        self._write(ACK, sequence, b"")
+        self.acknowledged += 1
+
+    def _write(self, kind: int, sequence: int, data: bytes) -> None:
+        record = RECORD_HEADER.pack(kind, sequence, len(data), zlib.crc32(data)) + data
+
+        self._file.write(record)
+        self._written += len(record)
+
+        if self._dirty:
+            self._dirty.set()
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:012d}{SEGMENT_SUFFIX}")
+
+    def _open_segment(self, segment: int) -> None:
+        self._segments.append(segment)
+        self._file = open(self._path(segment), "ab")  # pylint: disable=consider-using-with
+        self._written = 0
+
+    def _rotate(self) -> None:
+        # Events may have been written during the last fsync
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._open_segment(self._segments[-1] + 1)
+        self._compact()
+
+    def _compact(self) -> None:
+        """Deletes old segments which are no longer needed.
+
+        Segments are only deleted from the oldest onwards, as a segment may
+        hold the acknowledgements of events in the segments before it."""
+
+        old = self._segments[:-1]
+        excess = set(old[: max(len(old) - self.max_segments, 0)])
+
+        if excess:
+            # Copy the events still waiting in the oldest segments forward
+            for sequence, (segment, data) in sorted(self._pending.items()):
+                if segment in excess:
+                    self._unacked[segment] -= 1
+                    self._write(EVENT, sequence, data)
+                    self._pending[sequence] = (self._segments[-1], data)
+                    self._unacked[self._segments[-1]] = (
+                        self._unacked.get(self._segments[-1], 0) + 1
+                    )
+
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+        while len(self._segments) > 1 and not self._unacked.get(self._segments[0]):
+            segment = self._segments.pop(0)
+            self._unacked.pop(segment, None)
+            os.remove(self._path(segment))
+
+    def _read_segments(self) -> int:
+        """Reads the existing segments, returning the last sequence number used"""
+
+        last = 0
+
+        for segment in self._segments:
+            for kind, sequence, data in _read_records(self._path(segment)):
+                last = max(last, sequence)
+
+                if kind == EVENT:
+                    self._pending[sequence] = (segment, data)
+                elif kind == ACK:
+                    self._pending.pop(sequence, None)
+
+        for segment, _ in self._pending.values():
+            self._unacked[segment] = self._unacked.get(segment, 0) + 1
+
+        return last
+
+
+class DurableProducer:
+    """Handle on an input queue which logs each event before it is queued.
+
+    This offers the put methods of a queue, so it can be bound to an Input in
+    place of the queue itself. put() returns once the event is durable."""
+
+    queue: asyncio.Queue[InputEvent]
+    log: WriteAheadLog
+
+    def __init__(self, queue: asyncio.Queue[InputEvent], log: WriteAheadLog) -> None:
+        self.queue = queue
+        self.log = log
+
+    async def put(self, item: InputEvent) -> None:
+        await self.log.append(item)
+        await self.queue.put(item)
+
+    def put_nowait(self, item: InputEvent) -> None:
+        self.log.append_nowait(item)
+
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # The event was never queued, so it should not be recovered either
+            self.log.ack(item)
+            raise
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.queue, name)
+
+
+def _read_records(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """Reads the kind, sequence number, and data of each record in a segment.
+
+    Reading stops at the first incomplete or corrupt record, which will have
+    been partly written when the process stopped."""
+
+    with open(path, "rb") as segment:
+        while True:
+            header = segment.read(RECORD_HEADER.size)
+
+            if len(header) < RECORD_HEADER.size:
+                return
+
+            kind, sequence, length, checksum = RECORD_HEADER.unpack(header)
+            data = segment.read(length)
+
+            if len(data) < length or zlib.crc32(data) != checksum:
+                return
+
+            yield kind, sequence, data
+
+
+__all__ = ["WriteAheadLog", "DurableProducer"]
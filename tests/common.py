@@ -1,13 +1,13 @@
 from __future__ import annotations
 
-from typing import Generic, Optional, Type, TypeVar
+from typing import Any, Generic, List, Optional, Set, Type, TypeVar
 
 from abc import ABC
 
 import yaml
 
 from mewbot.loader import load_component
-from mewbot.core import Component
+from mewbot.core import Component, InputEvent, InputQueue, OutputEvent, OutputQueue
 from mewbot.config import ConfigBlock
 
 
@@ -46,3 +46,49 @@ class BaseTestClassWithConfig(ABC, Generic[T_co]):
             self._component = component
 
         return self._component
+
+
+class RecordingBehaviour:
+    def __init__(self, interests: Set[Type[InputEvent]]) -> None:
+        self.interests = interests
+        self.seen: List[InputEvent] = []
+
+    def add(self, component: Any) -> None:
+        pass
+
+    def consumes_inputs(self) -> Set[Type[InputEvent]]:
+        return self.interests
+
+    def bind_output(self, output: OutputQueue) -> None:
+        pass
+
+    async def process(self, event: InputEvent) -> None:
+        self.seen.append(event)
+
+
+class RecordingOutput:
+    def __init__(self) -> None:
+        self.seen: List[OutputEvent] = []
+
+    @staticmethod
+    def consumes_outputs() -> Set[Type[OutputEvent]]:
+        return {OutputEvent}
+
+    async def output(self, event: OutputEvent) -> bool:
+        self.seen.append(event)
+        return True
+
+
+class DummyInput:
+    def __init__(self) -> None:
+        self.queue: Optional[InputQueue] = None
+
+    @staticmethod
+    def produces_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def bind(self, queue: InputQueue) -> None:
+        self.queue = queue
+
+    async def run(self) -> None:
+        pass
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import pytest
+
+from mewbot.bench import (
+    LoopbackIO,
+    LoopbackReactionEvent,
+    run_dispatch,
+    run_fanout,
+    run_startup,
+)
+from mewbot.bench.__main__ import main
+from mewbot.bench.scenarios import percentile
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class TestLoopbackIO:
+    @staticmethod
+    def test_event_mix() -> None:
+        loopback = LoopbackIO()
+        loopback.count = 100
+        loopback.mix = {"reaction": 1.0}
+
+        (_input,) = loopback.get_inputs()
+        assert set(getattr(_input, "types")) == {LoopbackReactionEvent}
+
+    @staticmethod
+    def test_unknown_event_type() -> None:
+        with pytest.raises(ValueError):
+            LoopbackIO().mix = {"telegram": 1.0}
+
+
+class TestScenarios:
+    @staticmethod
+    def test_percentile() -> None:
+        samples = [float(number) for number in range(1, 101)]
+
+        assert percentile(samples, 0.5) == 51.0
+        assert percentile(samples, 0.99) == 100.0
+        assert percentile([], 0.5) == 0.0
+
+    @staticmethod
+    def test_dispatch() -> None:
+        report = run_dispatch(3, events=50, timeout=10)
+
+        assert report.complete
+        assert report.count == 50
+        assert report.throughput > 0
+        assert 0 < report.p50 <= report.p99
+
+    @staticmethod
+    def test_fanout() -> None:
+        report = run_fanout(2, events=20, rate=1000, timeout=10)
+
+        assert report.complete
+        assert report.elapsed >= 0.019
+
+    @staticmethod
+    def test_startup() -> None:
+        report = run_startup(3, repeats=2)
+
+        assert report.count == 3
+        assert report.p50 > 0
+
+    @staticmethod
+    def test_command_line(capsys: pytest.CaptureFixture[str]) -> None:
+        main(["dispatch", "--sizes", "2", "--events", "10"])
+
+        lines = capsys.readouterr().out.splitlines()
+        assert len(lines) == 2
+        assert lines[1].startswith("dispatch/2")
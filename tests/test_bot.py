@@ -0,0 +1,501 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Sequence, Set, Type
+
+import asyncio
+import dataclasses
+import os
+import signal
+import time
+
+import pytest
+
+from tests.common import DummyInput, RecordingBehaviour, RecordingOutput
+
+from mewbot.bot import BotRunner
+from mewbot.core import InputEvent, OutputEvent
+from mewbot.queues import BoundedQueue, PriorityProducer
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class ChildInputEvent(InputEvent):
+    text: str
+
+
+@dataclasses.dataclass
+class KeyedInputEvent(InputEvent):
+    key: int
+    number: int
+
+
+@dataclasses.dataclass
+class ChildOutputEvent(OutputEvent):
+    text: str
+
+
+class BlockingBehaviour(RecordingBehaviour):
+    """Holds up the first event with key 0 until an event with key 1 is seen"""
+
+    released: asyncio.Event
+
+    def __init__(self) -> None:
+        super().__init__({KeyedInputEvent})
+
+    async def process(self, event: InputEvent) -> None:
+        assert isinstance(event, KeyedInputEvent)
+
+        # Created lazily so that the event is bound to the test's loop
+        if not hasattr(self, "released"):
+            self.released = asyncio.Event()
+
+        if event.key == 0 and event.number == 0:
+            await self.released.wait()
+        if event.key == 1:
+            self.released.set()
+
+        await super().process(event)
+
+
+@dataclasses.dataclass
+class UrgentInputEvent(KeyedInputEvent):
+    pass
+
+
+class GatedBehaviour(RecordingBehaviour):
+    """Holds up every event until the gate is opened"""
+
+    gate: asyncio.Event
+
+    async def process(self, event: InputEvent) -> None:
+        # Created lazily so that the event is bound to the test's loop
+        if not hasattr(self, "gate"):
+            self.gate = asyncio.Event()
+
+        await self.gate.wait()
+        await super().process(event)
+
+
+def keyed_partition(event: InputEvent) -> Optional[int]:
+    return event.key if isinstance(event, KeyedInputEvent) else None
+
+
+async def run_workers(
+    factory: Callable[[], BotRunner],
+    events: List[InputEvent],
+    expected: int,
+    timeout: float = 2,
+) -> None:
+    """Runs the runner's input workers until the expected number of events are processed
+
+    The runner is created inside the event loop, so that its queues are bound to it."""
+
+    # pylint: disable=W0212
+    runner = factory()
+    runner._running = True
+    tasks = runner.setup_workers(asyncio.get_running_loop())
+
+    for event in events:
+        runner.input_event_queue.put_nowait(event)
+
+    behaviours = set(runner.behaviours_for(InputEvent))
+    behaviours.update(*(runner.behaviours_for(type(event)) for event in events))
+
+    async def processed() -> None:
+        while (
+            sum(len(b.seen) for b in behaviours if isinstance(b, RecordingBehaviour))
+            < expected
+        ):
+            await asyncio.sleep(0.01)
+
+    try:
+        await asyncio.wait_for(processed(), timeout)
+    finally:
+        runner._running = False
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class TestDispatch:
+    @staticmethod
+    def test_dispatch_resolves_parent_classes() -> None:
+        generic = RecordingBehaviour({InputEvent})
+        specific = RecordingBehaviour({ChildInputEvent})
+
+        runner = BotRunner(
+            {InputEvent: {generic}, ChildInputEvent: {specific}},
+            set(),
+            {},
+        )
+
+        assert runner.behaviours_for(InputEvent) == (generic,)
+        assert runner.behaviours_for(ChildInputEvent) == (specific, generic)
+
+    @staticmethod
+    def test_dispatch_deduplicates_behaviours() -> None:
+        both = RecordingBehaviour({InputEvent, ChildInputEvent})
+
+        runner = BotRunner({InputEvent: {both}, ChildInputEvent: {both}}, set(), {})
+
+        assert runner.behaviours_for(ChildInputEvent) == (both,)
+
+    @staticmethod
+    def test_dispatch_extends_lazily() -> None:
+        output = RecordingOutput()
+        runner = BotRunner({}, set(), {OutputEvent: {output}})
+
+        assert ChildOutputEvent not in runner._output_dispatch  # pylint: disable=W0212
+        assert runner.outputs_for(ChildOutputEvent) == (output,)
+        assert ChildOutputEvent in runner._output_dispatch  # pylint: disable=W0212
+
+
+class TestWorkers:
+    @staticmethod
+    def test_invalid_worker_count() -> None:
+        with pytest.raises(ValueError):
+            BotRunner({}, set(), {}, input_workers=0)
+
+    @staticmethod
+    def test_workers_process_concurrently() -> None:
+        behaviour = BlockingBehaviour()
+        events: List[InputEvent] = [KeyedInputEvent(0, 0), KeyedInputEvent(1, 0)]
+
+        asyncio.run(
+            run_workers(
+                lambda: BotRunner({KeyedInputEvent: {behaviour}}, set(), {}, input_workers=2),
+                events,
+                2,
+            )
+        )
+
+        assert behaviour.seen == [KeyedInputEvent(1, 0), KeyedInputEvent(0, 0)]
+
+    @staticmethod
+    def test_single_worker_is_sequential() -> None:
+        behaviour = BlockingBehaviour()
+        events: List[InputEvent] = [KeyedInputEvent(0, 0), KeyedInputEvent(1, 0)]
+
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(
+                run_workers(
+                    lambda: BotRunner({KeyedInputEvent: {behaviour}}, set(), {}),
+                    events,
+                    2,
+                    timeout=0.2,
+                )
+            )
+
+    @staticmethod
+    def test_partition_key_keeps_order() -> None:
+        behaviour = BlockingBehaviour()
+        events: List[InputEvent] = [
+            KeyedInputEvent(0, 0),
+            KeyedInputEvent(0, 1),
+            KeyedInputEvent(0, 2),
+            KeyedInputEvent(1, 0),
+        ]
+        asyncio.run(
+            run_workers(
+                lambda: BotRunner(
+                    {KeyedInputEvent: {behaviour}},
+                    set(),
+                    {},
+                    input_workers=2,
+                    partition_key=keyed_partition,
+                ),
+                events,
+                4,
+            )
+        )
+
+        by_key: Dict[int, List[int]] = {}
+        for event in behaviour.seen:
+            assert isinstance(event, KeyedInputEvent)
+            by_key.setdefault(event.key, []).append(event.number)
+
+        assert by_key == {0: [0, 1, 2], 1: [0]}
+        assert behaviour.seen[0] == KeyedInputEvent(1, 0)
+
+    @staticmethod
+    def test_partition_lanes_keep_the_input_queue_bounded() -> None:
+        async def run() -> BotRunner:
+            # pylint: disable=W0212
+            runner = BotRunner(
+                {KeyedInputEvent: {StalledBehaviour({KeyedInputEvent})}},
+                set(),
+                {},
+                partition_key=keyed_partition,
+                input_queue={"maxsize": 5, "policy": "drop_newest"},
+            )
+            runner._running = True
+            tasks = runner.setup_workers(asyncio.get_running_loop())
+
+            for number in range(100):
+                runner.input_event_queue.put_nowait(KeyedInputEvent(0, number))
+                await asyncio.sleep(0)
+
+            runner._running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            return runner
+
+        runner = asyncio.run(run())
+        queue = runner.input_event_queue
+        assert isinstance(queue, BoundedQueue)
+
+        # One event is being processed, two wait in the lane, one with the router
+        assert runner.pending_events() == 5 + 2 + 1
+        assert queue.dropped == 100 - 5 - 2 - 1 - 1
+
+
+class StalledOutput(RecordingOutput):
+    async def output(self, event: OutputEvent) -> bool:
+        await asyncio.sleep(60)
+        return await super().output(event)
+
+
+class TestOutputLanes:
+    @staticmethod
+    def test_stalled_output_does_not_block_others() -> None:
+        stalled = StalledOutput()
+        recording = RecordingOutput()
+
+        async def run() -> None:
+            # pylint: disable=W0212
+            runner = BotRunner({}, set(), {OutputEvent: {stalled, recording}})
+            runner._running = True
+
+            tasks = [asyncio.create_task(runner.process_output_queue())]
+            tasks.extend(
+                asyncio.create_task(runner.process_output_lane(lane))
+                for lane in runner.output_lanes.values()
+            )
+
+            runner.output_event_queue.put_nowait(OutputEvent())
+            runner.output_event_queue.put_nowait(OutputEvent())
+
+            try:
+                while len(recording.seen) < 2:
+                    await asyncio.sleep(0.01)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+            assert runner.output_lanes[stalled].depth == 1
+            assert runner.output_lanes[recording].delivered == 2
+
+        asyncio.run(asyncio.wait_for(run(), 2))
+        assert not stalled.seen
+
+
+class TestInputPriorities:
+    @staticmethod
+    def test_prioritised_input_gets_producer() -> None:
+        async def run() -> None:
+            prioritised = DummyInput()
+            plain = DummyInput()
+
+            runner = BotRunner(
+                {},
+                {prioritised, plain},
+                {},
+                input_queue={"priorities": {}},
+                input_priorities={prioritised: 5},
+            )
+
+            producer = runner.input_queue_for(prioritised)
+            assert isinstance(producer, PriorityProducer)
+            assert producer.priority == 5
+            assert producer.queue is runner.input_event_queue
+
+            assert runner.input_queue_for(plain) is runner.input_event_queue
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_fifo_queue_ignores_priorities() -> None:
+        async def run() -> None:
+            prioritised = DummyInput()
+            runner = BotRunner({}, {prioritised}, {}, input_priorities={prioritised: 5})
+
+            assert runner.input_queue_for(prioritised) is runner.input_event_queue
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_partitioned_workers_take_urgent_events_first() -> None:
+        behaviour = GatedBehaviour({KeyedInputEvent})
+
+        async def run() -> None:
+            # pylint: disable=W0212
+            runner = BotRunner(
+                {KeyedInputEvent: {behaviour}},
+                set(),
+                {},
+                partition_key=keyed_partition,
+                input_queue={"priorities": {UrgentInputEvent: 10}},
+            )
+            runner._running = True
+            tasks = runner.setup_workers(asyncio.get_running_loop())
+
+            # The worker is held up by the first event while the rest arrive
+            for number in range(10):
+                runner.input_event_queue.put_nowait(KeyedInputEvent(0, number))
+                await asyncio.sleep(0)
+            runner.input_event_queue.put_nowait(UrgentInputEvent(1, 0))
+
+            behaviour.gate.set()
+            while len(behaviour.seen) < 11:
+                await asyncio.sleep(0.01)
+
+            runner._running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run(asyncio.wait_for(run(), 2))
+
+        # Only the events already handed to the worker's lane, or held by the
+        # router, are processed before the urgent one
+        assert behaviour.seen.index(UrgentInputEvent(1, 0)) == 4
+
+
+class StoppingInput(DummyInput):
+    """Puts a few events on the queue, then asks the bot to stop"""
+
+    async def run(self) -> None:
+        assert self.queue
+        for number in range(3):
+            await self.queue.put(KeyedInputEvent(0, number))
+
+        os.kill(os.getpid(), signal.SIGTERM)
+
+
+class StalledBehaviour(RecordingBehaviour):
+    async def process(self, event: InputEvent) -> None:
+        await asyncio.sleep(60)
+
+
+class TestShutdown:
+    @staticmethod
+    def test_stop_drains_queues() -> None:
+        behaviour = RecordingBehaviour({KeyedInputEvent})
+        loop = asyncio.new_event_loop()
+
+        try:
+            runner = BotRunner(
+                {KeyedInputEvent: {behaviour}}, {StoppingInput()}, {}, input_workers=2
+            )
+
+            started = time.monotonic()
+            runner.run(loop)
+
+            # Shutdown should not have to wait for any polling interval
+            assert time.monotonic() - started < 1
+        finally:
+            loop.close()
+
+        assert behaviour.seen == [KeyedInputEvent(0, number) for number in range(3)]
+
+    @staticmethod
+    def test_drain_keeps_partition_order() -> None:
+        behaviour = GatedBehaviour({KeyedInputEvent})
+
+        async def run() -> int:
+            # pylint: disable=W0212
+            runner = BotRunner(
+                {KeyedInputEvent: {behaviour}}, set(), {}, partition_key=keyed_partition
+            )
+            runner._running = True
+            tasks = runner.setup_workers(asyncio.get_running_loop())
+
+            # Stopped with events in the lane, held by the router, and still queued
+            for number in range(6):
+                runner.input_event_queue.put_nowait(KeyedInputEvent(0, number))
+                await asyncio.sleep(0)
+
+            runner._running = False
+            behaviour.gate.set()
+            return await runner.drain(tasks)
+
+        assert asyncio.run(asyncio.wait_for(run(), 2)) == 0
+        assert behaviour.seen == [KeyedInputEvent(0, number) for number in range(6)]
+
+    @staticmethod
+    def test_drain_timeout_reports_dropped() -> None:
+        async def run() -> int:
+            runner = BotRunner(
+                {KeyedInputEvent: {StalledBehaviour({KeyedInputEvent})}},
+                set(),
+                {},
+                drain_timeout=0.05,
+            )
+
+            for number in range(3):
+                runner.input_event_queue.put_nowait(KeyedInputEvent(0, number))
+
+            return await runner.drain([])
+
+        # The first event is taken off the queue, but never finishes processing
+        assert asyncio.run(run()) == 2
+
+    @staticmethod
+    def test_idle_workers_stop() -> None:
+        async def run() -> None:
+            # pylint: disable=W0212
+            runner = BotRunner({}, set(), {}, input_workers=3)
+            runner._running = True
+
+            tasks = runner.setup_workers(asyncio.get_running_loop())
+            await asyncio.sleep(0)
+            assert len(runner._idle) == 3
+
+            runner._running = False
+            assert await runner.drain(tasks) == 0
+            assert all(task.done() and not task.cancelled() for task in tasks)
+
+        asyncio.run(asyncio.wait_for(run(), 1))
+
+
+class BatchRecordingBehaviour(RecordingBehaviour):
+    def __init__(self, interests: Set[Type[InputEvent]]) -> None:
+        super().__init__(interests)
+        self.batches: List[int] = []
+
+    async def process_batch(self, events: Sequence[InputEvent]) -> None:
+        self.batches.append(len(events))
+        self.seen.extend(events)
+
+
+class TestBatching:
+    @staticmethod
+    def test_invalid_batch_size() -> None:
+        with pytest.raises(ValueError):
+            BotRunner({}, set(), {}, batch_size=0)
+
+    @staticmethod
+    def test_batched_dispatch() -> None:
+        batching = BatchRecordingBehaviour({KeyedInputEvent})
+        plain = RecordingBehaviour({KeyedInputEvent})
+        events: List[InputEvent] = [KeyedInputEvent(0, number) for number in range(5)]
+
+        asyncio.run(
+            run_workers(
+                lambda: BotRunner(
+                    {KeyedInputEvent: {batching, plain}}, set(), {}, batch_size=3
+                ),
+                events,
+                10,
+            )
+        )
+
+        assert batching.batches == [3, 2]
+        assert batching.seen == events
+        assert plain.seen == events
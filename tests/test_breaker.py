@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Set, Type
+
+import asyncio
+
+import pytest
+
+from tests.common import RecordingOutput
+
+from mewbot.api.v1 import Action, Behaviour, Trigger
+from mewbot.bench.io import LoopbackIO
+from mewbot.bot import Bot
+from mewbot.breaker import BreakerState, CircuitBreaker, ComponentFailure
+from mewbot.core import InputEvent, OutputEvent
+from mewbot.delivery import OutputLane
+from mewbot.loader import load_behaviour
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+async def succeed() -> bool:
+    return True
+
+
+async def fail() -> bool:
+    raise ConnectionError("Service unavailable")
+
+
+async def hang() -> bool:
+    await asyncio.sleep(10)
+    return True
+
+
+class AlwaysTrigger(Trigger):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def matches(self, event: InputEvent) -> bool:
+        return True
+
+
+class HangingAction(Action):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    @staticmethod
+    def produces_outputs() -> Set[Type[OutputEvent]]:
+        return set()
+
+    async def act(self, event: InputEvent, state: Dict[str, Any]) -> None:
+        await hang()
+
+
+class LoggingAction(Action):
+    def __init__(self) -> None:
+        super().__init__()
+        self.seen: List[InputEvent] = []
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    @staticmethod
+    def produces_outputs() -> Set[Type[OutputEvent]]:
+        return set()
+
+    async def act(self, event: InputEvent, state: Dict[str, Any]) -> None:
+        self.seen.append(event)
+
+
+class FailingOutput(RecordingOutput):
+    async def output(self, event: OutputEvent) -> bool:
+        return await fail()
+
+
+def state_of(breaker: CircuitBreaker) -> BreakerState:
+    """A breaker's state, which mypy would otherwise assume is unchanged by calls to it"""
+    return breaker.state
+
+
+class TestCircuitBreaker:
+    @staticmethod
+    def test_breaker_opens_and_recovers() -> None:
+        async def run() -> None:
+            breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+
+            for _ in range(2):
+                with pytest.raises(ComponentFailure):
+                    await breaker.call(fail())
+
+            assert breaker.state == BreakerState.OPEN
+            assert breaker.trips == 1
+
+            # While open, the component is not called at all
+            with pytest.raises(ComponentFailure):
+                await breaker.call(succeed())
+            assert breaker.skipped == 1
+            assert breaker.calls == 2
+
+            # After the reset timeout, a failed probe opens the breaker again...
+            await asyncio.sleep(0.06)
+            with pytest.raises(ComponentFailure):
+                await breaker.call(fail())
+            assert breaker.state == BreakerState.OPEN
+            assert breaker.trips == 2
+
+            # ...and a successful one closes it
+            await asyncio.sleep(0.06)
+            assert await breaker.call(succeed())
+            assert state_of(breaker) == BreakerState.CLOSED
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_cancelled_probe_releases_the_breaker() -> None:
+        async def run() -> None:
+            breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+
+            with pytest.raises(ComponentFailure):
+                await breaker.call(fail())
+            await asyncio.sleep(0.06)
+
+            # The probe is cancelled from outside, e.g. by an outer guard's timeout
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(breaker.call(hang()), 0.01)
+
+            assert state_of(breaker) == BreakerState.OPEN
+            assert breaker.trips == 1
+
+            # The next call probes the component again
+            assert await breaker.call(succeed())
+            assert state_of(breaker) == BreakerState.CLOSED
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_timeout() -> None:
+        async def run() -> None:
+            breaker = CircuitBreaker("test", timeout=0.01)
+
+            with pytest.raises(ComponentFailure):
+                await breaker.call(hang())
+
+            assert breaker.timeouts == 1
+            # Without a failure threshold, the breaker never opens
+            assert breaker.state == BreakerState.CLOSED
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_unknown_option() -> None:
+        with pytest.raises(ValueError):
+            CircuitBreaker.from_config("test", {"retries": 3})
+
+
+class TestGuardedComponents:
+    @staticmethod
+    def test_action_timeout() -> None:
+        hanging, following = HangingAction(), LoggingAction()
+        hanging.guard = {"timeout": 0.01, "failure_threshold": 1, "reset_timeout": 60}
+
+        behaviour = Behaviour("Guarded")
+        behaviour.add(AlwaysTrigger())
+        behaviour.add(hanging)
+        behaviour.add(following)
+
+        async def run() -> None:
+            await asyncio.wait_for(behaviour.process(InputEvent()), 1)
+            await asyncio.wait_for(behaviour.process(InputEvent()), 1)
+
+        asyncio.run(run())
+
+        assert hanging.breaker
+        assert hanging.breaker.timeouts == 1
+        assert hanging.breaker.skipped == 1
+        assert not following.seen
+
+    @staticmethod
+    def test_behaviour_timeout_from_yaml() -> None:
+        behaviour = load_behaviour(
+            {
+                "kind": "Behaviour",
+                "implementation": "mewbot.api.v1.Behaviour",
+                "uuid": "aaaaaaaa-aaaa-4aaa-0000-aaaaaaaaaa00",
+                "properties": {"name": "Hangs", "guard": {"timeout": 0.01}},
+                "triggers": [
+                    {
+                        "kind": "Trigger",
+                        "implementation": "tests.test_breaker.AlwaysTrigger",
+                        "uuid": "aaaaaaaa-aaaa-4aaa-0000-aaaaaaaaaa01",
+                        "properties": {},
+                    }
+                ],
+                "conditions": [],
+                "actions": [
+                    {
+                        "kind": "Action",
+                        "implementation": "tests.test_breaker.HangingAction",
+                        "uuid": "aaaaaaaa-aaaa-4aaa-0000-aaaaaaaaaa02",
+                        "properties": {},
+                    }
+                ],
+            }
+        )
+
+        asyncio.run(asyncio.wait_for(behaviour.process(InputEvent()), 1))
+
+        breaker = getattr(behaviour, "breaker")
+        assert breaker.timeouts == 1
+        assert breaker.name.endswith("aaaaaaaa-aaaa-4aaa-0000-aaaaaaaaaa00")
+
+    @staticmethod
+    def test_guarded_output_failure_is_contained() -> None:
+        async def run() -> None:
+            lane = OutputLane(FailingOutput(), 10, breaker=CircuitBreaker("output"))
+            lane.offer(OutputEvent())
+
+            await lane.deliver(lane.take_nowait())
+
+            assert lane.failed == 1
+            assert lane.breaker and lane.breaker.failures == 1
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_output_guard_from_io_config() -> None:
+        loopback = LoopbackIO()
+        loopback.output_guard = {"timeout": 5}
+
+        bot = Bot("guarded")
+        bot.add_io_config(loopback)
+        runner = bot.create_runner()
+
+        (lane,) = runner.output_lanes.values()
+        assert lane.breaker and lane.breaker.timeout == 5
+        assert list(runner.breakers().values()) == [lane.breaker]
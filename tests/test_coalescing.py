@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from typing import Callable, List, Optional, Sequence
+
+import asyncio
+import dataclasses
+
+import pytest
+
+from tests.common import RecordingOutput
+
+from mewbot.bot import BotRunner
+from mewbot.coalescing import Coalescer, Entry, join_text
+from mewbot.core import OutputEvent
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class TextEvent(OutputEvent):
+    channel: str
+    text: str
+
+
+@dataclasses.dataclass
+class ReactionEvent(OutputEvent):
+    channel: str
+
+
+def channel_of(event: OutputEvent) -> Optional[str]:
+    return getattr(event, "channel", None)
+
+
+def collector(sent: List[Entry]) -> Callable[[Entry], bool]:
+    def sink(entry: Entry) -> bool:
+        sent.append(entry)
+        return True
+
+    return sink
+
+
+def texts(entries: Sequence[Entry]) -> List[str]:
+    return [getattr(event, "text", "") for _, event in entries]
+
+
+class TestJoinText:
+    @staticmethod
+    def test_joins_up_to_limit() -> None:
+        merge = join_text(limit=7)
+        events = [TextEvent("a", text) for text in ("one", "two", "three", "four")]
+
+        assert [event.text for event in merge(events)] == ["one\ntwo", "three", "four"]
+
+
+class TestCoalescer:
+    @staticmethod
+    def test_merges_events_in_window() -> None:
+        async def run() -> List[Entry]:
+            sent: List[Entry] = []
+            coalescer = Coalescer(
+                channel_of, collector(sent), {TextEvent: join_text()}, window=0.01
+            )
+
+            for number, channel in enumerate(("a", "b", "a")):
+                coalescer.offer((float(number), TextEvent(channel, str(number))))
+
+            assert not sent
+            assert coalescer.pending == 3
+
+            await asyncio.sleep(0.05)
+            assert coalescer.coalesced == 1
+
+            return sent
+
+        assert sorted(asyncio.run(run())) == [
+            (0.0, TextEvent("a", "0\n2")),
+            (1.0, TextEvent("b", "1")),
+        ]
+
+    @staticmethod
+    def test_max_events() -> None:
+        async def run() -> List[Entry]:
+            sent: List[Entry] = []
+            coalescer = Coalescer(
+                channel_of, collector(sent), {TextEvent: join_text()}, window=60, max_events=2
+            )
+
+            coalescer.offer((0.0, TextEvent("a", "x")))
+            coalescer.offer((0.0, TextEvent("a", "y")))
+
+            assert not coalescer.pending
+            return sent
+
+        assert texts(asyncio.run(run())) == ["x\ny"]
+
+    @staticmethod
+    def test_unmerged_events_keep_their_order() -> None:
+        async def run() -> List[Entry]:
+            sent: List[Entry] = []
+            coalescer = Coalescer(
+                channel_of, collector(sent), {TextEvent: join_text()}, window=60
+            )
+
+            coalescer.offer((0.0, TextEvent("a", "x")))
+            coalescer.offer((0.0, ReactionEvent("a")))
+
+            return sent
+
+        sent = asyncio.run(run())
+        assert [event for _, event in sent] == [TextEvent("a", "x"), ReactionEvent("a")]
+
+    @staticmethod
+    def test_config_resolves_names() -> None:
+        coalescer = Coalescer.from_config(
+            channel_of,
+            lambda entry: True,
+            {
+                "merges": {
+                    "tests.test_coalescing.TextEvent": "mewbot.io.discord.merge_messages"
+                }
+            },
+        )
+
+        assert coalescer.merge_function(TextEvent("a", "x"))
+        assert coalescer.merge_function(ReactionEvent("a")) is None
+
+        with pytest.raises(ValueError):
+            Coalescer.from_config(channel_of, lambda entry: True, {"merges": {}, "size": 1})
+
+
+class ChannelOutput(RecordingOutput):
+    @staticmethod
+    def destination(event: OutputEvent) -> Optional[str]:
+        return channel_of(event)
+
+
+class TestCoalescedLanes:
+    @staticmethod
+    def test_drain_sends_held_events() -> None:
+        output = ChannelOutput()
+
+        async def run() -> BotRunner:
+            runner = BotRunner(
+                {},
+                set(),
+                {OutputEvent: {output}},
+                output_coalesce={"merges": {TextEvent: join_text()}, "window": 60},
+            )
+
+            for text in ("hello", "world"):
+                runner.dispatch_output(TextEvent("general", text))
+
+            assert runner.output_lanes[output].depth == 2
+            assert await runner.drain([]) == 0
+
+            return runner
+
+        text = asyncio.run(run()).metrics.render().splitlines()
+
+        assert output.seen == [TextEvent("general", "hello\nworld")]
+        assert (
+            'mewbot_output_coalesced_total{output="tests.test_coalescing.ChannelOutput"} 1'
+            in text
+        )
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from typing import Set, Type
+
+import asyncio
+import dataclasses
+
+from tests.common import RecordingBehaviour
+
+from mewbot.api.v1 import CommandTrigger
+from mewbot.bot import BotRunner
+from mewbot.commands import CommandIndex, command_word
+from mewbot.core import InputEvent
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class TextEvent(InputEvent):
+    text: str
+
+
+class TextCommandTrigger(CommandTrigger):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {TextEvent}
+
+
+def command_behaviour(*commands: str) -> RecordingBehaviour:
+    behaviour = RecordingBehaviour({TextEvent})
+    behaviour.triggers = []  # type: ignore
+
+    for command in commands:
+        trigger = TextCommandTrigger()
+        trigger.command = command
+        behaviour.triggers.append(trigger)  # type: ignore
+
+    return behaviour
+
+
+class TestCommandTrigger:
+    @staticmethod
+    def test_matches_command_and_arguments() -> None:
+        trigger = TextCommandTrigger()
+        trigger.command = "!roll"
+
+        assert trigger.matches(TextEvent("!roll"))
+        assert trigger.matches(TextEvent("  !roll 2d6"))
+        assert not trigger.matches(TextEvent("!rollover"))
+        assert not trigger.matches(TextEvent("please !roll"))
+
+        trigger.exact = True
+        assert trigger.matches(TextEvent("!roll"))
+        assert not trigger.matches(TextEvent("!roll 2d6"))
+
+    @staticmethod
+    def test_command_words() -> None:
+        trigger = TextCommandTrigger()
+        trigger.command = "!remind me"
+
+        assert trigger.command_words() == {"!remind"}
+        assert command_word("\t!remind me later") == "!remind"
+        assert command_word("   ") is None
+
+
+class TestCommandIndex:
+    @staticmethod
+    def test_select() -> None:
+        roll = command_behaviour("!roll", "!dice")
+        help_ = command_behaviour("!help")
+        everything = RecordingBehaviour({TextEvent})
+
+        index = CommandIndex([roll, help_, everything])
+        behaviours = (roll, help_, everything)
+
+        assert len(index) == 2
+        assert index.select(TextEvent("!dice 2d6"), behaviours) == (everything, roll)
+        assert index.select(TextEvent("hello"), behaviours) == (everything,)
+        assert index.skipped == 3
+
+    @staticmethod
+    def test_runner_skips_other_commands() -> None:
+        roll = command_behaviour("!roll")
+        help_ = command_behaviour("!help")
+        everything = RecordingBehaviour({TextEvent})
+
+        async def run() -> None:
+            runner = BotRunner({TextEvent: {roll, help_, everything}}, set(), {})
+
+            await runner.dispatch_input(TextEvent("!roll 2d6"))
+            await runner.dispatch_input_batch([TextEvent("!help"), TextEvent("hi")])
+
+        asyncio.run(run())
+
+        assert roll.seen == [TextEvent("!roll 2d6")]
+        assert help_.seen == [TextEvent("!help")]
+        assert len(everything.seen) == 3
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+
+import pytest
+
+from tests.common import DummyInput
+
+from mewbot.bot import BotRunner
+from mewbot.core import InputEvent
+from mewbot.dedup import Deduplicator, ExpiringKeySet
+from mewbot.io.http import IncomingWebhookEvent, webhook_identity
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class MessageEvent(InputEvent):
+    message_id: int
+
+
+@dataclasses.dataclass
+class EditEvent(MessageEvent):
+    pass
+
+
+def message_id(event: MessageEvent) -> int:
+    return event.message_id
+
+
+class TestExpiringKeySet:
+    @staticmethod
+    def test_keys_expire() -> None:
+        keys = ExpiringKeySet(10, ttl=5.0)
+
+        assert keys.add("a", now=0.0)
+        assert not keys.add("a", now=4.0)
+        assert keys.add("a", now=5.0)
+        assert len(keys) == 1
+
+    @staticmethod
+    def test_size_is_bounded() -> None:
+        keys = ExpiringKeySet(2, ttl=60.0)
+
+        for key in ("a", "b", "c"):
+            assert keys.add(key, now=0.0)
+
+        assert len(keys) == 2
+        assert keys.evicted == 1
+        assert keys.add("a", now=0.0)  # The oldest key was forgotten
+
+    @staticmethod
+    def test_size_must_be_positive() -> None:
+        with pytest.raises(ValueError):
+            ExpiringKeySet(0, ttl=1.0)
+
+
+class TestDeduplicator:
+    @staticmethod
+    def test_duplicates() -> None:
+        deduplicator = Deduplicator({MessageEvent: message_id})
+
+        assert not deduplicator.is_duplicate(MessageEvent(1))
+        assert deduplicator.is_duplicate(MessageEvent(1))
+        assert not deduplicator.is_duplicate(MessageEvent(2))
+
+        # Subclasses use their parent's identity, but don't clash with it
+        assert not deduplicator.is_duplicate(EditEvent(1))
+        assert deduplicator.is_duplicate(EditEvent(1))
+
+        # Events without an identity are always let through
+        assert not deduplicator.is_duplicate(InputEvent())
+        assert not deduplicator.is_duplicate(IncomingWebhookEvent("retry"))
+
+        assert deduplicator.checked == 7
+        assert deduplicator.duplicates_by_type == {MessageEvent: 1, EditEvent: 1}
+
+    @staticmethod
+    def test_webhook_identity() -> None:
+        deduplicator = Deduplicator({IncomingWebhookEvent: webhook_identity})
+
+        assert not deduplicator.is_duplicate(IncomingWebhookEvent("a", idempotency_key="1"))
+        assert deduplicator.is_duplicate(IncomingWebhookEvent("a", idempotency_key="1"))
+        assert not deduplicator.is_duplicate(IncomingWebhookEvent("a"))
+        assert not deduplicator.is_duplicate(IncomingWebhookEvent("a"))
+
+
+class TestRunnerDeduplicate:
+    @staticmethod
+    def test_duplicates_are_not_queued() -> None:
+        async def run() -> BotRunner:
+            runner = BotRunner(
+                {}, set(), {}, deduplicate={"identities": {MessageEvent: message_id}}
+            )
+            producer = runner.input_queue_for(DummyInput())
+
+            for number in (1, 2, 1):
+                await producer.put(MessageEvent(number))
+
+            return runner
+
+        runner = asyncio.run(run())
+
+        assert runner.input_event_queue.qsize() == 2
+        assert (
+            'mewbot_input_duplicates_total{event_type="tests.test_dedup.MessageEvent"} 1'
+            in runner.metrics.render().splitlines()
+        )
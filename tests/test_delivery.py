@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from typing import List, Sequence
+
+import asyncio
+
+from tests.common import RecordingOutput
+
+from mewbot.core import OutputEvent
+from mewbot.delivery import OutputLane, take_batch
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class TestOutputLane:
+    @staticmethod
+    def test_lane_delivers_in_order() -> None:
+        async def run() -> None:
+            output = RecordingOutput()
+            lane = OutputLane(output, 10)
+            events = [OutputEvent() for _ in range(3)]
+
+            for event in events:
+                assert lane.offer(event)
+
+            assert lane.depth == 3
+
+            while lane.depth:
+                await lane.deliver(lane.take_nowait())
+
+            assert output.seen == events
+            assert lane.delivered == 3
+            assert lane.latency >= 0
+            assert lane.mean_latency >= 0
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_lane_drops_when_full() -> None:
+        async def run() -> None:
+            lane = OutputLane(RecordingOutput(), 1)
+
+            assert lane.offer(OutputEvent())
+            assert not lane.offer(OutputEvent())
+            assert lane.dropped == 1
+            assert lane.depth == 1
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_lane_waits_for_events() -> None:
+        async def run() -> None:
+            lane = OutputLane(RecordingOutput(), 1)
+            event = OutputEvent()
+
+            waiting = asyncio.create_task(lane.take())
+            await asyncio.sleep(0)
+            assert not waiting.done()
+
+            lane.offer(event)
+            _, taken = await asyncio.wait_for(waiting, 1)
+            assert taken is event
+
+        asyncio.run(run())
+
+
+class BatchRecordingOutput(RecordingOutput):
+    def __init__(self) -> None:
+        super().__init__()
+        self.batches: List[int] = []
+
+    async def output_batch(self, events: Sequence[OutputEvent]) -> bool:
+        self.batches.append(len(events))
+        self.seen.extend(events)
+        return True
+
+
+class TestBatchDelivery:
+    @staticmethod
+    def test_take_batch() -> None:
+        async def run() -> None:
+            queue: asyncio.Queue[int] = asyncio.Queue()
+            for number in range(1, 5):
+                queue.put_nowait(number)
+
+            assert take_batch(queue, 0, 1) == (0,)
+            assert list(take_batch(queue, 0, 3)) == [0, 1, 2]
+            assert list(take_batch(queue, 0, 10)) == [0, 3, 4]
+            assert take_batch(queue, 0, 10) == (0,)
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_batch_output() -> None:
+        async def run() -> None:
+            output = BatchRecordingOutput()
+            lane = OutputLane(output, 10)
+            events = [OutputEvent() for _ in range(4)]
+
+            for event in events:
+                lane.offer(event)
+
+            await lane.deliver_batch(lane.take_batch(lane.take_nowait(), 10))
+
+            assert output.batches == [4]
+            assert output.seen == events
+            assert lane.delivered == 4
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_batch_without_batch_output() -> None:
+        async def run() -> None:
+            output = RecordingOutput()
+            lane = OutputLane(output, 10)
+            events = [OutputEvent() for _ in range(2)]
+
+            for event in events:
+                lane.offer(event)
+
+            await lane.deliver_batch(lane.take_batch(lane.take_nowait(), 10))
+
+            assert output.seen == events
+            assert lane.delivered == 2
+
+        asyncio.run(run())
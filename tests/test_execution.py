@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Set, Type, TypeVar
+
+import asyncio
+import os
+import threading
+
+import pytest
+
+from mewbot.api.v1 import Action, Behaviour, Condition, Offloadable, Trigger
+from mewbot.bot import BotRunner
+from mewbot.core import InputEvent, OutputEvent
+from mewbot.execution import Execution, Executors, execute
+from mewbot.profiling import Profiler, behaviour_components
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+ComponentType = TypeVar("ComponentType", bound=Offloadable)  # pylint: disable=invalid-name
+
+
+def executed(component: ComponentType, execution: str) -> ComponentType:
+    """Sets where a component is run, as its execution property would be configured"""
+    component.execution = execution
+    return component
+
+
+def make_event(**attributes: Any) -> InputEvent:
+    event = InputEvent()
+    for name, value in attributes.items():
+        setattr(event, name, value)
+    return event
+
+
+class OffLoopTrigger(Trigger):
+    """Matches events when it is run somewhere other than the event loop's thread"""
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def matches(self, event: InputEvent) -> bool:
+        return bool(threading.get_ident() != getattr(event, "loop_thread"))
+
+
+class OtherProcessTrigger(Trigger):
+    """Matches events when it is run in a process other than the bot's"""
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def matches(self, event: InputEvent) -> bool:
+        return bool(os.getpid() != getattr(event, "pid"))
+
+
+class FlagCondition(Condition):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def allows(self, event: InputEvent) -> bool:
+        return bool(getattr(event, "allowed", True))
+
+
+class CollectAction(Action):
+    collected: List[InputEvent]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.collected = []
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    @staticmethod
+    def produces_outputs() -> Set[Type[OutputEvent]]:
+        return set()
+
+    async def act(self, event: InputEvent, state: Dict[str, Any]) -> None:
+        self.collected.append(event)
+
+
+def make_behaviour(trigger: Trigger, condition: Condition) -> Behaviour:
+    behaviour = Behaviour("Offloaded")
+    behaviour.add(trigger)
+    behaviour.add(condition)
+    behaviour.add(CollectAction())
+    return behaviour
+
+
+class TestExecution:
+    @staticmethod
+    def test_unknown_execution() -> None:
+        with pytest.raises(ValueError):
+            executed(OffLoopTrigger(), "gpu")
+
+    @staticmethod
+    def test_execution_is_serialised() -> None:
+        trigger = executed(OffLoopTrigger(), "thread")
+
+        assert trigger.offloaded
+        assert trigger.serialise()["properties"]["execution"] == "thread"
+
+    @staticmethod
+    def test_process_execution_needs_executors() -> None:
+        with pytest.raises(RuntimeError):
+            asyncio.run(execute(None, Execution.PROCESS, os.getpid))
+
+    @staticmethod
+    def test_thread_execution() -> None:
+        async def run() -> Behaviour:
+            behaviour = make_behaviour(executed(OffLoopTrigger(), "thread"), FlagCondition())
+            runner = BotRunner({InputEvent: {behaviour}}, set(), {})
+            runner.setup_tasks(asyncio.get_running_loop())
+
+            try:
+                loop_thread = threading.get_ident()
+                await behaviour.process(make_event(loop_thread=loop_thread))
+                await behaviour.process(make_event(loop_thread=loop_thread, allowed=False))
+            finally:
+                runner.executors.shutdown()
+
+            return behaviour
+
+        behaviour = asyncio.run(run())
+
+        assert len(behaviour.actions[0].collected) == 1  # type: ignore
+        assert behaviour.stats.matched == 2
+        assert behaviour.stats.rejected == 1
+
+    @staticmethod
+    def test_process_execution() -> None:
+        async def run() -> Behaviour:
+            behaviour = make_behaviour(
+                executed(OtherProcessTrigger(), "process"),
+                executed(FlagCondition(), "thread"),
+            )
+            behaviour.bind_executors(Executors(thread_workers=1, process_workers=1))
+            executors = behaviour.triggers[0].executors
+            assert executors
+
+            try:
+                await behaviour.process(make_event(pid=os.getpid()))
+            finally:
+                executors.shutdown()
+
+            return behaviour
+
+        behaviour = asyncio.run(run())
+
+        assert len(behaviour.actions[0].collected) == 1  # type: ignore
+
+    @staticmethod
+    def test_profiling_process_execution() -> None:
+        async def run() -> Behaviour:
+            behaviour = make_behaviour(
+                executed(OtherProcessTrigger(), "process"),
+                executed(FlagCondition(), "thread"),
+            )
+            behaviour.bind_executors(Executors(thread_workers=1, process_workers=1))
+            executors = behaviour.triggers[0].executors
+            assert executors
+
+            profiler = Profiler(behaviour_components(behaviour))
+            profiler.start()
+
+            try:
+                await behaviour.process(make_event(pid=os.getpid()))
+            finally:
+                report = profiler.stop()
+                executors.shutdown()
+
+            # The trigger is sent to the other process without a timing wrapper
+            methods = {profile.method for profile in report.profiles if profile.calls}
+            assert methods == {"process", "allows", "act"}
+
+            return behaviour
+
+        behaviour = asyncio.run(run())
+
+        assert len(behaviour.actions[0].collected) == 1  # type: ignore
+
+    @staticmethod
+    def test_action_offload() -> None:
+        async def run() -> int:
+            action = CollectAction()
+            action.execution = "thread"
+            return await action.offload(threading.get_ident)
+
+        assert asyncio.run(run()) != threading.get_ident()
@@ -1,22 +1,94 @@
 from __future__ import annotations
 
-from typing import Type
+from typing import Any, Dict, List, Set, Type
 
 import copy
+import os
+import pathlib
 import pytest
 import yaml
 
 from tests.common import BaseTestClassWithConfig
 
-from mewbot.loader import configure_bot, load_behaviour, load_component
+from mewbot.loader import (
+    ConfigWatcher,
+    configure_bot,
+    load_behaviour,
+    load_component,
+    load_runner_options,
+)
 
 from mewbot.bot import Bot
 from mewbot.config import ConfigBlock
-from mewbot.io.http import HTTPServlet
-from mewbot.api.v1 import IOConfig, Behaviour
+from mewbot.io.discord import channel_partition_key
+from mewbot.io.http import HTTPServlet, IncomingWebhookEvent, webhook_identity
+from mewbot.api.v1 import IOConfig, Behaviour, Condition
+from mewbot.core import InputEvent
+from mewbot.tracing import RingBufferExporter
 
 
 CONFIG_YAML = "examples/trivial_http_post.yaml"
+RUNNER_YAML = "examples/concurrent_http_post.yaml"
+
+
+class ChannelCondition(Condition):
+    _channel: str = ""
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    @property
+    def channel(self) -> str:
+        return self._channel
+
+    @channel.setter
+    def channel(self, channel: str) -> None:
+        self._channel = channel
+
+    def allows(self, event: InputEvent) -> bool:
+        return True
+
+
+def behaviour_block(uuid: str, channel: str) -> Dict[str, Any]:
+    return {
+        "kind": "Behaviour",
+        "implementation": "mewbot.api.v1.Behaviour",
+        "uuid": uuid,
+        "properties": {"name": uuid},
+        "triggers": [
+            {
+                "kind": "Trigger",
+                "implementation": "mewbot.demo.AllEventTrigger",
+                "uuid": f"{uuid}-trigger",
+                "properties": {},
+            }
+        ],
+        "conditions": [
+            {
+                "kind": "Condition",
+                "implementation": "tests.test_loader.ChannelCondition",
+                "uuid": f"{uuid}-condition",
+                "properties": {"channel": channel},
+            }
+        ],
+        "actions": [
+            {
+                "kind": "Action",
+                "implementation": "mewbot.demo.PrintAction",
+                "uuid": f"{uuid}-action",
+                "properties": {},
+            }
+        ],
+    }
+
+
+def write_config(path: pathlib.Path, documents: List[Dict[str, Any]]) -> None:
+    path.write_text(yaml.safe_dump_all(documents), encoding="utf-8")
+
+    # Make sure the change is seen, even on filesystems with coarse timestamps
+    stamp = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(stamp, stamp))
 
 
 class TestLoader:
@@ -57,6 +129,100 @@ class TestLoaderConfigureBot:
 
         assert isinstance(bot, Bot)
 
+    @staticmethod
+    def test_runner_options() -> None:
+        with open(RUNNER_YAML, "r", encoding="utf-8") as config_file:
+            bot = configure_bot("bot", config_file)
+
+        assert bot._runner_options == {  # pylint: disable=W0212
+            "input_workers": 2,
+            "input_queue": {
+                "maxsize": 1000,
+                "policy": "shed",
+                "shed": [IncomingWebhookEvent],
+            },
+        }
+
+    @staticmethod
+    def test_runner_callable_options() -> None:
+        options = load_runner_options(
+            {
+                "kind": "Runner",
+                "implementation": "mewbot.bot.BotRunner",
+                "uuid": "aaaaaaaa-aaaa-4aaa-0000-aaaaaaaaaa00",
+                "properties": {"partition_key": "mewbot.io.discord.channel_partition_key"},
+            }
+        )
+
+        assert options == {"partition_key": channel_partition_key}
+
+    @staticmethod
+    def test_runner_queue_priorities() -> None:
+        options = load_runner_options(
+            {
+                "kind": "Runner",
+                "implementation": "mewbot.bot.BotRunner",
+                "uuid": "aaaaaaaa-aaaa-4aaa-0000-aaaaaaaaaa00",
+                "properties": {
+                    "input_queue": {"priorities": {"mewbot.io.http.IncomingWebhookEvent": -1}}
+                },
+            }
+        )
+
+        assert options == {"input_queue": {"priorities": {IncomingWebhookEvent: -1}}}
+
+    @staticmethod
+    def test_runner_deduplicate() -> None:
+        identities = {
+            "mewbot.io.http.IncomingWebhookEvent": "mewbot.io.http.webhook_identity"
+        }
+        options = load_runner_options(
+            {
+                "kind": "Runner",
+                "implementation": "mewbot.bot.BotRunner",
+                "uuid": "aaaaaaaa-aaaa-4aaa-0000-aaaaaaaaaa00",
+                "properties": {"deduplicate": {"identities": identities, "ttl": 60}},
+            }
+        )
+
+        assert options == {
+            "deduplicate": {"identities": {IncomingWebhookEvent: webhook_identity}, "ttl": 60}
+        }
+
+    @staticmethod
+    def test_runner_trace_exporters() -> None:
+        options = load_runner_options(
+            {
+                "kind": "Runner",
+                "implementation": "mewbot.bot.BotRunner",
+                "uuid": "aaaaaaaa-aaaa-4aaa-0000-aaaaaaaaaa00",
+                "properties": {
+                    "trace_exporters": [
+                        {
+                            "implementation": "mewbot.tracing.RingBufferExporter",
+                            "properties": {"size": 10},
+                        }
+                    ]
+                },
+            }
+        )
+
+        (exporter,) = options["trace_exporters"]
+        assert isinstance(exporter, RingBufferExporter)
+        assert exporter.spans.maxlen == 10
+
+    @staticmethod
+    def test_runner_wrong_implementation() -> None:
+        with pytest.raises(TypeError):
+            load_runner_options(
+                {
+                    "kind": "Runner",
+                    "implementation": "mewbot.bot.Bot",
+                    "uuid": "aaaaaaaa-aaaa-4aaa-0000-aaaaaaaaaa00",
+                    "properties": {},
+                }
+            )
+
 
 # Tester for mewbot.loader.load_component
 class TestLoaderHttpsPost(BaseTestClassWithConfig[HTTPServlet]):
@@ -105,3 +271,75 @@ class TestLoaderBehaviourHttpPost(BaseTestClassWithConfig[Behaviour]):
     def test_working(self) -> None:
         component = load_behaviour(self.config)  # type: ignore
         assert isinstance(component, Behaviour)
+
+    def test_serialise_round_trip(self) -> None:
+        component = load_behaviour(self.config)  # type: ignore
+        assert isinstance(component, Behaviour)
+
+        reloaded = load_behaviour(component.serialise())
+        assert isinstance(reloaded, Behaviour)
+        assert reloaded.name == component.name
+        assert reloaded.uuid == component.uuid
+        assert len(reloaded.triggers) == len(component.triggers)
+
+
+class TestConfigWatcher:
+    @staticmethod
+    def test_reload(tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "bot.yaml"
+        write_config(path, [behaviour_block("kept", "a"), behaviour_block("dropped", "a")])
+
+        with open(path, "r", encoding="utf-8") as config_file:
+            runner = configure_bot("bot", config_file).create_runner()
+
+        watcher = ConfigWatcher(str(path), runner)
+        assert watcher.check() is None
+
+        kept = next(b for b in runner.all_behaviours() if b.uuid == "kept")  # type: ignore
+        trigger = kept.triggers[0]  # type: ignore
+        condition = kept.conditions[0]  # type: ignore
+
+        io_config = {
+            "kind": "IOConfig",
+            "implementation": "mewbot.io.socket.SocketIO",
+            "uuid": "socket",
+            "properties": {"host": "localhost", "port": 12345},
+        }
+        write_config(
+            path, [behaviour_block("kept", "b"), behaviour_block("new", "a"), io_config]
+        )
+
+        diff = watcher.check()
+        assert diff
+        assert [config["uuid"] for config in diff.added] == ["new"]
+        assert [config["uuid"] for config in diff.removed] == ["dropped"]
+        assert [config["uuid"] for config in diff.updated] == ["kept"]
+        assert diff.unsupported == ["IOConfig socket"]
+
+        behaviours = runner.behaviours_for(InputEvent)
+        assert sorted(b.uuid for b in behaviours) == ["kept", "new"]  # type: ignore
+        assert kept in behaviours
+
+        # Only the changed condition is replaced
+        assert kept.triggers[0] is trigger  # type: ignore
+        assert kept.conditions[0] is not condition  # type: ignore
+        assert kept.conditions[0].channel == "b"  # type: ignore
+
+    @staticmethod
+    def test_broken_reload(tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "bot.yaml"
+        write_config(path, [behaviour_block("kept", "a")])
+
+        with open(path, "r", encoding="utf-8") as config_file:
+            runner = configure_bot("bot", config_file).create_runner()
+
+        watcher = ConfigWatcher(str(path), runner)
+        behaviours = runner.all_behaviours()
+
+        broken = behaviour_block("kept", "b")
+        broken["actions"][0]["implementation"] = "mewbot.demo.MissingAction"
+        write_config(path, [broken, behaviour_block("new", "a")])
+
+        assert watcher.check() is None
+        assert runner.all_behaviours() == behaviours
+        assert behaviours[0].conditions[0].channel == "a"  # type: ignore
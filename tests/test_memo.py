@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from typing import List, Set, Type
+
+import asyncio
+
+from tests.test_execution import CollectAction
+
+from mewbot.api.v1 import Behaviour, Condition, Trigger
+from mewbot.bot import BotRunner
+from mewbot.core import InputEvent
+from mewbot.memo import SharedResults, component_identity
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class AlwaysTrigger(Trigger):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def matches(self, event: InputEvent) -> bool:
+        return True
+
+
+class ChannelCondition(Condition):
+    """Allows events from one channel, counting how often it is checked"""
+
+    pure = True
+    checks: List[InputEvent] = []
+
+    _channel: str = ""
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    @property
+    def channel(self) -> str:
+        return self._channel
+
+    @channel.setter
+    def channel(self, channel: str) -> None:
+        self._channel = channel
+
+    def allows(self, event: InputEvent) -> bool:
+        self.checks.append(event)
+        return getattr(event, "channel", None) == self._channel
+
+
+class ImpureChannelCondition(ChannelCondition):
+    pure = False
+
+
+def in_channel(
+    channel: str, condition_type: Type[ChannelCondition] = ChannelCondition
+) -> ChannelCondition:
+    condition = condition_type()
+    condition.channel = channel
+    return condition
+
+
+def make_behaviour(condition: Condition) -> Behaviour:
+    behaviour = Behaviour("Channel")
+    behaviour.add(AlwaysTrigger())
+    behaviour.add(condition)
+    behaviour.add(CollectAction())
+    return behaviour
+
+
+def make_event(channel: str) -> InputEvent:
+    event = InputEvent()
+    setattr(event, "channel", channel)
+    return event
+
+
+class TestComponentIdentity:
+    @staticmethod
+    def test_identical_components() -> None:
+        first = in_channel("general")
+        second = in_channel("general")
+        second.execution = "thread"
+
+        assert first.uuid != second.uuid
+        assert component_identity(first) == component_identity(second)
+        assert component_identity(first) != component_identity(in_channel("random"))
+
+    @staticmethod
+    def test_impure_components() -> None:
+        assert component_identity(in_channel("general", ImpureChannelCondition)) is None
+        assert component_identity(AlwaysTrigger()) is None
+
+
+class TestSharedResults:
+    @staticmethod
+    def test_only_shared_components() -> None:
+        behaviours = [
+            make_behaviour(in_channel("general")),
+            make_behaviour(in_channel("general")),
+            make_behaviour(in_channel("random")),
+        ]
+
+        assert len(SharedResults(behaviours)) == 2
+
+    @staticmethod
+    def test_identical_conditions_are_checked_once_per_event() -> None:
+        ChannelCondition.checks = []
+        behaviours = [make_behaviour(in_channel("general")) for _ in range(3)]
+        events = [make_event("general"), make_event("random")]
+
+        async def run() -> BotRunner:
+            runner = BotRunner({InputEvent: set(behaviours)}, set(), {})
+
+            await runner.dispatch_input(events[0])
+            await runner.dispatch_input_batch(events)
+            return runner
+
+        runner = asyncio.run(run())
+
+        assert len(ChannelCondition.checks) == 3
+        assert runner.shared_results.hits == 6
+
+    @staticmethod
+    def test_impure_conditions_are_always_checked() -> None:
+        ImpureChannelCondition.checks = []
+        behaviours = [
+            make_behaviour(in_channel("general", ImpureChannelCondition)) for _ in range(3)
+        ]
+
+        async def run() -> None:
+            runner = BotRunner({InputEvent: set(behaviours)}, set(), {})
+            await runner.dispatch_input(make_event("general"))
+
+        asyncio.run(run())
+
+        assert len(ImpureChannelCondition.checks) == 3
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Set, Type
+
+import asyncio
+import socket
+
+import aiohttp
+from aiohttp.test_utils import make_mocked_request
+
+from tests.common import RecordingOutput
+
+from mewbot.api.v1 import Action, Behaviour, Condition, Trigger
+from mewbot.bot import BotRunner
+from mewbot.core import InputEvent, OutputEvent
+from mewbot.delivery import OutputLane
+from mewbot.io.http import MetricsListener
+from mewbot.metrics import Histogram
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class EvenTrigger(Trigger):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def matches(self, event: InputEvent) -> bool:
+        return getattr(event, "even", False)
+
+
+class AllowCondition(Condition):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def allows(self, event: InputEvent) -> bool:
+        return True
+
+
+class SendAction(Action):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    @staticmethod
+    def produces_outputs() -> Set[Type[OutputEvent]]:
+        return {OutputEvent}
+
+    async def act(self, event: InputEvent, state: Dict[str, Any]) -> None:
+        await self.send(OutputEvent())
+
+
+class FailingOutput(RecordingOutput):
+    async def output(self, event: OutputEvent) -> bool:
+        await super().output(event)
+        return False
+
+
+def make_behaviour() -> Behaviour:
+    behaviour = Behaviour("Even events")
+    behaviour.add(EvenTrigger())
+    behaviour.add(AllowCondition())
+    behaviour.add(SendAction())
+    return behaviour
+
+
+def make_event(even: bool) -> InputEvent:
+    event = InputEvent()
+    setattr(event, "even", even)
+    return event
+
+
+class TestHistogram:
+    @staticmethod
+    def test_buckets() -> None:
+        histogram = Histogram((1.0, 2.0))
+
+        for value in (0.5, 1.0, 1.5, 3.0):
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.cumulative() == [(1.0, 2), (2.0, 3), (float("inf"), 4)]
+        assert histogram.count == 4
+        assert histogram.mean == 1.5
+
+
+class TestBehaviourStats:
+    @staticmethod
+    def test_behaviour_records_stats() -> None:
+        async def run() -> None:
+            behaviour = make_behaviour()
+            behaviour.bind_output(asyncio.Queue())
+
+            for number in range(4):
+                await behaviour.process(make_event(number % 2 == 0))
+
+            assert behaviour.stats.events == 4
+            assert behaviour.stats.matched == 2
+            assert behaviour.stats.match_rate == 0.5
+            assert behaviour.stats.reject_rate == 0.0
+            assert behaviour.stats.action_latency.count == 2
+
+        asyncio.run(run())
+
+
+class TestOutputStats:
+    @staticmethod
+    def test_lane_counts_failures() -> None:
+        async def run() -> None:
+            lane = OutputLane(FailingOutput(), 10)
+            lane.offer(OutputEvent())
+
+            await lane.deliver(lane.take_nowait())
+
+            assert lane.delivered == 1
+            assert lane.failed == 1
+            assert lane.output_latency.count == 1
+
+        asyncio.run(run())
+
+
+class TestRunnerMetrics:
+    @staticmethod
+    def test_runner_metrics() -> None:
+        async def run() -> str:
+            behaviour = make_behaviour()
+            output = FailingOutput()
+            runner = BotRunner({InputEvent: {behaviour}}, set(), {OutputEvent: {output}})
+            runner.setup_tasks(asyncio.get_running_loop())
+
+            for even in (True, False):
+                await runner.dispatch_input(make_event(even))
+
+            runner.dispatch_output(runner.output_event_queue.get_nowait())
+            for lane in runner.output_lanes.values():
+                await lane.deliver(lane.take_nowait())
+
+            assert runner.metrics.input_events == {InputEvent: 2}
+            assert runner.metrics.rate(InputEvent) > 0
+            assert runner.metrics.behaviour_stats() == {"Even events": behaviour.stats}
+
+            return runner.metrics.render()
+
+        text = asyncio.run(run()).splitlines()
+
+        assert 'mewbot_input_events_total{event_type="mewbot.core.InputEvent"} 2' in text
+        assert 'mewbot_queue_depth{queue="input"} 0' in text
+        assert 'mewbot_behaviour_matched_total{behaviour="Even events"} 1' in text
+        assert (
+            'mewbot_behaviour_action_seconds_bucket{behaviour="Even events",le="+Inf"} 1'
+            in text
+        )
+        output_label = 'output="tests.test_metrics.FailingOutput"'
+        assert f'mewbot_output_calls_total{{{output_label},result="failure"}} 1' in text
+        assert "# TYPE mewbot_output_seconds histogram" in text
+
+    @staticmethod
+    def test_metrics_listener() -> None:
+        with socket.socket() as probe:
+            probe.bind(("localhost", 0))
+            port = probe.getsockname()[1]
+
+        async def run() -> str:
+            runner = BotRunner({}, set(), {})
+            listener = MetricsListener(runner, "localhost", port)
+            task = asyncio.create_task(listener.run())
+
+            try:
+                for _ in range(50):
+                    try:
+                        async with aiohttp.ClientSession() as session:
+                            async with session.get(str(listener)) as response:
+                                assert response.status == 200
+                                return await response.text()
+                    except aiohttp.ClientConnectionError:
+                        await asyncio.sleep(0.05)
+
+                raise AssertionError("Metrics listener did not start")
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+        assert "mewbot_uptime_seconds" in asyncio.run(run())
+
+    @staticmethod
+    def test_profile_rejects_bad_seconds() -> None:
+        async def run(seconds: str) -> int:
+            runner = BotRunner({}, set(), {})
+            listener = MetricsListener(runner, "localhost", 0)
+
+            request = make_mocked_request("POST", f"/profile?seconds={seconds}")
+            response = await listener.profile_response(request)
+            return response.status
+
+        for seconds in ("inf", "-inf", "nan", "-1", "0", "1e9", "ten"):
+            assert asyncio.run(run(seconds)) == 400, seconds
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from typing import Set, Type
+
+import dataclasses
+import gc
+import pickle
+
+import pytest
+
+from mewbot.api.v1 import RegexTrigger
+from mewbot.core import InputEvent
+from mewbot.patterns import ENGINE, PatternEngine, PatternSet, required_literal
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class MessageEvent(InputEvent):
+    text: str
+    author: str = ""
+
+
+class MessageRegexTrigger(RegexTrigger):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {MessageEvent}
+
+
+class Owner:
+    """Stands in for the trigger which registered a pattern"""
+
+
+class TestPatternEngine:
+    @staticmethod
+    def test_matching() -> None:
+        engine = PatternEngine()
+        owners = [Owner() for _ in range(5)]
+
+        engine.register(owners[0], 1, r"\bhello\b", "text")
+        engine.register(owners[1], 2, r"^bye", "text", ignore_case=True)
+        engine.register(owners[2], 3, r"(\d)\1", "text")  # No literal, so always searched
+        engine.register(owners[3], 4, r"(?P<word>cat)", "text")
+        engine.register(owners[4], 5, r"^admin$", "author")
+
+        assert engine.matching(MessageEvent("Bye, hello there")) == {1, 2}
+        assert engine.matching(MessageEvent("a cat aged 11", "admin")) == {3, 4, 5}
+        assert not engine.matching(MessageEvent("othello"))
+
+    @staticmethod
+    def test_required_literal() -> None:
+        assert required_literal(r"\bhello\b") == ("hello", False)
+        assert required_literal(r"(?i)Say (hi|hello) World") == (" world", True)
+        assert required_literal(r"colou?r") == ("colo", False)
+        assert required_literal(r"\d+") == (None, False)
+
+    @staticmethod
+    def test_identical_patterns_share_a_search() -> None:
+        engine = PatternEngine()
+        owners = [Owner() for _ in range(3)]
+
+        for key, owner in enumerate(owners, 1):
+            engine.register(owner, key, "spam", "text")
+
+        assert engine.matching(MessageEvent("spam")) == {1, 2, 3}
+        assert len(PatternSet({1: ("spam", False), 2: ("spam", False)})) == 1
+
+    @staticmethod
+    def test_rebuilds_when_patterns_change() -> None:
+        engine = PatternEngine()
+        owner = Owner()
+
+        engine.register(owner, 1, "spam", "text")
+        assert engine.matching(MessageEvent("spam and eggs")) == {1}
+
+        engine.register(owner, 1, "eggs", "text")
+        engine.register(owner, 2, "and", "text")
+        assert engine.matching(MessageEvent("spam")) == set()
+        assert engine.matching(MessageEvent("spam and eggs")) == {1, 2}
+
+    @staticmethod
+    def test_patterns_are_removed_with_their_owner() -> None:
+        engine = PatternEngine()
+        owner = Owner()
+
+        engine.register(owner, 1, "spam", "text")
+        assert len(engine) == 1
+
+        del owner
+        gc.collect()
+
+        assert not engine
+        assert not engine.matching(MessageEvent("spam"))
+
+    @staticmethod
+    def test_invalid_pattern() -> None:
+        with pytest.raises(ValueError):
+            PatternEngine().register(Owner(), 1, "(unclosed", "text")
+
+
+class TestRegexTrigger:
+    @staticmethod
+    def test_matches() -> None:
+        greeting = MessageRegexTrigger()
+        greeting.pattern = r"\b(hi|hello)\b"
+        greeting.ignore_case = True
+
+        admin = MessageRegexTrigger()
+        admin.pattern = "^root$"
+        admin.field = "author"
+
+        event = MessageEvent("Hello everyone", "root")
+        assert greeting.matches(event)
+        assert admin.matches(event)
+
+        event = MessageEvent("high five", "rooted")
+        assert not greeting.matches(event)
+        assert not admin.matches(event)
+
+    @staticmethod
+    def test_without_pattern() -> None:
+        trigger = MessageRegexTrigger()
+        assert not trigger.matches(MessageEvent("anything"))
+
+    @staticmethod
+    def test_copies_share_a_registration() -> None:
+        trigger = MessageRegexTrigger()
+        trigger.pattern = "unpickled"
+        registered = len(ENGINE)
+
+        # As if sent to another process to run, once for each event
+        for _ in range(3):
+            copy = pickle.loads(pickle.dumps(trigger))
+            assert copy.matches(MessageEvent("an unpickled trigger"))
+            del copy
+            gc.collect()
+
+        assert len(ENGINE) == registered + 1
+
+        # A copy made after the pattern changes uses the new pattern
+        trigger.pattern = "changed"
+        copy = pickle.loads(pickle.dumps(trigger))
+        assert copy.matches(MessageEvent("a changed trigger"))
+        assert not copy.matches(MessageEvent("an unpickled trigger"))
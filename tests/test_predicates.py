@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from typing import List, Set, Type
+
+import asyncio
+
+from tests.test_execution import CollectAction
+
+from mewbot.api.v1 import Behaviour, Condition, Trigger
+from mewbot.core import InputEvent
+from mewbot.predicates import REPLAN_EVERY, PredicatePlan
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class FixedTrigger(Trigger):
+    """Always gives the same answer, counting how often it is asked"""
+
+    def __init__(self, result: bool) -> None:
+        self.result = result
+        self.calls = 0
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def matches(self, event: InputEvent) -> bool:
+        self.calls += 1
+        return self.result
+
+
+class FixedCondition(Condition):
+    """Always gives the same answer, counting how often it is asked"""
+
+    def __init__(self, result: bool) -> None:
+        self.result = result
+        self.calls = 0
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def allows(self, event: InputEvent) -> bool:
+        self.calls += 1
+        return self.result
+
+
+def make_behaviour(
+    triggers: List[FixedTrigger], conditions: List[FixedCondition]
+) -> Behaviour:
+    behaviour = Behaviour("Fixed")
+    for trigger in triggers:
+        behaviour.add(trigger)
+    for condition in conditions:
+        behaviour.add(condition)
+    behaviour.add(CollectAction())
+    return behaviour
+
+
+class TestBehaviourChecks:
+    @staticmethod
+    def test_conditions_reject() -> None:
+        behaviour = make_behaviour([FixedTrigger(True)], [FixedCondition(False)])
+
+        asyncio.run(behaviour.process(InputEvent()))
+
+        action = behaviour.actions[0]
+        assert isinstance(action, CollectAction)
+        assert not action.collected
+        assert behaviour.stats.rejected == 1
+
+    @staticmethod
+    def test_short_circuit() -> None:
+        triggers = [FixedTrigger(True), FixedTrigger(True)]
+        conditions = [FixedCondition(False), FixedCondition(True)]
+        behaviour = make_behaviour(triggers, conditions)
+
+        asyncio.run(behaviour.process(InputEvent()))
+
+        assert [trigger.calls for trigger in triggers] == [1, 0]
+        assert [condition.calls for condition in conditions] == [1, 0]
+
+
+class TestPredicatePlan:
+    @staticmethod
+    def test_replan_orders_conditions_by_cost_and_selectivity() -> None:
+        slow, fast, selective = (FixedCondition(True) for _ in range(3))
+        plan = PredicatePlan([], [slow, fast, selective])
+        checks = {check.component: check for check in plan.conditions}
+
+        for _ in range(100):
+            checks[slow].record(True, 0.01)
+            checks[fast].record(True, 0.001)
+            checks[selective].record(False, 0.001)
+
+        plan.replan()
+
+        assert [check.component for check in plan.conditions] == [selective, fast, slow]
+
+    @staticmethod
+    def test_replan_orders_triggers_by_cost_and_match_rate() -> None:
+        rare, common = FixedTrigger(False), FixedTrigger(True)
+        plan = PredicatePlan([rare, common], [])
+
+        for _ in range(300):
+            plan.matches(InputEvent())
+
+        assert [check.component for check in plan.triggers] == [common, rare]
+        assert rare.calls == REPLAN_EVERY - 1
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Set, Type
+
+import asyncio
+import pathlib
+
+from tests.common import RecordingOutput
+
+from mewbot.api.v1 import Action, Behaviour, Trigger
+from mewbot.bot import BotRunner
+from mewbot.core import InputEvent, OutputEvent
+from mewbot.profiling import Profiler, behaviour_components
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class AlwaysTrigger(Trigger):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def matches(self, event: InputEvent) -> bool:
+        return True
+
+
+class SlowAction(Action):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    @staticmethod
+    def produces_outputs() -> Set[Type[OutputEvent]]:
+        return set()
+
+    async def act(self, event: InputEvent, state: Dict[str, Any]) -> None:
+        await asyncio.sleep(0.01)
+
+
+def make_behaviour() -> Behaviour:
+    behaviour = Behaviour("Slow")
+    behaviour.add(AlwaysTrigger())
+    behaviour.add(SlowAction())
+    return behaviour
+
+
+class TestProfiler:
+    @staticmethod
+    def test_profiler_times_components() -> None:
+        behaviour = make_behaviour()
+        uuid = behaviour.actions[0].uuid
+        profiler = Profiler(behaviour_components(behaviour))
+
+        async def run() -> None:
+            profiler.start()
+            for _ in range(3):
+                await behaviour.process(InputEvent())
+
+        asyncio.run(run())
+        report = profiler.stop()
+
+        profiles = {
+            (p.implementation.rsplit(".", 1)[-1], p.method): p for p in report.profiles
+        }
+        assert profiles[("Behaviour", "process")].calls == 3
+        assert profiles[("AlwaysTrigger", "matches")].calls == 3
+        assert profiles[("SlowAction", "act")].total >= 0.03
+        assert profiles[("SlowAction", "act")].uuid == uuid
+        assert f"SlowAction.act [{uuid}]" in report.format()
+
+        # The timers are removed once profiling stops
+        assert "process" not in vars(behaviour)
+        assert "act" not in vars(behaviour.actions[0])
+
+    @staticmethod
+    def test_runner_writes_report(tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "profile.txt"
+        output = RecordingOutput()
+
+        async def run() -> None:
+            runner = BotRunner(
+                {InputEvent: {make_behaviour()}},
+                set(),
+                {OutputEvent: {output}},
+                profile_report=str(path),
+            )
+
+            profiling = asyncio.create_task(runner.profile(0.1))
+            await asyncio.sleep(0)
+
+            await runner.dispatch_input(InputEvent())
+            await runner.output_lanes[output].deliver((0.0, OutputEvent()))
+
+            report = await profiling
+            assert {p.method for p in report.profiles if p.calls} == {
+                "process",
+                "matches",
+                "act",
+                "output",
+            }
+
+        asyncio.run(run())
+
+        assert "RecordingOutput.output" in path.read_text(encoding="utf-8")
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+from typing import List
+
+import asyncio
+import dataclasses
+
+import pytest
+
+from mewbot.core import InputEvent
+from mewbot.queues import BoundedQueue, OverflowPolicy, PriorityEventQueue, create_queue
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class BulkEvent(InputEvent):
+    number: int
+
+
+@dataclasses.dataclass
+class ImportantEvent(InputEvent):
+    number: int
+
+
+def drain(queue: BoundedQueue[InputEvent]) -> List[InputEvent]:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+class TestBoundedQueue:
+    @staticmethod
+    def test_block_policy() -> None:
+        async def run() -> None:
+            queue: BoundedQueue[InputEvent] = BoundedQueue(1)
+            queue.put_nowait(BulkEvent(0))
+
+            with pytest.raises(asyncio.QueueFull):
+                queue.put_nowait(BulkEvent(1))
+
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(queue.put(BulkEvent(1)), 0.01)
+
+            assert queue.dropped == 0
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_drop_newest_policy() -> None:
+        async def run() -> None:
+            queue: BoundedQueue[InputEvent] = BoundedQueue(2, "drop_newest")
+
+            for number in range(4):
+                await queue.put(BulkEvent(number))
+
+            assert drain(queue) == [BulkEvent(0), BulkEvent(1)]
+            assert queue.dropped == 2
+            assert queue.dropped_by_type == {BulkEvent: 2}
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_drop_oldest_policy() -> None:
+        async def run() -> None:
+            queue: BoundedQueue[InputEvent] = BoundedQueue(2, OverflowPolicy.DROP_OLDEST)
+
+            for number in range(4):
+                queue.put_nowait(BulkEvent(number))
+
+            assert drain(queue) == [BulkEvent(2), BulkEvent(3)]
+            assert queue.dropped == 2
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_shed_policy() -> None:
+        async def run() -> None:
+            queue: BoundedQueue[InputEvent] = BoundedQueue(2, "shed", [BulkEvent])
+
+            queue.put_nowait(BulkEvent(0))
+            queue.put_nowait(ImportantEvent(0))
+            # A sheddable event is dropped when the queue is full.
+            queue.put_nowait(BulkEvent(1))
+            # An important event makes room by evicting a sheddable one.
+            queue.put_nowait(ImportantEvent(1))
+
+            # With nothing left to shed, the queue applies back pressure.
+            with pytest.raises(asyncio.QueueFull):
+                queue.put_nowait(ImportantEvent(2))
+
+            assert drain(queue) == [ImportantEvent(0), ImportantEvent(1)]
+            assert queue.dropped_by_type == {BulkEvent: 2}
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_shed_policy_needs_types() -> None:
+        with pytest.raises(ValueError):
+            BoundedQueue(1, "shed")
+
+    @staticmethod
+    def test_invalid_policy() -> None:
+        with pytest.raises(ValueError):
+            BoundedQueue(1, "explode")
+
+
+class TestPriorityEventQueue:
+    @staticmethod
+    def test_priority_by_class() -> None:
+        async def run() -> None:
+            queue: PriorityEventQueue[InputEvent] = PriorityEventQueue(
+                priorities={ImportantEvent: 10}
+            )
+
+            for number in range(3):
+                await queue.put(BulkEvent(number))
+                await queue.put(ImportantEvent(number))
+
+            assert drain(queue) == [
+                ImportantEvent(0),
+                ImportantEvent(1),
+                ImportantEvent(2),
+                BulkEvent(0),
+                BulkEvent(1),
+                BulkEvent(2),
+            ]
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_priority_resolves_parent_classes() -> None:
+        queue: PriorityEventQueue[InputEvent] = PriorityEventQueue(priorities={InputEvent: 3})
+
+        assert queue.priority_of(BulkEvent(0)) == 3
+
+    @staticmethod
+    def test_producer_priority() -> None:
+        async def run() -> None:
+            queue: PriorityEventQueue[InputEvent] = PriorityEventQueue(
+                priorities={ImportantEvent: 10}
+            )
+            urgent = queue.producer(5)
+
+            queue.put_nowait(BulkEvent(0))
+            await urgent.put(BulkEvent(1))
+            # The class priority takes precedence over the producer's
+            urgent.put_nowait(ImportantEvent(0))
+
+            assert drain(queue) == [ImportantEvent(0), BulkEvent(1), BulkEvent(0)]
+            assert urgent.qsize() == 0
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_drops_least_urgent() -> None:
+        async def run() -> None:
+            queue: PriorityEventQueue[InputEvent] = PriorityEventQueue(
+                2, "drop_oldest", priorities={ImportantEvent: 10}
+            )
+
+            queue.put_nowait(ImportantEvent(0))
+            queue.put_nowait(BulkEvent(0))
+            queue.put_nowait(BulkEvent(1))
+            queue.put_nowait(ImportantEvent(1))
+
+            assert drain(queue) == [ImportantEvent(0), ImportantEvent(1)]
+            assert queue.dropped_by_type == {BulkEvent: 2}
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_create_queue() -> None:
+        async def run() -> None:
+            assert isinstance(create_queue(priorities={}), PriorityEventQueue)
+            assert not isinstance(create_queue(maxsize=3), PriorityEventQueue)
+
+        asyncio.run(run())
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import datetime
+import pathlib
+import pickle
+import threading
+import time
+import types
+
+import pytest
+
+from tests.common import DummyInput
+
+from mewbot.bot import BotRunner
+from mewbot.core import InputEvent
+from mewbot.io.discord import (
+    DiscordMessageCreationEvent,
+    DiscordMessageEditInputEvent,
+    RecordedMessage,
+    channel_partition_key,
+    message_identity,
+)
+from mewbot.io.replay import ReplayIO, ReplayInput
+from mewbot.recording import MAGIC, RECORD_HEADER, EventRecorder, read_recording
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class RecordedEvent(InputEvent):
+    number: int
+
+
+class TestEventRecorder:
+    @staticmethod
+    def test_round_trip(tmp_path: pathlib.Path) -> None:
+        path = str(tmp_path / "events.rec")
+        recorder = EventRecorder(path)
+
+        for number in range(3):
+            recorder.record(RecordedEvent(number))
+        recorder.close()
+
+        records = list(read_recording(path))
+        assert [event for _, event in records] == [RecordedEvent(n) for n in range(3)]
+        assert records[0][0] <= records[1][0] <= records[2][0]
+
+    @staticmethod
+    def test_recordings_are_appended(tmp_path: pathlib.Path) -> None:
+        path = str(tmp_path / "events.rec")
+
+        for number in range(2):
+            recorder = EventRecorder(path)
+            recorder.record(RecordedEvent(number))
+            recorder.close()
+
+        assert [event for _, event in read_recording(path)] == [
+            RecordedEvent(0),
+            RecordedEvent(1),
+        ]
+
+    @staticmethod
+    def test_truncated_record_is_ignored(tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "events.rec"
+        recorder = EventRecorder(str(path))
+        recorder.record(RecordedEvent(1))
+        recorder.close()
+
+        with open(path, "ab") as recording:
+            recording.write(RECORD_HEADER.pack(time.time(), 100) + b"partial")
+
+        assert len(list(read_recording(str(path)))) == 1
+
+    @staticmethod
+    def test_not_a_recording(tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "events.rec"
+        path.write_bytes(b"something else")
+
+        with pytest.raises(ValueError):
+            list(read_recording(str(path)))
+
+    @staticmethod
+    def test_unpicklable_event_is_skipped(tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "events.rec"
+        recorder = EventRecorder(str(path))
+
+        event = InputEvent()
+        setattr(event, "connection", lambda: None)
+        recorder.record(event)
+        recorder.close()
+
+        assert recorder.skipped == 1
+        assert path.read_bytes() == MAGIC
+
+    @staticmethod
+    def test_records_are_flushed(tmp_path: pathlib.Path) -> None:
+        path = str(tmp_path / "events.rec")
+        recorder = EventRecorder(path)
+        recorder.record(RecordedEvent(1))
+
+        # Readable without closing the recorder, as if the bot had crashed
+        assert [event for _, event in read_recording(path)] == [RecordedEvent(1)]
+        recorder.close()
+
+
+def discord_message(message_id: int, content: str) -> types.SimpleNamespace:
+    """Stands in for a discord.Message, which holds the client's (unpicklable) state"""
+
+    return types.SimpleNamespace(
+        id=message_id,
+        content=content,
+        author=types.SimpleNamespace(id=5, name="alice", display_name="Alice"),
+        channel=types.SimpleNamespace(id=42, name="general", send=lambda text: None),
+        created_at=datetime.datetime(2022, 1, 1),
+        edited_at=None,
+        _state=threading.Lock(),
+    )
+
+
+class TestDiscordEvents:
+    @staticmethod
+    def test_messages_are_recorded(tmp_path: pathlib.Path) -> None:
+        path = str(tmp_path / "events.rec")
+        recorder = EventRecorder(path)
+
+        recorder.record(
+            DiscordMessageCreationEvent(text="hello", message=discord_message(1, "hello"))
+        )
+        recorder.record(
+            DiscordMessageEditInputEvent(
+                text_before="hello",
+                message_before=discord_message(1, "hello"),
+                text_after="hi",
+                message_after=discord_message(1, "hi"),
+            )
+        )
+        recorder.close()
+
+        assert recorder.recorded == 2 and recorder.skipped == 0
+
+        created, edited = [event for _, event in read_recording(path)]
+        assert isinstance(created, DiscordMessageCreationEvent)
+        assert isinstance(created.message, RecordedMessage)
+        assert created.text == created.message.content == "hello"
+        assert created.message.author.name == "alice"
+        assert channel_partition_key(created) == 42
+        assert message_identity(created) == 1
+
+        assert isinstance(edited, DiscordMessageEditInputEvent)
+        assert edited.message_after.content == "hi"
+        assert channel_partition_key(edited) == 42
+
+
+class TestReplay:
+    @staticmethod
+    def test_runner_records_inputs(tmp_path: pathlib.Path) -> None:
+        path = str(tmp_path / "events.rec")
+
+        async def run() -> None:
+            _input = DummyInput()
+            runner = BotRunner({}, {_input}, {}, record_events=path)
+            runner.setup_tasks(asyncio.get_running_loop())
+
+            assert _input.queue and runner.recorder
+            await _input.queue.put(RecordedEvent(7))
+            runner.recorder.close()
+
+            assert runner.input_event_queue.get_nowait() == RecordedEvent(7)
+
+        asyncio.run(run())
+
+        assert [event for _, event in read_recording(path)] == [RecordedEvent(7)]
+
+    @staticmethod
+    def test_replay_speed(tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "events.rec"
+
+        # Two events recorded a second apart
+        with open(path, "wb") as recording:
+            recording.write(MAGIC)
+            for number, timestamp in enumerate((100.0, 101.0)):
+                data = pickle.dumps(RecordedEvent(number))
+                recording.write(RECORD_HEADER.pack(timestamp, len(data)) + data)
+
+        async def replay(speed: float) -> float:
+            replay_input = ReplayInput(str(path), speed)
+            queue: asyncio.Queue[InputEvent] = asyncio.Queue()
+            replay_input.bind(queue)
+
+            started = time.monotonic()
+            await replay_input.run()
+
+            assert queue.qsize() == replay_input.replayed == 2
+            return time.monotonic() - started
+
+        assert 0.09 <= asyncio.run(replay(10.0)) < 0.5
+        assert asyncio.run(replay(0)) < 0.09
+
+    @staticmethod
+    def test_replay_io_properties() -> None:
+        replay = ReplayIO()
+        replay.path = "events.rec"
+        replay.speed = 4
+
+        (replay_input,) = replay.get_inputs()
+        assert isinstance(replay_input, ReplayInput)
+        assert replay_input.speed == 4.0
+        assert not replay.get_outputs()
+
+        with pytest.raises(ValueError):
+            replay.speed = -1
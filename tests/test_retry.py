@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import asyncio
+import dataclasses
+import pathlib
+
+import pytest
+
+from mewbot.bot import BotRunner
+from mewbot.core import OutputEvent
+from mewbot.recording import read_recording
+from mewbot.retry import DeadLetter, DeadLetterFile, RetryPolicy, RetryQueue
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class NumberedEvent(OutputEvent):
+    number: int
+
+
+class FlakyOutput:
+    """Fails to send each event a number of times before succeeding"""
+
+    def __init__(self, failures: int) -> None:
+        self.failures = failures
+        self.attempts: Dict[int, int] = {}
+        self.seen: List[OutputEvent] = []
+
+    @staticmethod
+    def consumes_outputs() -> Any:
+        return {OutputEvent}
+
+    async def output(self, event: OutputEvent) -> bool:
+        number = getattr(event, "number")
+        self.attempts[number] = self.attempts.get(number, 0) + 1
+
+        if self.attempts[number] <= self.failures:
+            raise ConnectionError("Service unavailable")
+
+        self.seen.append(event)
+        return True
+
+
+class CollectingDeadLetters:
+    def __init__(self) -> None:
+        self.letters: List[DeadLetter] = []
+
+    def dead_letter(self, letter: DeadLetter) -> None:
+        self.letters.append(letter)
+
+    def close(self) -> None:
+        pass
+
+
+def create_runner(output: FlakyOutput, **options: Any) -> BotRunner:
+    return BotRunner({}, set(), {OutputEvent: {output}}, **options)
+
+
+class TestRetryPolicy:
+    @staticmethod
+    def test_exponential_backoff() -> None:
+        policy = RetryPolicy(base_delay=1, max_delay=5, jitter=0)
+
+        assert [policy.delay(attempt) for attempt in range(1, 5)] == [1, 2, 4, 5]
+
+    @staticmethod
+    def test_jitter() -> None:
+        policy = RetryPolicy(base_delay=4, jitter=0.5)
+
+        for _ in range(20):
+            assert 2 <= policy.delay(1) <= 4
+
+    @staticmethod
+    def test_invalid_options() -> None:
+        with pytest.raises(ValueError):
+            RetryPolicy(max_attempts=0)
+        with pytest.raises(ValueError):
+            RetryPolicy(jitter=2)
+        with pytest.raises(ValueError):
+            RetryPolicy.from_config({"attempts": 3})
+
+
+class TestOutputRetry:
+    @staticmethod
+    def test_failed_events_are_retried() -> None:
+        output = FlakyOutput(failures=2)
+        retry = {"base_delay": 0.01, "max_delay": 0.01}
+
+        async def run() -> BotRunner:
+            runner = create_runner(output, output_retry=retry)
+            lane = runner.output_lanes[output]
+
+            runner.dispatch_output(NumberedEvent(1))
+            await lane.deliver(await lane.take())
+
+            # The failure is held for retry, and fresh events are still delivered
+            runner.dispatch_output(NumberedEvent(2))
+            assert lane.depth == 2
+
+            assert await runner.drain([]) == 0
+            return runner
+
+        runner = asyncio.run(run())
+        retry_queue = runner.output_lanes[output].retry
+
+        assert retry_queue
+        assert sorted(getattr(event, "number") for event in output.seen) == [1, 2]
+        assert retry_queue.retried == 4
+        assert not retry_queue.dead
+
+    @staticmethod
+    def test_dead_letters() -> None:
+        output = FlakyOutput(failures=10)
+        sink = CollectingDeadLetters()
+
+        async def run() -> int:
+            runner = create_runner(
+                output,
+                output_retry={"max_attempts": 3, "base_delay": 0.01, "max_delay": 0.01},
+                dead_letters=[sink],
+            )
+            runner.dispatch_output(NumberedEvent(1))
+            return await runner.drain([])
+
+        assert asyncio.run(run()) == 0
+        assert output.attempts == {1: 3}
+
+        assert len(sink.letters) == 1
+        letter = sink.letters[0]
+        assert letter.event == NumberedEvent(1)
+        assert letter.attempts == 3
+        assert "ConnectionError" in str(letter.error)
+
+    @staticmethod
+    def test_waiting_events_are_dead_lettered_on_shutdown() -> None:
+        output = FlakyOutput(failures=10)
+        sink = CollectingDeadLetters()
+
+        async def run() -> None:
+            runner = create_runner(
+                output,
+                output_retry={"base_delay": 60, "max_delay": 60},
+                dead_letters=[sink],
+                drain_timeout=0.05,
+            )
+            runner.dispatch_output(NumberedEvent(1))
+            assert await runner.drain([]) == 0
+
+        asyncio.run(run())
+
+        assert [letter.attempts for letter in sink.letters] == [1]
+
+    @staticmethod
+    def test_events_which_cant_be_requeued_are_dead_lettered() -> None:
+        sink = CollectingDeadLetters()
+
+        async def run() -> RetryQueue:
+            # The lane is full whenever the event is due to be retried
+            retries = RetryQueue(
+                RetryPolicy(base_delay=0.01, max_delay=0.01), lambda entry: False, [sink]
+            )
+            retries.failed((0.0, NumberedEvent(1)), ConnectionError("Service unavailable"))
+
+            await asyncio.sleep(0.05)
+            return retries
+
+        retries = asyncio.run(run())
+
+        assert retries.pending == 0
+        assert retries.retried == 0
+        assert retries.dead == 1
+        assert [(letter.event, letter.attempts) for letter in sink.letters] == [
+            (NumberedEvent(1), 1)
+        ]
+
+    @staticmethod
+    def test_dead_letter_file(tmp_path: pathlib.Path) -> None:
+        path = str(tmp_path / "dead.rec")
+        sink = DeadLetterFile(path)
+        sink.dead_letter(DeadLetter(NumberedEvent(1), "output", 5, None))
+        sink.close()
+
+        assert [letter for _, letter in read_recording(path)] == [
+            DeadLetter(NumberedEvent(1), "output", 5, None)
+        ]
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from typing import Hashable, Optional, Tuple
+
+import asyncio
+import dataclasses
+import time
+
+import pytest
+
+from tests.common import RecordingOutput
+
+from mewbot.bot import BotRunner
+from mewbot.core import OutputEvent
+from mewbot.scheduling import OutputScheduler, TokenBucket
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+Item = Tuple[str, int]  # Destination, and number
+
+
+def destination_of(item: Item) -> str:
+    return item[0]
+
+
+@dataclasses.dataclass
+class ChannelEvent(OutputEvent):
+    channel: str
+
+
+class ChannelOutput(RecordingOutput):
+    @staticmethod
+    def destination(event: OutputEvent) -> Optional[Hashable]:
+        return getattr(event, "channel", None)
+
+
+class TestTokenBucket:
+    @staticmethod
+    def test_rate_and_burst() -> None:
+        bucket = TokenBucket(rate=2.0, burst=2)
+        now = bucket.updated
+
+        for _ in range(2):
+            assert bucket.wait_time(now) == 0
+            bucket.consume()
+
+        assert bucket.wait_time(now) == pytest.approx(0.5)
+        assert bucket.wait_time(now + 0.5) == 0
+
+    @staticmethod
+    def test_invalid_rate() -> None:
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+        with pytest.raises(ValueError):
+            TokenBucket(rate=1, burst=0.5)
+
+
+class TestOutputScheduler:
+    @staticmethod
+    def test_round_robin() -> None:
+        async def run() -> OutputScheduler[Item]:
+            scheduler: OutputScheduler[Item] = OutputScheduler(
+                destination_of, rate=100, burst=10
+            )
+
+            for item in (("a", 1), ("a", 2), ("a", 3), ("b", 1)):
+                scheduler.put_nowait(item)
+
+            assert scheduler.backlog() == {"a": 3, "b": 1}
+
+            taken = [scheduler.get_nowait() for _ in range(4)]
+            assert taken == [("a", 1), ("b", 1), ("a", 2), ("a", 3)]
+
+            return scheduler
+
+        scheduler = asyncio.run(run())
+        assert scheduler.empty()
+        assert not scheduler.backlog()
+
+    @staticmethod
+    def test_destinations_are_limited_separately() -> None:
+        async def run() -> None:
+            scheduler: OutputScheduler[Item] = OutputScheduler(
+                destination_of, rate=1, burst=1
+            )
+
+            for item in (("a", 1), ("a", 2), ("b", 1)):
+                scheduler.put_nowait(item)
+
+            assert scheduler.get_nowait() == ("a", 1)
+            # The second event for "a" has to wait, but not the one for "b"
+            assert scheduler.get_nowait() == ("b", 1)
+
+            with pytest.raises(asyncio.QueueEmpty):
+                scheduler.get_nowait()
+
+            assert scheduler.backlog() == {"a": 1}
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_global_limit() -> None:
+        async def run() -> None:
+            scheduler: OutputScheduler[Item] = OutputScheduler(
+                destination_of, rate=100, global_rate=1, global_burst=1
+            )
+
+            scheduler.put_nowait(("a", 1))
+            scheduler.put_nowait(("b", 1))
+
+            assert scheduler.get_nowait() == ("a", 1)
+            with pytest.raises(asyncio.QueueEmpty):
+                scheduler.get_nowait()
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_get_waits_for_rate_limit() -> None:
+        async def run() -> float:
+            scheduler: OutputScheduler[Item] = OutputScheduler(
+                destination_of, rate=20, burst=1
+            )
+            scheduler.put_nowait(("a", 1))
+            scheduler.put_nowait(("a", 2))
+
+            await scheduler.get()
+            started = time.monotonic()
+            assert await scheduler.get() == ("a", 2)
+
+            return time.monotonic() - started
+
+        assert asyncio.run(run()) >= 0.04
+
+    @staticmethod
+    def test_full() -> None:
+        async def run() -> None:
+            scheduler: OutputScheduler[Item] = OutputScheduler(destination_of, maxsize=1)
+            scheduler.put_nowait(("a", 1))
+
+            with pytest.raises(asyncio.QueueFull):
+                scheduler.put_nowait(("b", 1))
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_unknown_option() -> None:
+        with pytest.raises(ValueError):
+            OutputScheduler.from_config(destination_of, 0, {"rate": 1, "per": "minute"})
+
+
+class TestRateLimitedLanes:
+    @staticmethod
+    def test_runner_lane_backlog() -> None:
+        async def run() -> BotRunner:
+            output = ChannelOutput()
+            runner = BotRunner(
+                {},
+                set(),
+                {OutputEvent: {output}},
+                output_rate_limit={"rate": 1, "burst": 1},
+            )
+
+            for channel in ("general", "general", "random"):
+                runner.dispatch_output(ChannelEvent(channel))
+
+            lane = runner.output_lanes[output]
+            assert lane.scheduler
+
+            await lane.deliver(await lane.take())
+            await lane.deliver(await lane.take())
+
+            assert [event.channel for event in output.seen] == [  # type: ignore
+                "general",
+                "random",
+            ]
+            assert lane.backlog() == {"general": 1}
+
+            return runner
+
+        text = asyncio.run(run()).metrics.render().splitlines()
+
+        output_label = 'output="tests.test_scheduling.ChannelOutput"'
+        assert (
+            f'mewbot_output_destination_backlog{{{output_label},destination="general"}} 1'
+            in text
+        )
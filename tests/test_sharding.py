@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+from typing import Any, ClassVar, Dict, Optional, Set, Type
+
+import asyncio
+import dataclasses
+import multiprocessing
+import os
+import signal
+import threading
+
+import pytest
+
+from tests.common import DummyInput, RecordingOutput
+
+from mewbot.api.v1 import Action, Behaviour, Trigger
+from mewbot.core import BehaviourInterface, InputEvent, OutputEvent
+from mewbot.sharding import ShardedBotRunner, WorkerOutput, decode_event, encode_event
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class ShardInputEvent(InputEvent):
+    number: int
+
+
+@dataclasses.dataclass
+class UnpicklableEvent(ShardInputEvent):
+    lock: Any
+
+
+@dataclasses.dataclass
+class ConnectedEvent(ShardInputEvent):
+    """Stands in for events which hold a live connection, such as Discord's"""
+
+    picklable: ClassVar[bool] = False
+
+
+class ConnectedInput(DummyInput):
+    @staticmethod
+    def produces_inputs() -> Set[Type[InputEvent]]:
+        return {ConnectedEvent}
+
+
+@dataclasses.dataclass
+class ShardOutputEvent(OutputEvent):
+    behaviour: str
+    number: int
+    pid: int
+
+
+class ShardTrigger(Trigger):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {ShardInputEvent}
+
+    def matches(self, event: InputEvent) -> bool:
+        return True
+
+
+class ShardAction(Action):
+    _label: str = ""
+
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {ShardInputEvent}
+
+    @staticmethod
+    def produces_outputs() -> Set[Type[OutputEvent]]:
+        return {ShardOutputEvent}
+
+    @property
+    def label(self) -> str:
+        return self._label
+
+    @label.setter
+    def label(self, label: str) -> None:
+        self._label = label
+
+    async def act(self, event: InputEvent, state: Dict[str, Any]) -> None:
+        assert isinstance(event, ShardInputEvent)
+        await self.send(ShardOutputEvent(self._label, event.number, os.getpid()))
+
+
+class ShardStoppingInput(DummyInput):
+    async def run(self) -> None:
+        assert self.queue
+        for number in range(4):
+            await self.queue.put(ShardInputEvent(number))
+
+        os.kill(os.getpid(), signal.SIGTERM)
+
+
+def make_behaviour(label: str) -> BehaviourInterface:
+    behaviour = Behaviour(label)
+    behaviour.add(ShardTrigger())
+    action = ShardAction()
+    action.label = label
+
+    behaviour.add(action)
+    return behaviour
+
+
+def number_key(event: InputEvent) -> Optional[int]:
+    return event.number if isinstance(event, ShardInputEvent) else None
+
+
+def run_sharded(partition: bool) -> RecordingOutput:
+    first, second = make_behaviour("first"), make_behaviour("second")
+    output = RecordingOutput()
+    loop = asyncio.new_event_loop()
+
+    try:
+        runner = ShardedBotRunner(
+            {ShardInputEvent: {first, second}},
+            {ShardStoppingInput()},
+            {ShardOutputEvent: {output}},
+            processes=2,
+            partition_key=number_key if partition else None,
+            drain_timeout=30,
+        )
+
+        runner.run(loop)
+    finally:
+        loop.close()
+
+    return output
+
+
+class TestShardedBotRunner:
+    @staticmethod
+    def test_codec_round_trip() -> None:
+        event = ShardInputEvent(5)
+        assert decode_event(encode_event(event)) == event
+
+    @staticmethod
+    def test_unpicklable_events_are_skipped() -> None:
+        async def run() -> ShardedBotRunner:
+            runner = ShardedBotRunner(
+                {ShardInputEvent: {make_behaviour("first")}}, set(), {}, processes=1
+            )
+
+            await runner.dispatch_input(UnpicklableEvent(1, threading.Lock()))
+            await runner.dispatch_input(ShardInputEvent(2))
+            return runner
+
+        runner = asyncio.run(run())
+
+        assert runner.unsendable == 1
+        assert runner.metrics.input_events[UnpicklableEvent] == 1
+
+        # Only the event which could be pickled was queued for the worker
+        outbox = runner.shards[0]._outbox  # pylint: disable=protected-access
+        data = outbox.get_nowait()
+        assert data and decode_event(data) == ShardInputEvent(2)
+        assert outbox.empty()
+
+    @staticmethod
+    def test_inputs_which_cant_be_sent_are_refused() -> None:
+        with pytest.raises(ValueError):
+            ShardedBotRunner(
+                {ShardInputEvent: {make_behaviour("first")}},
+                {ConnectedInput()},
+                {},
+                processes=2,
+            )
+
+        # An input whose events no behaviour needs is fine
+        ShardedBotRunner({}, {ConnectedInput()}, {}, processes=2)
+
+    @staticmethod
+    def test_behaviours_sharded_across_processes() -> None:
+        output = run_sharded(partition=False)
+
+        results = [event for event in output.seen if isinstance(event, ShardOutputEvent)]
+        assert len(results) == 8
+
+        # Each behaviour runs in exactly one worker, and no work is done in this process
+        pids = {
+            label: {r.pid for r in results if r.behaviour == label}
+            for label in ("first", "second")
+        }
+        assert all(len(label_pids) == 1 for label_pids in pids.values())
+        assert pids["first"] != pids["second"]
+        assert os.getpid() not in pids["first"] | pids["second"]
+
+    @staticmethod
+    def test_events_partitioned_across_processes() -> None:
+        output = run_sharded(partition=True)
+
+        results = [event for event in output.seen if isinstance(event, ShardOutputEvent)]
+        assert len(results) == 8
+
+        # Both behaviours see each event in the same worker
+        for number in range(4):
+            assert len({r.pid for r in results if r.number == number}) == 1
+
+        assert len({r.pid for r in results}) == 2
+
+    @staticmethod
+    def test_worker_output_does_not_wait_for_the_parent() -> None:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        output = WorkerOutput(sender)
+
+        # Much more than fits in the pipe's buffer, none of which is read yet
+        events = [ShardOutputEvent("x" * 100_000, number, 0) for number in range(10)]
+
+        async def run() -> None:
+            for event in events:
+                assert await asyncio.wait_for(output.output(event), 1)
+
+        asyncio.run(run())
+
+        assert [decode_event(receiver.recv_bytes()) for _ in events] == events
+
+        output.close()
+        with pytest.raises(EOFError):
+            receiver.recv_bytes()
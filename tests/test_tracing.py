@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Set, Type
+
+import asyncio
+import json
+import pathlib
+
+from tests.common import DummyInput, RecordingOutput
+
+from mewbot.api.v1 import Action, Behaviour, Trigger
+from mewbot.bot import BotRunner
+from mewbot.core import InputEvent, OutputEvent
+from mewbot.tracing import (
+    JsonLinesExporter,
+    RingBufferExporter,
+    Span,
+    inherit_trace,
+    trace_of,
+)
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class AlwaysTrigger(Trigger):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    def matches(self, event: InputEvent) -> bool:
+        return True
+
+
+class ReplyAction(Action):
+    @staticmethod
+    def consumes_inputs() -> Set[Type[InputEvent]]:
+        return {InputEvent}
+
+    @staticmethod
+    def produces_outputs() -> Set[Type[OutputEvent]]:
+        return {OutputEvent}
+
+    async def act(self, event: InputEvent, state: Dict[str, Any]) -> None:
+        await self.send(OutputEvent())
+
+
+class TestTracing:
+    @staticmethod
+    def test_trace_follows_event_to_output() -> None:
+        exporter = RingBufferExporter()
+        output = RecordingOutput()
+
+        async def run() -> InputEvent:
+            behaviour = Behaviour("Reply")
+            behaviour.add(AlwaysTrigger())
+            behaviour.add(ReplyAction())
+
+            _input = DummyInput()
+            runner = BotRunner(
+                {InputEvent: {behaviour}},
+                {_input},
+                {OutputEvent: {output}},
+                trace_exporters=[exporter],
+            )
+            runner.setup_tasks(asyncio.get_running_loop())
+
+            assert _input.queue
+            event = InputEvent()
+            await _input.queue.put(event)
+
+            await runner.dispatch_input(runner.input_event_queue.get_nowait())
+            runner.dispatch_output(runner.output_event_queue.get_nowait())
+            for lane in runner.output_lanes.values():
+                await lane.deliver(lane.take_nowait())
+
+            return event
+
+        event = asyncio.run(run())
+
+        context, reply = trace_of(event), trace_of(output.seen[0])
+        assert context and reply
+        assert reply.trace_id == context.trace_id
+        assert reply.parent_id == context.event_id
+
+        spans = exporter.trace(context.trace_id)
+        assert [span.stage for span in spans] == ["behaviour", "dispatch", "output"]
+        assert spans[0].component == "Reply"
+        assert spans[2].component == "RecordingOutput"
+        assert all(span.queue_wait >= 0 and span.duration >= 0 for span in spans)
+
+    @staticmethod
+    def test_untraced_output_event() -> None:
+        event = OutputEvent()
+
+        assert inherit_trace(event) is None
+        assert trace_of(event) is None
+        assert event == OutputEvent()
+
+
+class TestExporters:
+    @staticmethod
+    def test_ring_buffer_is_bounded() -> None:
+        exporter = RingBufferExporter(2)
+
+        for number in range(3):
+            exporter.export(Span("t", str(number), None, "output", "E", None, 0, 0, 0))
+
+        assert [span.event_id for span in exporter.spans] == ["1", "2"]
+
+    @staticmethod
+    def test_json_lines(tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "spans.jsonl"
+        exporter = JsonLinesExporter(str(path))
+
+        exporter.export(Span("t", "e", None, "dispatch", "E", None, 1.0, 0.5, 0.25))
+        exporter.close()
+
+        lines = path.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 1
+        assert json.loads(lines[0])["queue_wait"] == 0.5
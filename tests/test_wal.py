@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+from typing import List
+
+import asyncio
+import dataclasses
+import pathlib
+
+import pytest
+
+from tests.common import DummyInput, RecordingBehaviour
+
+from mewbot.bot import BotRunner
+from mewbot.core import InputEvent
+from mewbot.wal import SEGMENT_SUFFIX, WriteAheadLog
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class LoggedEvent(InputEvent):
+    number: int
+
+
+def segments(directory: pathlib.Path) -> List[pathlib.Path]:
+    return sorted(directory.glob(f"*{SEGMENT_SUFFIX}"))
+
+
+class TestWriteAheadLog:
+    @staticmethod
+    def test_unacknowledged_events_are_recovered(tmp_path: pathlib.Path) -> None:
+        log = WriteAheadLog(str(tmp_path))
+        events = [LoggedEvent(number) for number in range(4)]
+
+        for event in events:
+            log.append_nowait(event)
+
+        log.ack(events[0])
+        log.ack(events[2])
+        log.close()
+
+        log = WriteAheadLog(str(tmp_path))
+        recovered = list(log.recover())
+        assert recovered == [LoggedEvent(1), LoggedEvent(3)]
+        assert log.pending == 2
+
+        # Recovered events are acknowledged like any other
+        log.ack_all(recovered)
+        log.close()
+
+        assert not list(WriteAheadLog(str(tmp_path)).recover())
+
+    @staticmethod
+    def test_torn_record_is_ignored(tmp_path: pathlib.Path) -> None:
+        log = WriteAheadLog(str(tmp_path))
+        log.append_nowait(LoggedEvent(1))
+        log.close()
+
+        with open(segments(tmp_path)[-1], "ab") as segment:
+            segment.write(b"\x01\x02\x00")
+
+        assert list(WriteAheadLog(str(tmp_path)).recover()) == [LoggedEvent(1)]
+
+    @staticmethod
+    def test_segments_rotate_and_compact(tmp_path: pathlib.Path) -> None:
+        async def run() -> None:
+            log = WriteAheadLog(str(tmp_path), segment_size=1, max_segments=1)
+            waiting = LoggedEvent(0)
+            log.append_nowait(waiting)
+
+            for number in range(1, 10):
+                event = LoggedEvent(number)
+                log.append_nowait(event)
+                await log.sync()
+                log.ack(event)
+
+            # Fully acknowledged segments are removed, and the unacknowledged
+            # event has been copied forward out of the oldest segments
+            assert len(segments(tmp_path)) <= 3
+            log.close()
+
+        asyncio.run(run())
+
+        assert list(WriteAheadLog(str(tmp_path)).recover()) == [LoggedEvent(0)]
+
+    @staticmethod
+    def test_group_commit(tmp_path: pathlib.Path) -> None:
+        async def run() -> WriteAheadLog:
+            log = WriteAheadLog(str(tmp_path), sync_interval=0.01)
+            syncer = asyncio.create_task(log.run())
+
+            await asyncio.gather(*(log.append(LoggedEvent(number)) for number in range(50)))
+
+            syncer.cancel()
+            await asyncio.gather(syncer, return_exceptions=True)
+            log.close()
+            return log
+
+        log = asyncio.run(run())
+
+        assert log.logged == 50
+        assert log.syncs <= 3
+
+
+class TestRunnerInputLog:
+    @staticmethod
+    def test_recovered_events_are_queued(tmp_path: pathlib.Path) -> None:
+        log = WriteAheadLog(str(tmp_path))
+        log.append_nowait(LoggedEvent(7))
+        log.close()
+
+        async def run() -> InputEvent:
+            runner = BotRunner({}, set(), {}, input_log={"directory": str(tmp_path)})
+            tasks = runner.setup_tasks(asyncio.get_running_loop())
+            await asyncio.sleep(0)
+
+            try:
+                return runner.input_event_queue.get_nowait()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert asyncio.run(run()) == LoggedEvent(7)
+
+    @staticmethod
+    def test_recovery_applies_the_queue_policy(tmp_path: pathlib.Path) -> None:
+        log = WriteAheadLog(str(tmp_path))
+        for number in range(5):
+            log.append_nowait(LoggedEvent(number))
+        log.close()
+
+        async def run(policy: str) -> List[InputEvent]:
+            runner = BotRunner(
+                {},
+                set(),
+                {},
+                input_queue={"maxsize": 2, "policy": policy},
+                input_log={"directory": str(tmp_path)},
+            )
+            tasks = runner.setup_tasks(asyncio.get_running_loop())
+            assert runner.input_log
+
+            queued: List[InputEvent] = []
+            for _ in range(5):
+                await asyncio.sleep(0)
+                while not runner.input_event_queue.empty():
+                    event = runner.input_event_queue.get_nowait()
+                    runner.input_log.ack(event)
+                    queued.append(event)
+
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            runner.input_log.close()
+
+            return queued
+
+        # A blocking queue holds up recovery until there is room, rather than failing
+        assert asyncio.run(run("block")) == [LoggedEvent(number) for number in range(5)]
+
+        # Events dropped by the queue are acknowledged, so are not recovered again
+        log = WriteAheadLog(str(tmp_path))
+        for number in range(5):
+            log.append_nowait(LoggedEvent(number))
+        log.close()
+
+        assert len(asyncio.run(run("drop_newest"))) == 2
+        assert not list(WriteAheadLog(str(tmp_path)).recover())
+
+    @staticmethod
+    def test_dropped_events_are_acknowledged(tmp_path: pathlib.Path) -> None:
+        async def run() -> int:
+            runner = BotRunner(
+                {},
+                set(),
+                {},
+                input_queue={"maxsize": 1, "policy": "drop_newest"},
+                input_log={"directory": str(tmp_path)},
+            )
+            tasks = runner.setup_tasks(asyncio.get_running_loop())
+            assert runner.input_log
+
+            producer = runner.input_queue_for(DummyInput())
+            producer.put_nowait(LoggedEvent(1))
+            producer.put_nowait(LoggedEvent(2))
+
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            return runner.input_log.pending
+
+        assert asyncio.run(run()) == 1
+
+    @staticmethod
+    def test_events_which_dont_fit_are_acknowledged(tmp_path: pathlib.Path) -> None:
+        async def run() -> int:
+            runner = BotRunner(
+                {},
+                set(),
+                {},
+                input_queue={"maxsize": 1, "policy": "block"},
+                input_log={"directory": str(tmp_path)},
+            )
+            assert runner.input_log
+
+            producer = runner.input_queue_for(DummyInput())
+            producer.put_nowait(LoggedEvent(1))
+
+            with pytest.raises(asyncio.QueueFull):
+                producer.put_nowait(LoggedEvent(2))
+
+            runner.input_log.close()
+            return runner.input_log.pending
+
+        assert asyncio.run(run()) == 1
+        assert list(WriteAheadLog(str(tmp_path)).recover()) == [LoggedEvent(1)]
+
+    @staticmethod
+    def test_drained_events_are_acknowledged(tmp_path: pathlib.Path) -> None:
+        behaviour = RecordingBehaviour({LoggedEvent})
+
+        async def run() -> int:
+            runner = BotRunner(
+                {LoggedEvent: {behaviour}}, set(), {}, input_log={"directory": str(tmp_path)}
+            )
+            assert runner.input_log
+
+            producer = runner.input_queue_for(DummyInput())
+            for number in range(3):
+                producer.put_nowait(LoggedEvent(number))
+
+            # Stopped with the events still queued, so they are processed by the drain
+            dropped = await runner.drain([])
+            runner.input_log.close()
+            return dropped
+
+        assert asyncio.run(run()) == 0
+        assert len(behaviour.seen) == 3
+        assert not list(WriteAheadLog(str(tmp_path)).recover())